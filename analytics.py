@@ -0,0 +1,180 @@
+# --- 嵌入式分析库 (SQLite 内存镜像) ---
+# 从表快照同步出精简的分析表 (行级产值、统一时间戳)，YVP / 缺勤罚款窗口 / 周期报表都用带索引的 SQL 计算。
+# 口径与 metrics.py 中的 pandas 参考实现一致，可用 check_equivalence 对照。
+import sqlite3
+import threading
+
+import pandas as pd
+
+from metrics import calculate_net_yvp, period_stats
+
+MIRROR_TABLES = ['users', 'tasks', 'penalties', 'rewards']
+PENALTY_WINDOW_DAYS = 7
+PENALTY_RATE = 0.2
+
+_DDL = """
+CREATE TABLE users (username TEXT, role TEXT);
+CREATE TABLE tasks (id INTEGER, assignee TEXT, status TEXT, val REAL, c_ts INTEGER);
+CREATE INDEX ix_tasks_done ON tasks (status, assignee, c_ts);
+CREATE TABLE penalties (id INTEGER, username TEXT, o_ts INTEGER);
+CREATE INDEX ix_penalties ON penalties (username, o_ts);
+CREATE TABLE rewards (id INTEGER, username TEXT, amount REAL, c_ts INTEGER);
+CREATE INDEX ix_rewards ON rewards (username, c_ts);
+"""
+
+# 时间戳统一存为微秒整数；:cut 为 NULL 表示不限时间
+_NET_SQL = """
+WITH g AS (
+    SELECT assignee AS u, SUM(val) AS v FROM tasks
+    WHERE status = '完成' AND (:cut IS NULL OR c_ts >= :cut)
+    GROUP BY assignee
+), f AS (
+    SELECT p.username AS u, SUM(t.val) * :rate AS v FROM penalties p
+    JOIN tasks t ON t.status = '完成' AND t.assignee = p.username AND t.c_ts >= p.o_ts - :window AND t.c_ts <= p.o_ts
+    WHERE p.o_ts IS NOT NULL AND (:cut IS NULL OR p.o_ts >= :cut)
+    GROUP BY p.username
+), r AS (
+    SELECT username AS u, SUM(amount) AS v FROM rewards
+    WHERE (:cut IS NULL OR c_ts >= :cut)
+    GROUP BY username
+)
+SELECT m.username, COALESCE(g.v, 0) - COALESCE(f.v, 0) + COALESCE(r.v, 0)
+FROM users m LEFT JOIN g ON g.u = m.username LEFT JOIN f ON f.u = m.username LEFT JOIN r ON r.u = m.username
+WHERE m.role IS NOT 'admin' AND (:u IS NULL OR m.username = :u)
+"""
+
+_PERIOD_SQL = """
+WITH g AS (
+    SELECT assignee AS u, SUM(val) AS v FROM tasks
+    WHERE status = '完成' AND c_ts >= :s AND c_ts <= :e
+    GROUP BY assignee
+), r AS (
+    SELECT username AS u, SUM(amount) AS v FROM rewards
+    WHERE c_ts >= :s AND c_ts <= :e
+    GROUP BY username
+)
+SELECT m.username, COALESCE(g.v, 0), COALESCE(r.v, 0)
+FROM users m LEFT JOIN g ON g.u = m.username LEFT JOIN r ON r.u = m.username
+WHERE m.role IS NOT 'admin'
+"""
+
+
+def frame_version(df):
+    # 表快照的内容哈希；内容不变则无需重建镜像
+    try: return (len(df), tuple(df.columns), int(pd.util.hash_pandas_object(df, index=False).sum()))
+    except TypeError: return (len(df), tuple(df.columns), id(df))
+
+
+def snapshot_version(df):
+    # load_table 读取时已算好的版本 (attrs["version"])，没有则现算；只对整表快照成立，筛选出的子表会继承 attrs，不要传入
+    v = df.attrs.get("version")
+    return v if v is not None else frame_version(df)
+
+
+def ts_us(values):
+    try: ts = pd.to_datetime(values, errors='coerce')
+    except (ValueError, TypeError): ts = pd.to_datetime(values, errors='coerce', utc=True)
+    if ts.dt.tz is not None: ts = ts.dt.tz_convert(None)
+    return ((ts - pd.Timestamp(0)) // pd.Timedelta(microseconds=1)).astype('Int64')
+
+
+def _num(values):
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _prepare_users(df):
+    return df[['username', 'role']]
+
+
+def _prepare_tasks(df):
+    # 研发任务产值记 0；无法解析的数值与 safe_float 一样按 0 处理
+    is_rnd = df['is_rnd'].fillna(False).astype(bool)
+    val = (_num(df['difficulty']) * _num(df['std_time']) * _num(df['quality'])).fillna(0.0)
+    return pd.DataFrame({'id': _num(df['id']), 'assignee': df['assignee'], 'status': df['status'],
+                         'val': val.where(~is_rnd, 0.0), 'c_ts': ts_us(df['completed_at'])})
+
+
+def _prepare_penalties(df):
+    return pd.DataFrame({'id': _num(df['id']), 'username': df['username'], 'o_ts': ts_us(df['occurred_at'])})
+
+
+def _prepare_rewards(df):
+    return pd.DataFrame({'id': _num(df['id']), 'username': df['username'],
+                         'amount': _num(df['amount']).fillna(0.0), 'c_ts': ts_us(df['created_at'])})
+
+
+_PREPARE = {'users': _prepare_users, 'tasks': _prepare_tasks, 'penalties': _prepare_penalties, 'rewards': _prepare_rewards}
+
+
+def _us(ts):
+    return int((pd.Timestamp(ts) - pd.Timestamp(0)) // pd.Timedelta(microseconds=1))
+
+
+class AnalyticsMirror:
+    def __init__(self):
+        self.con = sqlite3.connect(":memory:", check_same_thread=False)
+        self.con.executescript(_DDL)
+        self.lock = threading.RLock()
+        self.versions = {}
+
+    def sync(self, frames):
+        # 只重建内容有变化的表
+        with self.lock:
+            changed = False
+            for name, df in frames.items():
+                v = snapshot_version(df)
+                if self.versions.get(name) == v: continue
+                self.con.execute(f"DELETE FROM {name}")
+                if not df.empty: _PREPARE[name](df).to_sql(name, self.con, if_exists='append', index=False)
+                self.versions[name] = v
+                changed = True
+            if changed: self.con.commit()
+        return changed
+
+    def _query(self, sql, params):
+        with self.lock: return self.con.execute(sql, params).fetchall()
+
+    def net_yvp_all(self, days_lookback=None, username=None, now=None):
+        cut = _us(pd.Timestamp(now or pd.Timestamp.now()) - pd.Timedelta(days=days_lookback)) if days_lookback else None
+        rows = self._query(_NET_SQL, {"cut": cut, "u": username, "rate": PENALTY_RATE,
+                                      "window": PENALTY_WINDOW_DAYS * 86400 * 1000000})
+        return {u: round(v, 2) for u, v in rows}
+
+    def net_yvp(self, username, days_lookback=None, now=None):
+        return self.net_yvp_all(days_lookback, username, now).get(username, 0.0)
+
+    def leaderboard(self, now=None):
+        now = now or pd.Timestamp.now()
+        v7, v30, vt = (self.net_yvp_all(d, now=now) for d in (7, 30, None))
+        df = pd.DataFrame([{"成员": m, "📅 7天净值": v7.get(m, 0.0), "🗓️ 30天净值": v30.get(m, 0.0), "💰 总净资产": v} for m, v in vt.items()],
+                          columns=["成员", "📅 7天净值", "🗓️ 30天净值", "💰 总净资产"])
+        return df.sort_values("💰 总净资产", ascending=False)
+
+    def period_stats(self, start_date, end_date):
+        rows = self._query(_PERIOD_SQL, {"s": _us(start_date), "e": _us(pd.Timestamp(end_date) + pd.Timedelta(days=1))})
+        if not rows: return pd.DataFrame()
+        # 周期报表口径不扣罚款，与原实现一致
+        stats = [{"成员": u, "任务产出": round(g, 2), "罚款": 0.0, "奖励": round(r, 2), "💰 应发YVP": round(g + r, 2)} for u, g, r in rows]
+        return pd.DataFrame(stats).sort_values("💰 应发YVP", ascending=False)
+
+
+def check_equivalence(mirror, users, tasks, pens, rews, start_date=None, end_date=None, tol=0.011):
+    # 逐成员对照 SQL 结果与 pandas 参考实现，返回不一致的行 (空表即完全一致)
+    members = users[users['role'] != 'admin']['username'].tolist() if not users.empty else []
+    now = pd.Timestamp.now()
+    diffs = []
+    for days in (7, 30, None):
+        got = mirror.net_yvp_all(days, now=now)
+        for m in members:
+            ref = calculate_net_yvp(m, tasks, pens, rews, days)
+            if abs(ref - got.get(m, 0.0)) > tol:
+                diffs.append({"指标": f"净值 {days or '全部'}天", "成员": m, "pandas": ref, "SQL": got.get(m, 0.0)})
+    if start_date is not None:
+        ref = period_stats(users, tasks, rews, start_date, end_date)
+        got = mirror.period_stats(start_date, end_date)
+        ref = ref.set_index("成员") if not ref.empty else pd.DataFrame(columns=["💰 应发YVP"])
+        got = got.set_index("成员") if not got.empty else pd.DataFrame(columns=["💰 应发YVP"])
+        for m in members:
+            a = float(ref["💰 应发YVP"].get(m, 0.0)); b = float(got["💰 应发YVP"].get(m, 0.0))
+            if abs(a - b) > tol: diffs.append({"指标": "周期应发", "成员": m, "pandas": a, "SQL": b})
+    return pd.DataFrame(diffs, columns=["指标", "成员", "pandas", "SQL"])
@@ -3,9 +3,31 @@ import pandas as pd
 import datetime
 import time
 import io
+import os
 import random
+import uuid
+import altair as alt
 import extra_streamlit_components as stx
-from supabase import create_client, Client
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from db import TABLE_SCHEMAS, bulk_insert, bulk_update, frame_from_rows, iter_pages, write_rejected
+from storage import ReplicaBackend, open_backend
+from changefeed import open_feed
+from sharedcache import SharedCache, SharedCacheError, cache_key
+from search import SearchIndex
+from backup import BACKUP_TABLES, SnapshotStore, restore_archive, convert_legacy_backup
+from importers import read_table_file, build_like_rewards, summarize_like_rewards, like_reward_records, TASK_TEMPLATE, build_task_import, summarize_task_import, task_import_records
+from metrics import safe_float
+from analytics import MIRROR_TABLES, AnalyticsMirror, check_equivalence, frame_version
+from warroom import EMPTY_CAMP, battlefield_signatures, label_index, war_room_groups
+from warmup import Warmup
+from writeback import WriteBehind
+from memo import ViewCache
+from export import EXPORT_FORMATS, export_payroll
+from attendance import STATES, STATE_COLORS, attendance_frame, attendance_query, attendance_summary
+from auth import TOKEN_COOKIE, TOKEN_TTL_DAYS, AuthConfigError, issue_token, load_secret, verify_token
+from ledger import LEDGER_TABLE, daily_ledger, ledger_series, rank_changes, sync_ledger
+from profiler import InstrumentedBackend, Profiler
+from resilience import READ_TIMEOUT, ReadUnavailable, ResilientReader
 
 # --- 1. 系统配置 ---
 st.set_page_config(
@@ -15,10 +37,21 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# --- 运行剖析 (管理员 🩺 性能诊断) ---
+@st.cache_resource
+def get_profiler():
+    return Profiler(log_path=os.environ.get("YANZU_PROFILE_LOG") or None)
+
+prof = get_profiler()
+if "_prof_sid" not in st.session_state: st.session_state._prof_sid = uuid.uuid4().hex[:8]
+prof.begin_rerun(st.session_state._prof_sid, st.session_state.get("user"))
+prof.mark("启动")
+
 # --- 常量定义 ---
 MATRIX_EXCLUDE_USERS = ['liujingting', 'jiangjing', 'admin']
 MATRIX_START_DATE = datetime.date(2026, 2, 11)
 CST_TZ = datetime.timezone(datetime.timedelta(hours=8)) # 北京时间
+BACKUP_DIR = os.environ.get("YANZU_BACKUP_DIR", "backups") # 快照链存放目录
 
 # --- 2. CSS 美化 ---
 st.markdown("""
@@ -72,59 +105,183 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 3. 数据库连接 ---
+# YANZU_STORAGE 为空时直连 Supabase；本地运行/压测可设为 sqlite:///local.db，离线只读副本为 replica+sqlite:///replica.db
+STORAGE_SPEC = os.environ.get("YANZU_STORAGE", "")
+# 行级变更推送：auto (默认) 本地库用 SQLite 替身、线上用 Supabase Realtime；off 时退回 2 秒 TTL 轮询
+# 线上需先把各表加入 supabase_realtime 发布 (见 changefeed.py)；没收到过推送事件的表仍按 2 秒轮询，缓存 TTL 只是上限
+CHANGE_FEED = os.environ.get("YANZU_CHANGE_FEED", "auto")
+CACHE_TTL = 2 if CHANGE_FEED == "off" else 300
+prof.mark("连接数据库")
+
+@st.cache_resource
+def get_store(spec):
+    # 每个进程只建一次连接 (SQLite 还要建表)，各次运行与会话共用；返回 (原始后端, 带剖析的后端)
+    raw = open_backend(spec, None if spec.startswith("sqlite://") else st.secrets["supabase"], timeout=READ_TIMEOUT)
+    return raw, InstrumentedBackend(raw, prof)
+
 try:
-    url = st.secrets["supabase"]["url"]
-    key = st.secrets["supabase"]["key"]
-    supabase: Client = create_client(url, key)
+    supabase_conf = None if STORAGE_SPEC.startswith("sqlite://") else st.secrets["supabase"]
+    raw_store, store = get_store(STORAGE_SPEC)
 except Exception:
     st.error("🚨 数据库连接配置有误，请检查 Secrets。")
+    prof.end_rerun("异常")
     st.stop()
 
+@st.cache_resource
+def get_feed():
+    # 表快照在收到变更后失效 (见 run_query)，推送断开时自动退回轮询
+    feed = open_feed(CHANGE_FEED, raw_store, list(TABLE_SCHEMAS), supabase_conf)
+    return feed.start(lambda t: add_script_run_ctx(t, get_script_run_ctx())) if feed is not None else None
+
+feed = get_feed()
+if feed is not None:
+    feed.attach(getattr(raw_store, "replica", raw_store))
+    if feed.touch not in store.on_write: store.on_write.append(feed.touch)
+
+# 跨进程共享缓存：多个副本共用表快照与派生结果，YANZU_SHARED_CACHE 为目录 (如 /dev/shm/yanzu-cache) 时启用
+# 目录须只属于运行本应用的用户；不安全时不启用，只用进程内缓存，原因显示在诊断页
+SHARED_CACHE = os.environ.get("YANZU_SHARED_CACHE", "")
+
+@st.cache_resource
+def get_tier():
+    if not SHARED_CACHE: return None, None
+    try: return SharedCache(SHARED_CACHE, max_bytes=int(os.environ.get("YANZU_SHARED_CACHE_MB", "512")) * 2 ** 20), None
+    except SharedCacheError as e: return None, str(e)
+
+tier, tier_error = get_tier()
+
 # --- 4. Cookie 管理器 ---
+# 读 Cookie 走 st.context.cookies (随页面请求送达，首次运行即可用)；写入/删除仍由组件完成
+prof.mark("Cookie 管理器")
 cookie_manager = stx.CookieManager(key="yanzu_v42_9_rls_fix")
 
+@st.cache_resource
+def get_auth_secret():
+    try: conf = st.secrets.to_dict()
+    except Exception: conf = None
+    return load_secret(conf)
+
+try: auth_secret = get_auth_secret()
+except AuthConfigError as e:
+    # 没有专用密钥时不签发也不接受任何令牌
+    st.error(f"🚨 {e}")
+    prof.end_rerun("异常")
+    st.stop()
+
 # --- 5. 核心工具函数定义 ---
 
-@st.cache_data(ttl=2) 
+@st.cache_resource
+def get_reader():
+    # 读请求限时 / 重试 / 熔断，失败时退回上一次成功的快照
+    return ResilientReader(carry=prof.carry)
+
+reader = get_reader()
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_table(table_name):
+    # 按主键分页读全表 (PostgREST 单次最多返回 1000 行)；attrs 记录开始拉取的时间与内容版本
+    def fetch():
+        read_at = time.time()
+        df = frame_from_rows(table_name, [r for rows in iter_pages(store, table_name, run=reader.call) for r in rows])
+        df.attrs["read_at"] = read_at
+        df.attrs["version"] = frame_version(df)
+        return df
+    # 读取失败时抛出 ReadUnavailable，不进缓存；退回旧快照 / 空表由 run_query 负责
+    # 共享快照是否可用取决于变更推送，推送关闭时各副本自己拉取
+    if tier is not None and feed is not None:
+        return tier.get_or_compute("table:" + cache_key(STORAGE_SPEC, table_name), lambda: reader.read(table_name, fetch, fallback=False),
+                                   fresh=lambda df: feed.fresh(table_name, df.attrs.get("read_at")))
+    return reader.read(table_name, fetch, fallback=False)
+
 def run_query(table_name):
-    schemas = {
-        'tasks': ['id', 'title', 'battlefield_id', 'status', 'deadline', 'is_rnd', 'assignee', 'difficulty', 'std_time', 'quality', 'created_at', 'completed_at', 'description', 'feedback', 'type'],
-        'campaigns': ['id', 'title', 'deadline', 'order_index', 'status'],
-        'battlefields': ['id', 'title', 'campaign_id', 'order_index'],
-        'users': ['username', 'password', 'role'],
-        'penalties': ['id', 'username', 'reason', 'occurred_at'],
-        'rewards': ['id', 'username', 'amount', 'reason', 'created_at'],
-        'messages': ['id', 'username', 'content', 'created_at'],
-        'daily_todos': ['id', 'username', 'date', 'content', 'category', 'is_completed'],
-        'leaves': ['id', 'username', 'leave_date', 'period', 'reason', 'is_emergency', 'status', 'admin_comment', 'created_at']
-    }
+    # 经剖析器记录缓存命中/未命中；缓存的快照在拉取之后该表有过变更则重新拉取
     try:
-        response = supabase.table(table_name).select("*").execute()
-        df = pd.DataFrame(response.data)
-        if df.empty: return pd.DataFrame(columns=schemas.get(table_name, []))
-        for col in schemas.get(table_name, []):
-            if col not in df.columns: df[col] = None 
-        if 'order_index' in df.columns:
-            df['order_index'] = pd.to_numeric(df['order_index'], errors='coerce').fillna(0)
-            df = df.sort_values('order_index', ascending=True)
-        elif 'id' in df.columns:
-            df = df.sort_values('id', ascending=True)
-        return df
-    except: return pd.DataFrame(columns=schemas.get(table_name, []))
+        df = prof.cached(table_name, load_table, table_name)
+        if feed is not None and not feed.fresh(table_name, df.attrs.get("read_at")):
+            load_table.clear(table_name)
+            df = prof.cached(table_name, load_table, table_name)
+    except ReadUnavailable:
+        # 数据库不可用：退回上一次成功的快照 (没有则为空表)，下一次运行照常重试
+        return reader.last_known(table_name, pd.DataFrame(columns=TABLE_SCHEMAS.get(table_name, [])))
+    except Exception as e:
+        # 请求被后端拒绝 (表 / 列不存在等)：不是暂时故障，不计入熔断；提示后按空表显示
+        if not write_rejected(e): raise
+        st.error(f"🚨 读取 {table_name} 失败：{str(e)[:200]}")
+        return pd.DataFrame(columns=TABLE_SCHEMAS.get(table_name, []))
+    return df
+
+@st.cache_resource
+def get_mirror():
+    return AnalyticsMirror()
+
+def synced_mirror():
+    # 本地分析镜像，按表快照内容增量同步
+    mirror = get_mirror()
+    mirror.sync({t: run_query(t) for t in MIRROR_TABLES})
+    return mirror
+
+@st.cache_resource
+def get_views():
+    # 派生视图按输入表版本记忆，跨会话共享；启用共享缓存时跨进程共享
+    return ViewCache(shared=tier)
+
+views = get_views()
+
+@st.cache_resource
+def get_search():
+    # 任务 / 留言 / 待办的 n-gram 倒排索引，按表快照增量更新，跨会话共享
+    return SearchIndex()
+
+def search_ids(query, kinds):
+    # {类别: [id, ...]}；空查询返回 None
+    if not (query or "").strip(): return None
+    idx = get_search()
+    for k in kinds: idx.sync(k, run_query(k))
+    return idx.search(query, kinds)
+
+PICKER_PAGE = 50
+
+def page_of(df, key, page_size=PICKER_PAGE):
+    # 超过一页时给出页码框，返回当前页
+    pages = max(1, -(-len(df) // page_size))
+    page = st.number_input(f"页码 (共 {pages} 页 · {len(df)} 条)", 1, pages, 1, key=f"{key}_pg") if pages > 1 else 1
+    return df.iloc[(page - 1) * page_size: page * page_size]
+
+def paged_select(label, df, fmt, key):
+    # 以 id 为选项的分页下拉框，只为当前页生成标签；fmt(当前页) 返回对齐的标签 Series
+    part = page_of(df, key)
+    labels = dict(zip(part['id'], fmt(part)))
+    return st.selectbox(label, list(labels), format_func=labels.get, key=key)
 
 def force_refresh():
     st.cache_data.clear()
     st.rerun()
 
+def refresh_tables(*tables):
+    # 只让改动过的表缓存失效，重跑时其余表仍命中缓存
+    for t in tables: load_table.clear(t)
+    st.rerun()
+
 def get_announcement():
     try:
-        res = supabase.table("messages").select("content").eq("username", "__NOTICE__").order("created_at", desc=True).limit(1).execute()
+        res = reader.read("__NOTICE__", lambda: reader.call(store.table("messages").select("content").eq("username", "__NOTICE__").order("created_at", desc=True).limit(1).execute))
         return res.data[0]['content'] if res.data else "欢迎来到颜祖美学执行中枢！"
     except: return "公告加载中..."
 
+def show_stale_badge(slot):
+    # 有表退回到旧快照或完全读不到时，在页面顶部提示
+    stale = {k: v for k, v in reader.staleness().items() if k != "__NOTICE__"}
+    if not stale: return
+    lost = [k for k, (ts, _) in stale.items() if ts is None]
+    ages = [time.time() - ts for ts, _ in stale.values() if ts is not None]
+    msg = f"⚠️ 数据库响应异常 ({reader.breaker.state})："
+    if ages: msg += f"{', '.join(k for k, (ts, _) in stale.items() if ts is not None)} 显示的是 {int(max(ages))} 秒前的缓存数据。"
+    if lost: msg += f"{', '.join(lost)} 暂时无法加载。"
+    slot.warning(msg + " 恢复后将自动刷新。")
+
 def update_announcement(text):
-    supabase.table("messages").delete().eq("username", "__NOTICE__").execute()
-    supabase.table("messages").insert({"username": "__NOTICE__", "content": text}).execute()
+    store.table("messages").delete().eq("username", "__NOTICE__").execute()
+    store.table("messages").insert({"username": "__NOTICE__", "content": text}).execute()
 
 def format_deadline(d_val):
     if pd.isna(d_val) or str(d_val) in ['NaT', 'None', '']:
@@ -132,38 +289,28 @@ def format_deadline(d_val):
     try: return str(pd.to_datetime(d_val).date())
     except: return str(d_val)
 
+@st.cache_data(max_entries=4)
+def label_index_for(camps, batts):
+    return label_index(camps, batts)
+
+def task_labels():
+    # 战场 id → 标签 HTML，按战役/战场表内容缓存
+    return label_index_for(run_query("campaigns"), run_query("battlefields"))
+
 def get_task_label(bid, is_rnd=False):
-    batts = run_query("battlefields")
-    camps = run_query("campaigns")
     label_html = ""
     if is_rnd: label_html += "<span class='rnd-tag'>🟣 产品研发</span>"
     if pd.isna(bid): return label_html + "未归类"
-    try:
-        b_row = batts[batts['id'] == bid].iloc[0]
-        c_row = camps[camps['id'] == b_row['campaign_id']].iloc[0]
-        style_class = "strat-tag" if c_row['id'] == -1 else "strat-tag strat-tag-active"
-        label_html += f"<span class='{style_class}'>{c_row['title']} / {b_row['title']}</span>"
-        return label_html
-    except: return label_html + "未知"
-
-def render_task_card(task, batts_df, camps_df):
+    return label_html + task_labels().get(bid, "未知")
+
+def task_card_html(task, labels):
     color_map = {"进行中": "#3b82f6", "返工": "#ef4444", "待验收": "#f59e0b", "完成": "#10b981", "待领取": "#9ca3af"}
     border_color = color_map.get(task['status'], '#6b7280')
     label_html = ""
     if task.get('is_rnd'): label_html += "<span class='rnd-tag'>🟣 产品研发</span>"
     bid = task.get('battlefield_id')
-    if not pd.isna(bid):
-        try:
-            b_row = batts_df[batts_df['id'] == bid]
-            if not b_row.empty:
-                b_row = b_row.iloc[0]
-                c_row = camps_df[camps_df['id'] == b_row['campaign_id']]
-                if not c_row.empty:
-                    c_row = c_row.iloc[0]
-                    style_class = "strat-tag" if c_row['id'] == -1 else "strat-tag strat-tag-active"
-                    label_html += f"<span class='{style_class}'>{c_row['title']} / {b_row['title']}</span>"
-        except: pass
-    st.markdown(f"""
+    if not pd.isna(bid): label_html += labels.get(bid, "")
+    return f"""
         <div style="border-left: 5px solid {border_color}; 
                     padding: 12px 15px; margin-bottom: 10px; 
                     border-radius: 4px; 
@@ -175,13 +322,62 @@ def render_task_card(task, batts_df, camps_df):
                 <span>⚙️ D{task['difficulty']} / T{task['std_time']}</span>
             </div>
         </div>
-    """, unsafe_allow_html=True)
+    """
 
-def safe_float(val):
-    try:
-        if val is None or str(val).strip() == "": return 0.0
-        return float(val)
-    except: return 0.0
+def render_task_card(task, labels):
+    st.markdown(task_card_html(task, labels), unsafe_allow_html=True)
+
+WALLBOARD_INTERVALS = [5, 10, 30, 60]
+WALLBOARD_CARDS = 12  # 每个战场最多显示的活跃任务卡片数
+WALLBOARD_COLUMNS = 3
+
+def wallboard_battlefield(batt, bf, labels):
+    # 单个战场的大屏 HTML：标题、进度与活跃任务卡片
+    done, total = (bf["done"], bf["total"]) if bf else (0, 0)
+    pct = int(done / total * 100) if total else 0
+    html = f"""<div style="font-weight:700; font-size:1.05em;">🛡️ {batt['title']}</div>
+        <div style="background:#e5e7eb; border-radius:4px; height:6px; margin:6px 0 4px;"><div style="background:#10b981; width:{pct}%; height:6px; border-radius:4px;"></div></div>
+        <div style="color:#6b7280; font-size:0.8em; margin-bottom:8px;">进度 {pct}% · 完成 {done}/{total}</div>"""
+    active = bf["active"] if bf else pd.DataFrame()
+    if active.empty: html += "<div style='color:#9ca3af; font-size:0.85em;'>暂无活跃任务</div>"
+    else: html += "".join(task_card_html(t, labels) for t in active.head(WALLBOARD_CARDS).to_dict('records'))
+    if len(active) > WALLBOARD_CARDS: html += f"<div style='color:#6b7280; font-size:0.85em;'>…… 另有 {len(active) - WALLBOARD_CARDS} 项活跃任务</div>"
+    return " ".join(line.strip() for line in html.splitlines())  # 压成一行，避免缩进被 Markdown 当作代码块
+
+def war_room_wallboard(every):
+    # 只读大屏：片段按间隔单独重跑，不重跑整页；战场签名没变时沿用上次生成的 HTML，前端收到相同内容不会重绘
+    @st.fragment(run_every=every)
+    def tick():
+        partial = bool(getattr(get_script_run_ctx(), "fragment_ids_this_run", None))
+        if partial:
+            prof.begin_rerun(st.session_state._prof_sid, st.session_state.get("user"))
+            prof.mark("页面·大屏刷新")
+        camps, batts, all_tasks = run_query("campaigns"), run_query("battlefields"), run_query("tasks")
+        groups = views.get("作战室", war_room_groups, camps, batts, all_tasks)
+        sigs = views.get("作战室签名", battlefield_signatures, all_tasks)
+        labels = task_labels()
+        cache = st.session_state.setdefault("wall_cache", {})  # 战场 id → (签名, HTML)
+        seen, redrawn = set(), 0
+        for _, camp in (camps.iterrows() if not camps.empty else []):
+            war = groups.get(camp['id'], EMPTY_CAMP)
+            if war["batts"].empty: continue
+            prog = war["done"] / war["total"] if war["total"] else 0
+            st.markdown(f"### {'👑' if camp['id'] == -1 else '🚩'} {camp['title']} <span style='font-size:0.6em; color:#6b7280;'>战役进度 {int(prog * 100)}%"
+                        + (f" · 🏁 {camp['deadline']}" if pd.notna(camp['deadline']) and camp['deadline'] else "") + "</span>", unsafe_allow_html=True)
+            cols = st.columns(WALLBOARD_COLUMNS)
+            for i, batt in enumerate(war["batts"].to_dict('records')):
+                bid = batt['id']
+                sig = (sigs.get(bid), batt['title'], labels.get(bid))
+                hit = cache.get(bid)
+                if hit is None or hit[0] != sig:
+                    hit = cache[bid] = (sig, wallboard_battlefield(batt, war["battlefields"].get(bid), labels))
+                    redrawn += 1
+                seen.add(bid)
+                with cols[i % WALLBOARD_COLUMNS].container(border=True): st.markdown(hit[1], unsafe_allow_html=True)
+        for bid in set(cache) - seen: del cache[bid]
+        st.caption(f"🔄 每 {every} 秒自动刷新 · 上次 {datetime.datetime.now(CST_TZ).strftime('%H:%M:%S')} · 本次重绘 {redrawn}/{len(seen)} 个战场")
+        if partial: prof.end_rerun()
+    tick()
 
 def show_task_history(username, role):
     st.divider()
@@ -209,94 +405,63 @@ def show_task_history(username, role):
                 c2.caption(f"归档: {r.get('completed_at', '-')}")
                 c3.caption("研发任务" if r['is_rnd'] else "普通任务")
 
-def calculate_net_yvp(username, tasks_df, pen_df, rew_df, days_lookback=None):
-    try:
-        gross = 0.0
-        if not tasks_df.empty:
-            df_t = tasks_df.copy()
-            my_done = df_t[(df_t['assignee'] == username) & (df_t['status'] == '完成')].copy()
-            if not my_done.empty:
-                my_done['is_rnd'] = my_done['is_rnd'].fillna(False)
-                my_done['val'] = my_done.apply(lambda x: 0.0 if x['is_rnd'] else (safe_float(x.get('difficulty')) * safe_float(x.get('std_time')) * safe_float(x.get('quality'))), axis=1)
-                
-                my_done['c_dt'] = pd.to_datetime(my_done['completed_at'], errors='coerce')
-                if days_lookback:
-                    cutoff = pd.Timestamp.now() - pd.Timedelta(days=days_lookback)
-                    my_done = my_done[my_done['c_dt'] >= cutoff]
-                gross = my_done['val'].sum()
-
-        total_fine = 0.0
-        if not pen_df.empty:
-            df_p = pen_df[pen_df['username'] == username].copy()
-            if not df_p.empty:
-                df_p['o_dt'] = pd.to_datetime(df_p['occurred_at'], errors='coerce')
-                if days_lookback:
-                    cutoff = pd.Timestamp.now() - pd.Timedelta(days=days_lookback)
-                    df_p = df_p[df_p['o_dt'] >= cutoff]
-                
-                if not df_p.empty and not tasks_df.empty:
-                    df_t_base = tasks_df[(tasks_df['assignee'] == username) & (tasks_df['status'] == '完成')].copy()
-                    if not df_t_base.empty:
-                        df_t_base['c_dt'] = pd.to_datetime(df_t_base['completed_at'], errors='coerce')
-                        df_t_base['is_rnd'] = df_t_base['is_rnd'].fillna(False)
-                        df_t_base['val'] = df_t_base.apply(lambda x: 0.0 if x['is_rnd'] else (safe_float(x.get('difficulty')) * safe_float(x.get('std_time')) * safe_float(x.get('quality'))), axis=1)
-                        
-                        for _, pen in df_p.iterrows():
-                            if pd.isna(pen['o_dt']): continue
-                            w_start = pen['o_dt'] - pd.Timedelta(days=7)
-                            w_tasks = df_t_base[(df_t_base['c_dt'] >= w_start) & (df_t_base['c_dt'] <= pen['o_dt'])]
-                            total_fine += w_tasks['val'].sum() * 0.2
-        
-        total_reward = 0.0
-        if not rew_df.empty:
-            df_r = rew_df[rew_df['username'] == username].copy()
-            if not df_r.empty:
-                df_r['amount_val'] = df_r['amount'].apply(safe_float)
-                if days_lookback:
-                    df_r['c_dt'] = pd.to_datetime(df_r['created_at'], errors='coerce')
-                    cutoff = pd.Timestamp.now() - pd.Timedelta(days=days_lookback)
-                    df_r = df_r[df_r['c_dt'] >= cutoff]
-                total_reward = df_r['amount_val'].sum()
-
-        return round(gross - total_fine + total_reward, 2)
+def calculate_period_stats(start_date, end_date):
+    try: return synced_mirror().period_stats(start_date, end_date)
     except Exception as e:
-        print(f"Error calculating YVP for {username}: {e}")
-        return 0.0
+        print(f"Error calculating period stats: {e}")
+        return pd.DataFrame()
 
-def calculate_period_stats(start_date, end_date):
-    try:
-        users = run_query("users")
-        if users.empty: return pd.DataFrame()
-        members = users[users['role'] != 'admin']['username'].tolist()
-        tasks = run_query("tasks"); pens = run_query("penalties"); rews = run_query("rewards")
-        
-        stats_data = []
-        ts_start = pd.Timestamp(start_date); ts_end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
-        
-        for m in members:
-            gross = 0.0
-            if not tasks.empty:
-                df_t = tasks[(tasks['assignee'] == m) & (tasks['status'] == '完成')].copy()
-                if not df_t.empty:
-                    df_t['is_rnd'] = df_t['is_rnd'].fillna(False)
-                    df_t['c_dt'] = pd.to_datetime(df_t['completed_at'], errors='coerce')
-                    in_range = df_t[(df_t['c_dt'] >= ts_start) & (df_t['c_dt'] <= ts_end)]
-                    gross = in_range[in_range['is_rnd']==False].apply(lambda x: safe_float(x.get('difficulty')) * safe_float(x.get('std_time')) * safe_float(x.get('quality')), axis=1).sum()
-            
-            fine = 0.0
-            
-            reward_val = 0.0
-            if not rews.empty:
-                df_r = rews[rews['username'] == m].copy()
-                df_r['c_dt'] = pd.to_datetime(df_r['created_at'], errors='coerce')
-                in_range_r = df_r[(df_r['c_dt'] >= ts_start) & (df_r['c_dt'] <= ts_end)]
-                reward_val = in_range_r['amount'].apply(safe_float).sum()
-                
-            net = gross - fine + reward_val
-            stats_data.append({"成员": m, "任务产出": round(gross, 2), "罚款": round(fine, 2), "奖励": round(reward_val, 2), "💰 应发YVP": round(net, 2)})
-        
-        return pd.DataFrame(stats_data).sort_values("💰 应发YVP", ascending=False) if stats_data else pd.DataFrame()
-    except: return pd.DataFrame()
+def leaderboard_view(users, tasks, pens, rews, now):
+    return synced_mirror().leaderboard(now=now)
+
+def activity_view(tasks):
+    # 任务大厅底部的 实时动态 / 荣誉记录 (各最近 35 条)
+    if tasks.empty or 'status' not in tasks.columns: return None, None
+    active = tasks[tasks['status'].isin(['进行中', '返工', '待验收'])].sort_values("created_at", ascending=False).head(35).copy()
+    active['Deadline'] = active['deadline'].apply(format_deadline)
+    done = tasks[tasks['status']=='完成'].sort_values('completed_at', ascending=False).head(35).copy()
+    if not done.empty:
+        done['P'] = done.apply(lambda x: "研发任务" if x.get('is_rnd') else f"D{x['difficulty']}/T{x['std_time']}/Q{x['quality']}", axis=1)
+        done['💰 获益'] = done.apply(lambda x: 0 if x.get('is_rnd') else (safe_float(x.get('difficulty')) * safe_float(x.get('std_time')) * safe_float(x.get('quality'))), axis=1)
+    return active[['title', 'assignee', 'status', 'Deadline']], done.reindex(columns=['title', 'assignee', 'P', '💰 获益'])
+
+def team_todo_view(todos, today_str):
+    # 团队今日动态：[(成员, 进行中, 已完成)]，按出现顺序
+    if todos.empty: return []
+    team = todos[todos['date'].astype(str) == today_str]
+    return [(u, g[g['is_completed'] == False], g[g['is_completed'] == True]) for u, g in team.groupby('username', sort=False)]
+
+@st.cache_data(ttl=300)
+def refresh_ledger(today_str):
+    # 日账本增量同步，每天每 5 分钟至多一次；失败 (如线上尚未建表) 返回 None
+    try: return sync_ledger(store, run_query("users"), run_query("tasks"), run_query("penalties"), run_query("rewards"), today=today_str)
+    except Exception as e:
+        print(f"Error syncing ledger: {e}")
+        return None
+
+def ledger_frame():
+    if refresh_ledger(str(datetime.date.today())) is None:
+        return daily_ledger(run_query("users"), run_query("tasks"), run_query("penalties"), run_query("rewards"))
+    return run_query(LEDGER_TABLE)
+
+def attendance_chart(rows, x, y, height=None):
+    # 出勤热力图：rows 为 attendance_query 的结果，x / y 为列名
+    rows = rows.assign(日期=rows['date'].dt.strftime('%Y-%m-%d'))
+    return alt.Chart(rows).mark_rect(stroke='white', strokeWidth=1).encode(
+        x=alt.X(f'{x}:O', title=None, sort=None, axis=alt.Axis(labelAngle=0)), y=alt.Y(f'{y}:O', title=None, sort=None),
+        color=alt.Color('state:N', title=None, scale=alt.Scale(domain=STATES, range=STATE_COLORS), legend=alt.Legend(orient='bottom')),
+        tooltip=[alt.Tooltip('username:N', title='成员'), alt.Tooltip('日期:N'), alt.Tooltip('state:N', title='状态'),
+                 alt.Tooltip('leave_period:N', title='请假时段'), alt.Tooltip('matrix:N', title='矩阵任务'), alt.Tooltip('penalties:Q', title='罚款次数')]
+    ).properties(height=height or 'container')
+
+def restore_progress(bar):
+    stage_names = {"verify": "校验", "load": "写入", "swap": "清理旧行", "check": "核对"}
+    return lambda stage, t, n, total: bar.progress(min(n / total, 1.0) if total else 1.0, text=f"{stage_names[stage]} {t}: {n}/{total}")
+
+def show_restore_report(report):
+    st.dataframe(pd.DataFrame(report), use_container_width=True, hide_index=True)
+    if all(r["行数核对"] == "✅" and r.get("校验和", "✅") == "✅" for r in report): st.success("✅ 恢复完成，行数与校验和均与备份一致！")
+    else: st.warning("⚠️ 恢复完成，但部分表与备份清单不一致，请检查上表。")
 
 @st.dialog("🎉 恭喜")
 def show_success_modal(msg="操作成功！"):
@@ -305,14 +470,14 @@ def show_success_modal(msg="操作成功！"):
     if st.button("关闭并刷新", type="primary"): force_refresh()
 
 def get_or_create_matrix_battlefield():
-    camps = supabase.table("campaigns").select("*").eq("title", "矩阵战役").execute()
+    camps = store.table("campaigns").select("*").eq("title", "矩阵战役").execute()
     if not camps.data:
-        res_c = supabase.table("campaigns").insert({"title": "矩阵战役", "order_index": 99}).execute()
+        res_c = store.table("campaigns").insert({"title": "矩阵战役", "order_index": 99}).execute()
         camp_id = res_c.data[0]['id']
     else: camp_id = camps.data[0]['id']
-    batts = supabase.table("battlefields").select("*").eq("title", "黑丸视频投放").eq("campaign_id", camp_id).execute()
+    batts = store.table("battlefields").select("*").eq("title", "黑丸视频投放").eq("campaign_id", camp_id).execute()
     if not batts.data:
-        res_b = supabase.table("battlefields").insert({"title": "黑丸视频投放", "campaign_id": camp_id, "order_index": 1}).execute()
+        res_b = store.table("battlefields").insert({"title": "黑丸视频投放", "campaign_id": camp_id, "order_index": 1}).execute()
         batt_id = res_b.data[0]['id']
     else: batt_id = batts.data[0]['id']
     return int(batt_id)
@@ -341,7 +506,7 @@ def global_matrix_task_dispatch():
                     "battlefield_id": target_bid, "is_rnd": False
                 })
         if new_tasks:
-            supabase.table("tasks").insert(new_tasks).execute()
+            store.table("tasks").insert(new_tasks).execute()
 
 def check_and_create_matrix_tasks(username):
     today = datetime.datetime.now(CST_TZ).date()
@@ -356,34 +521,87 @@ def check_and_create_matrix_tasks(username):
         if not has_task:
             target_bid = get_or_create_matrix_battlefield()
             matrix_desc = """【必做任务】\n1. 在自己的矩阵号上发布至少3条黑丸本土化视频。\n2. 奖励机制：\n   - 单篇点赞>1000：+1点\n   - 单篇点赞>5000：+2点\n   - 单篇点赞>1w：+5点\n   - 单篇点赞>10w：+30点\n   - 单篇点赞>100w：+150点\n3. ⚠️ 惩罚：未完成将直接按【缺勤】处理。"""
-            supabase.table("tasks").insert({
+            store.table("tasks").insert({
                 "title": task_title, "description": matrix_desc, "difficulty": 1.0, "std_time": 2.0,
                 "status": "进行中", "assignee": username, "type": "matrix_daily", "deadline": today_str,
                 "battlefield_id": target_bid, "is_rnd": False
             }).execute()
             st.toast(f"📅 已生成：{task_title}")
 
+@st.cache_data(ttl=600)
+def lookup_role(username):
+    # 角色缓存 10 分钟；用户不存在返回 None，数据库不可用时抛出 ReadUnavailable (不缓存)
+    res = reader.call(store.table("users").select("role").eq("username", username).execute)
+    return res.data[0]['role'] if res.data else None
+
+def drop_cookie(name, key):
+    # 组件本地的 Cookie 字典可能还没回传该项，此时删除指令已发往浏览器，忽略本地 KeyError
+    try: cookie_manager.delete(name, key=key)
+    except KeyError: pass
+
+def start_session(username, role):
+    st.session_state.user = username
+    st.session_state.role = role
+    st.session_state.post_login = True  # 矩阵任务派发等延后到首屏渲染之后
+
+def set_token_cookie(username, role):
+    cookie_manager.set(TOKEN_COOKIE, issue_token(auth_secret, username, role), key="set_token",
+                       expires_at=datetime.datetime.now() + datetime.timedelta(days=TOKEN_TTL_DAYS))
+
+# --- 启动预热 ---
+# 进程内第一次运行脚本时在后台线程预热缓存，第一个登录的人直接命中；YANZU_WARMUP=0 关闭
+# 线程挂上当前运行上下文，缓存函数在线程里调用时不再告警 (预热步骤不输出任何页面元素)
+@st.cache_resource
+def get_warmup():
+    return Warmup([
+        ("表快照", lambda: [run_query(t) for t in TABLE_SCHEMAS if t != LEDGER_TABLE]),
+        ("分析镜像 · 风云榜", lambda: views.get("风云榜", leaderboard_view, *[run_query(t) for t in MIRROR_TABLES], args=(pd.Timestamp.now().floor("min"),))),
+        ("作战室分组", lambda: views.get("作战室", war_room_groups, run_query("campaigns"), run_query("battlefields"), run_query("tasks"))),
+        ("日账本", ledger_frame),
+        ("任务标签索引", task_labels),
+    ], prof).start(lambda t: add_script_run_ctx(t, get_script_run_ctx()))
+
+warmup = get_warmup() if os.environ.get("YANZU_WARMUP", "1") != "0" else None
+
+# --- 今日清单写后台队列 (可选) ---
+# YANZU_TODO_WRITE_BEHIND=1 时待办的增改删先叠加到快照、由后台线程合并批量写库；默认直接写库
+@st.cache_resource
+def get_todo_queue():
+    return WriteBehind(store, "daily_todos", on_flush=load_table.clear).start(lambda t: add_script_run_ctx(t, get_script_run_ctx()))
+
+todo_queue = get_todo_queue() if os.environ.get("YANZU_TODO_WRITE_BEHIND") == "1" else None
+
+def load_todos():
+    todos = run_query("daily_todos")
+    return todo_queue.overlay(todos) if todo_queue is not None else todos
+
+def save_todo(op, todo_id=None, values=None):
+    if todo_queue is not None: return todo_queue.submit(op, todo_id, values, owner=st.session_state.user)
+    q = store.table("daily_todos")
+    if op == "insert": q.insert(values).execute()
+    elif op == "update": q.update(values).eq("id", int(todo_id)).execute()
+    else: q.delete().eq("id", int(todo_id)).execute()
+    load_table.clear("daily_todos")
+
 # --- 6. 鉴权与自动登录 ---
+prof.mark("鉴权")
 if 'user' not in st.session_state:
     st.session_state.user = None
     st.session_state.role = None
 
-if st.session_state.user is None:
-    time.sleep(0.1)
-    c_user = cookie_manager.get("yanzu_user")
-    if c_user:
-        try:
-            res = supabase.table("users").select("role").eq("username", c_user).execute()
-            if res.data:
-                st.session_state.user = c_user
-                st.session_state.role = res.data[0]['role']
-                if res.data[0]['role'] != 'admin': check_and_create_matrix_tasks(c_user)
-                else: global_matrix_task_dispatch()
-            else: cookie_manager.delete("yanzu_user")
-        except:
-            st.session_state.user = c_user
-            st.session_state.role = cookie_manager.get("yanzu_role") or 'member'
-        st.rerun()
+if st.session_state.user is None and not st.session_state.get("logged_out"):
+    # 本地校验签名令牌，无需查库，也不用等 Cookie 组件回传再 rerun
+    claims = verify_token(auth_secret, st.context.cookies.get(TOKEN_COOKIE))
+    if claims:
+        # 令牌里的角色可能已过时 (改角色 / 删号)：首屏渲染前以用户表为准；数据库不可用时不授予统帅权限
+        try: db_role = lookup_role(claims[0])
+        except ReadUnavailable: db_role = claims[1] if claims[1] != 'admin' else 'member'
+        if db_role is None: drop_cookie(TOKEN_COOKIE, "del_token_stale")
+        else: start_session(claims[0], db_role)
+    elif st.context.cookies.get("yanzu_user"):
+        # 旧版未签名 Cookie 任何人都能伪造，不再接受：清掉后走密码登录
+        drop_cookie("yanzu_user", "del_user")
+        drop_cookie("yanzu_role", "del_role")
 
 if st.session_state.user is None:
     st.markdown("""
@@ -400,48 +618,52 @@ if st.session_state.user is None:
             p = st.text_input("密码", type="password")
             if st.form_submit_button("🚀 登录", type="primary"):
                 try:
-                    res = supabase.table("users").select("*").eq("username", u).eq("password", p).execute()
+                    res = store.table("users").select("*").eq("username", u).eq("password", p).execute()
                     if res.data:
-                        st.session_state.user = u
-                        st.session_state.role = res.data[0]['role']
-                        cookie_manager.set("yanzu_user", u, expires_at=datetime.datetime.now() + datetime.timedelta(days=30))
-                        cookie_manager.set("yanzu_role", res.data[0]['role'], expires_at=datetime.datetime.now() + datetime.timedelta(days=30))
-                        if res.data[0]['role'] != 'admin': check_and_create_matrix_tasks(u)
-                        else: global_matrix_task_dispatch()
-                        st.rerun()
+                        start_session(u, res.data[0]['role'])
+                        st.session_state.logged_out = False
+                        set_token_cookie(u, res.data[0]['role'])
                     else: st.error("账号或密码错误")
                 except: st.error("连接超时，请重试")
+                if st.session_state.user: st.rerun()
+        if warmup is not None and not warmup.ready: st.caption(warmup.summary())
+    prof.end_rerun("登录页")
     st.stop()
 
 user = st.session_state.user
 role = st.session_state.role
 
 # 侧边栏
+prof.mark("侧边栏")
 with st.sidebar:
     st.header(f"👤 {user}")
     st.caption(f"身份: {'👑 统帅' if role=='admin' else '⚔️ 成员'}")
     if role == 'admin': st.success("统帅万岁！请及时备份数据。")
     else:
-        tasks_all = run_query("tasks")
-        pens_all = run_query("penalties")
-        rews_all = run_query("rewards")
-        yvp_7 = calculate_net_yvp(user, tasks_all, pens_all, rews_all, 7)
-        yvp_all = calculate_net_yvp(user, tasks_all, pens_all, rews_all)
+        mirror = synced_mirror()
+        yvp_7 = mirror.net_yvp(user, 7)
+        yvp_all = mirror.net_yvp(user)
         st.metric("7天净收益", yvp_7)
         st.metric("总净资产", yvp_all)
     st.divider()
     if st.button("注销退出"):
-        cookie_manager.delete("yanzu_user")
-        cookie_manager.delete("yanzu_role")
+        drop_cookie(TOKEN_COOKIE, "del_token")
+        if st.context.cookies.get("yanzu_user"):
+            drop_cookie("yanzu_user", "del_user")
+            drop_cookie("yanzu_role", "del_role")
         st.session_state.user = None
         st.session_state.role = None
+        st.session_state.logged_out = True  # 本会话的请求 Cookie 仍带着旧令牌，不再自动登录
         st.rerun()
 
+prof.mark("公告")
 ann_text = get_announcement()
 st.markdown(f"""<div class="scrolling-text"><marquee scrollamount="6">🔔 公告：{ann_text}</marquee></div>""", unsafe_allow_html=True)
 st.title(f"🏛️ 帝国中枢 · {user}")
+stale_slot = st.empty()
 
 nav = st.radio("NAV", ["☀️ 今日清单", "📅 请假中心", "🔭 战略作战室", "📋 任务大厅", "🗣️ 颜祖广场", "🏆 风云榜", "🏰 个人中心"], horizontal=True, label_visibility="collapsed")
+prof.mark(f"页面·{nav}")
 st.divider()
 
 # ================= 业务路由 =================
@@ -461,15 +683,18 @@ if nav == "☀️ 今日清单":
         new_cat = col_in2.selectbox("类型", ["核心必办", "余力选办"], label_visibility="collapsed")
         submitted = col_in3.form_submit_button("➕ 添加", type="primary", use_container_width=True)
         if submitted and new_todo:
-            supabase.table("daily_todos").insert({
-                "username": user, "content": new_todo, "category": new_cat, "date": today_str
-            }).execute()
+            save_todo("insert", values={
+                "username": user, "content": new_todo, "category": new_cat, "date": today_str, "is_completed": False
+            })
             st.rerun()
 
-    todos = run_query("daily_todos")
+    todos = load_todos()
+    if todo_queue is not None:
+        for f in todo_queue.take_failed(user): st.error(f"⚠️ 清单改动未能保存 ({f['op']} {f['values'].get('content', '')})：{f['error']}")
+        if todo_queue.backlog(): st.caption(f"⏳ {todo_queue.backlog()} 条改动正在后台同步")
     st.subheader(f"📝 我的清单 ({today_str})")
     if not todos.empty:
-        my_todos = todos[(todos['username'] == user) & (todos['date'].astype(str) == today_str)].sort_values('id')
+        my_todos = todos[(todos['username'] == user) & (todos['date'].astype(str) == today_str)].sort_values('id', key=lambda ids: ids.where(ids > 0, float('inf')), kind='stable')  # 尚未写库的新增 (临时负数 id) 排在最后
         if not my_todos.empty:
             for _, t in my_todos.iterrows():
                 if t['is_completed']:
@@ -477,7 +702,7 @@ if nav == "☀️ 今日清单":
                     container_style.markdown(f"✅ ~~{t['content']}~~ <span style='color:grey;font-size:0.8em'>({t['category']})</span>", unsafe_allow_html=True)
                     c_act1, c_act2 = container_style.columns([1, 6])
                     if c_act1.button("↩️ 撤销", key=f"undo_{t['id']}"):
-                        supabase.table("daily_todos").update({"is_completed": False}).eq("id", int(t['id'])).execute()
+                        save_todo("update", t['id'], {"is_completed": False})
                         st.rerun()
                 else:
                     with st.container(border=True):
@@ -486,16 +711,16 @@ if nav == "☀️ 今日清单":
                         color = "red" if t['category'] == '核心必办' else "blue"
                         c_t2.markdown(f"<span style='color:{color};font-weight:bold'>{t['category']}</span>", unsafe_allow_html=True)
                         if c_t3.button("✅ 完成", key=f"done_{t['id']}", type="primary"):
-                            supabase.table("daily_todos").update({"is_completed": True}).eq("id", int(t['id'])).execute()
+                            save_todo("update", t['id'], {"is_completed": True})
                             show_success_modal(f"太棒了！已完成：{t['content']}")
                         with c_t4.popover("✏️"):
                             edit_txt = st.text_input("修改", t['content'], key=f"etxt_{t['id']}")
                             edit_cat = st.selectbox("类型", ["核心必办", "余力选办"], index=0 if t['category']=="核心必办" else 1, key=f"ecat_{t['id']}")
                             if st.button("保存", key=f"esave_{t['id']}"):
-                                supabase.table("daily_todos").update({"content": edit_txt, "category": edit_cat}).eq("id", int(t['id'])).execute()
+                                save_todo("update", t['id'], {"content": edit_txt, "category": edit_cat})
                                 st.rerun()
                         if c_t5.button("🗑️", key=f"del_td_{t['id']}"):
-                            supabase.table("daily_todos").delete().eq("id", int(t['id'])).execute()
+                            save_todo("delete", t['id'])
                             st.rerun()
         else:
             st.markdown("""<div style="text-align:center; padding:30px; color:#aaa;"><div style="font-size:3em;">📋</div><p>今天还没有计划，添加一条开始吧！</p></div>""", unsafe_allow_html=True)
@@ -504,34 +729,29 @@ if nav == "☀️ 今日清单":
     st.divider()
     st.subheader("👀 团队今日动态")
     with st.expander("展开查看全员进度", expanded=True):
-        if not todos.empty:
-            team_todos = todos[todos['date'].astype(str) == today_str]
-            if not team_todos.empty:
-                users_active = team_todos['username'].unique()
-                cols = st.columns(len(users_active) if len(users_active) < 3 else 3)
-                for i, u_name in enumerate(users_active):
-                    with cols[i % 3]:
-                        with st.container(border=True):
-                            st.markdown(f"#### 👤 {u_name}")
-                            u_tasks = team_todos[team_todos['username'] == u_name]
-                            c_ing, c_fin = st.columns(2)
-                            with c_ing:
-                                st.caption("🔴 进行中")
-                                doing = u_tasks[u_tasks['is_completed'] == False]
-                                if not doing.empty:
-                                    for _, t in doing.iterrows():
-                                        cat_icon = "🔥" if t['category'] == '核心必办' else "☕"
-                                        st.markdown(f"<div class='todo-doing'><b>[{cat_icon}]</b> {t['content']}</div>", unsafe_allow_html=True)
-                                else: st.caption("-")
-                            with c_fin:
-                                st.caption("🟢 已完成")
-                                done = u_tasks[u_tasks['is_completed'] == True]
-                                if not done.empty:
-                                    for _, t in done.iterrows():
-                                        cat_icon = "🔥" if t['category'] == '核心必办' else "☕"
-                                        st.markdown(f"<div class='todo-done'><b>[{cat_icon}]</b> {t['content']}</div>", unsafe_allow_html=True)
-                                else: st.caption("-")
-            else: st.info("今日团队暂无动态")
+        team_board = views.get("团队今日动态", team_todo_view, todos, args=(today_str,))
+        if team_board:
+            cols = st.columns(len(team_board) if len(team_board) < 3 else 3)
+            for i, (u_name, doing, done) in enumerate(team_board):
+                with cols[i % 3]:
+                    with st.container(border=True):
+                        st.markdown(f"#### 👤 {u_name}")
+                        c_ing, c_fin = st.columns(2)
+                        with c_ing:
+                            st.caption("🔴 进行中")
+                            if not doing.empty:
+                                for _, t in doing.iterrows():
+                                    cat_icon = "🔥" if t['category'] == '核心必办' else "☕"
+                                    st.markdown(f"<div class='todo-doing'><b>[{cat_icon}]</b> {t['content']}</div>", unsafe_allow_html=True)
+                            else: st.caption("-")
+                        with c_fin:
+                            st.caption("🟢 已完成")
+                            if not done.empty:
+                                for _, t in done.iterrows():
+                                    cat_icon = "🔥" if t['category'] == '核心必办' else "☕"
+                                    st.markdown(f"<div class='todo-done'><b>[{cat_icon}]</b> {t['content']}</div>", unsafe_allow_html=True)
+                            else: st.caption("-")
+        else: st.info("今日团队暂无动态")
             
     st.divider()
     with st.expander("📜 团队清单历史 (近10日)", expanded=False):
@@ -582,7 +802,7 @@ elif nav == "📅 请假中心":
                         st.error("请填写请假理由！")
                     else:
                         full_reason = f"【{l_type.split(' ')[1]}】{l_reason}"
-                        supabase.table("leaves").insert({
+                        store.table("leaves").insert({
                             "username": user,
                             "leave_date": str(l_date),
                             "period": l_period,
@@ -609,24 +829,57 @@ elif nav == "📅 请假中心":
         else: st.info("近30天无请假记录")
     else: st.info("暂无数据")
 
+    st.divider()
+    st.subheader("📊 出勤日历")
+    att_today = pd.Timestamp(datetime.date.today())
+    att_users = run_query("users")
+    att = views.get("出勤矩阵", attendance_frame, att_users, leaves, run_query("penalties"), run_query("tasks"), args=(str(att_today.date()),))
+    att_members = att_users.loc[att_users['role'] != 'admin', 'username'].tolist() if not att_users.empty else []
+    if att.empty: st.info("暂无数据")
+    else:
+        att_mode = st.radio("视图", ["👥 团队 (近30个工作日)", "🙋 个人日历 (近12周)"], horizontal=True, key="att_mode", label_visibility="collapsed")
+        if att_mode.startswith("👥"):
+            att_rows = attendance_query(att, att_today - pd.offsets.BDay(29), att_today)
+            att_rows['日'] = att_rows['date'].dt.strftime('%m-%d')
+            st.altair_chart(attendance_chart(att_rows, '日', 'username', height=28 * len(att_members) + 40), use_container_width=True)
+        else:
+            att_who = st.selectbox("成员", att_members, key="att_who") if role == 'admin' or user not in att_members else user
+            att_rows = attendance_query(att, att_today - pd.Timedelta(weeks=12) - pd.Timedelta(days=att_today.weekday()), att_today + pd.Timedelta(days=14), members=[att_who])
+            if att_rows.empty: st.info("暂无数据")
+            else:
+                att_rows = att_rows.sort_values('date', ascending=False)
+                att_rows['周'] = (att_rows['date'] - pd.to_timedelta(att_rows['date'].dt.weekday, unit='D')).dt.strftime('%m-%d 周')
+                att_rows['星期'] = att_rows['date'].dt.weekday.map(dict(enumerate("一二三四五"))).radd("周")
+                st.altair_chart(attendance_chart(att_rows, '星期', '周', height=30 * att_rows['周'].nunique() + 40), use_container_width=True)
+                att_cnt = att_rows[att_rows['date'] <= att_today]['state'].value_counts()
+                st.caption(" · ".join(f"{s_} {int(att_cnt.get(s_, 0))} 天" for s_ in STATES))
+
     if role == 'admin':
         st.divider()
         st.header("⚖️ 管理员审批台")
         pending = leaves[leaves['status'] == '待审批'] if not leaves.empty else pd.DataFrame()
         if not pending.empty:
-            st.warning(f"🔔 有 {len(pending)} 条申请待处理")
-            for _, p in pending.iterrows():
-                with st.container(border=True):
-                    c1, c2, c3 = st.columns([3, 1, 1])
-                    tag = "🔴 [突发]" if p['is_emergency'] else "🔵 [常规]"
-                    c1.markdown(f"**{p['username']}** | {p['leave_date']} {p['period']} | {tag}")
-                    c1.caption(f"理由: {p['reason']}")
-                    if c2.button("✅ 批准", key=f"ok_{p['id']}"):
-                        supabase.table("leaves").update({"status": "已批准"}).eq("id", int(p['id'])).execute()
-                        st.rerun()
-                    if c3.button("🚫 驳回", key=f"no_{p['id']}"):
-                        supabase.table("leaves").update({"status": "驳回"}).eq("id", int(p['id'])).execute()
-                        st.rerun()
+            st.warning(f"🔔 有 {len(pending)} 条申请待处理，勾选后批量处理")
+            ap_view = pending.sort_values(['leave_date', 'id'])[['id', 'username', 'leave_date', 'period', 'is_emergency', 'reason']].copy()
+            ap_view.insert(0, "选择", False)
+            ap_sel_all = st.checkbox("全选", key="ap_all")
+            if ap_sel_all: ap_view["选择"] = True
+            ap_edit = st.data_editor(
+                ap_view, hide_index=True, use_container_width=True, key=f"ap_editor_{ap_sel_all}",
+                disabled=['id', 'username', 'leave_date', 'period', 'is_emergency', 'reason'],
+                column_config={"is_emergency": st.column_config.CheckboxColumn("突发?"), "id": None}
+            )
+            ap_ids = [int(i) for i in ap_edit.loc[ap_edit["选择"], 'id']]
+            ap1, ap2, ap3 = st.columns([3, 1, 1])
+            ap_comm = ap1.text_input("批注 (可选)", key="ap_comm", label_visibility="collapsed", placeholder="批注 (可选)")
+            for ap_col, ap_label, ap_status in ((ap2, "✅ 批准", "已批准"), (ap3, "🚫 驳回", "驳回")):
+                if ap_col.button(f"{ap_label} ({len(ap_ids)})", key=f"ap_{ap_status}", disabled=not ap_ids):
+                    ap_vals = {"status": ap_status}
+                    if ap_comm: ap_vals["admin_comment"] = ap_comm
+                    # 只改仍为待审批的记录，避免覆盖其他管理员刚处理过的申请
+                    ap_n = bulk_update(store, "leaves", ap_vals, ap_ids, match={"status": "待审批"})
+                    st.toast(f"{ap_label} {ap_n} 条" + (f"，{len(ap_ids) - ap_n} 条已被他人处理" if ap_n < len(ap_ids) else ""))
+                    refresh_tables("leaves")
         else: st.success("🎉 所有申请已处理完毕")
 
         with st.expander("➕ 补录历史记录 (管理员通道)", expanded=False):
@@ -642,7 +895,7 @@ elif nav == "📅 请假中心":
                 a_reason = st.text_input("备注/理由")
                 if st.form_submit_button("🚀 确认添加"):
                     full_rsn = f"【{a_type.split(' ')[1]}】(管理员补录) {a_reason}"
-                    supabase.table("leaves").insert({
+                    store.table("leaves").insert({
                         "username": a_user,
                         "leave_date": str(a_date),
                         "period": a_period,
@@ -655,7 +908,7 @@ elif nav == "📅 请假中心":
 
         with st.expander("🛠️ 修改现有记录 (上帝模式)"):
             if not leaves.empty:
-                lid = st.selectbox("选择记录", leaves['id'], format_func=lambda x: f"{leaves[leaves['id']==x]['username'].values[0]} - {leaves[leaves['id']==x]['leave_date'].values[0]}")
+                lid = paged_select("选择记录", leaves, lambda d: d['username'].astype(str) + " - " + d['leave_date'].astype(str), key="gm_lid")
                 target = leaves[leaves['id']==lid].iloc[0]
                 ce1, ce2 = st.columns(2)
                 n_date = ce1.date_input("改日期", value=pd.to_datetime(target['leave_date']).date())
@@ -663,12 +916,39 @@ elif nav == "📅 请假中心":
                 n_status = st.selectbox("改状态", ["待审批", "已批准", "驳回"], index=["待审批", "已批准", "驳回"].index(target['status']))
                 n_comm = st.text_input("管理员批注", value=target['admin_comment'] or "")
                 if st.button("💾 保存修改", type="primary"):
-                    supabase.table("leaves").update({"leave_date": str(n_date), "period": n_period, "status": n_status, "admin_comment": n_comm}).eq("id", int(lid)).execute()
+                    store.table("leaves").update({"leave_date": str(n_date), "period": n_period, "status": n_status, "admin_comment": n_comm}).eq("id", int(lid)).execute()
                     st.success("记录已修正"); force_refresh()
 
+        with st.expander("🔎 出勤查询", expanded=False):
+            aq1, aq2 = st.columns(2)
+            aq_range = aq1.date_input("日期范围", value=(datetime.date.today() - datetime.timedelta(days=30), datetime.date.today()), key="aq_range")
+            aq_states = aq2.multiselect("状态", STATES, default=["缺勤", "矩阵未完成"], key="aq_states")
+            aq_mem = st.multiselect("成员 (留空为全部)", att_members, key="aq_mem")
+            if not att.empty and isinstance(aq_range, tuple) and len(aq_range) == 2:
+                aq_all = attendance_query(att, aq_range[0], aq_range[1], members=aq_mem)
+                st.markdown("**📊 按成员统计 (工作日天数)**")
+                st.dataframe(attendance_summary(aq_all[aq_all['state'] != '未到']), use_container_width=True)
+                aq_rows = aq_all[aq_all['state'].isin(aq_states)] if aq_states else aq_all
+                st.dataframe(aq_rows.assign(date=aq_rows['date'].dt.date).rename(columns={
+                    'date': '日期', 'username': '成员', 'state': '状态', 'excused': '已批请假', 'leave': '请假类型', 'leave_period': '请假时段',
+                    'pending': '待审批', 'penalties': '罚款次数', 'matrix': '矩阵任务'}), use_container_width=True, hide_index=True)
+
 # --- 1. 战略作战室 ---
+wallboard = False
 if nav == "🔭 战略作战室":
     st.header("🔭 战略作战室 (Strategy War Room)")
+    # 大屏模式：?wall=1&every=10 可直接打开 (电视常驻)
+    wall_c1, wall_c2 = st.columns([2, 3])
+    wallboard = wall_c1.toggle("📺 大屏模式 (只读 · 自动刷新)", value=st.query_params.get("wall") == "1", key="wall_on")
+    if wallboard:
+        try: wall_default = WALLBOARD_INTERVALS.index(int(st.query_params.get("every", os.environ.get("YANZU_WALLBOARD_INTERVAL", 10))))
+        except ValueError: wall_default = 1
+        wall_every = wall_c2.selectbox("刷新间隔 (秒)", WALLBOARD_INTERVALS, index=wall_default, key="wall_every")
+
+if nav == "🔭 战略作战室" and wallboard:
+    war_room_wallboard(wall_every)
+
+elif nav == "🔭 战略作战室":
     camps = run_query("campaigns")
     batts = run_query("battlefields")
     all_tasks = run_query("tasks")
@@ -687,48 +967,39 @@ if nav == "🔭 战略作战室":
                     new_camp_idx = st.number_input("排序权重", value=0, step=1)
                     if st.button("确立战役"):
                          d_val = str(new_camp_d) if new_camp_d else None
-                         supabase.table("campaigns").insert({"title": new_camp_t, "deadline": d_val, "order_index": new_camp_idx}).execute()
+                         store.table("campaigns").insert({"title": new_camp_t, "deadline": d_val, "order_index": new_camp_idx}).execute()
                          st.success("✅ 建立成功！"); force_refresh()
     st.divider()
     
+    groups = views.get("作战室", war_room_groups, camps, batts, all_tasks)
+    labels = task_labels()
     if not camps.empty:
         for _, camp in camps.iterrows():
             with st.container(border=True):
                 c1, c2, c3 = st.columns([3, 1.5, 0.5])
                 status_icon = "👑" if camp['id'] == -1 else "🚩"
                 c1.subheader(f"{status_icon} {camp['title']}")
-                if camp['deadline']: c2.caption(f"🏁 截止: {camp['deadline']}")
+                if pd.notna(camp['deadline']) and camp['deadline']: c2.caption(f"🏁 截止: {camp['deadline']}")
                 
                 if edit_mode and role == 'admin' and camp['id'] != -1:
                     with c3.popover("⚙️"):
                         ec_t = st.text_input("名称", value=camp['title'], key=f"ec_{camp['id']}")
-                        ec_d = st.date_input("截止", value=camp['deadline'], key=f"ecd_{camp['id']}")
+                        ec_d = st.date_input("截止", value=camp['deadline'] if pd.notna(camp['deadline']) and camp['deadline'] else None, key=f"ecd_{camp['id']}")
                         ec_idx = st.number_input("排序", value=int(camp.get('order_index', 0)), step=1, key=f"ecidx_{camp['id']}")
                         if st.button("保存", key=f"sv_c_{camp['id']}"):
-                            supabase.table("campaigns").update({"title": ec_t, "deadline": str(ec_d) if ec_d else None, "order_index": ec_idx}).eq("id", int(camp['id'])).execute()
+                            store.table("campaigns").update({"title": ec_t, "deadline": str(ec_d) if ec_d else None, "order_index": ec_idx}).eq("id", int(camp['id'])).execute()
                             st.success("✅ 保存成功"); force_refresh()
                         st.divider()
                         if st.button("🗑️ 删除", key=f"del_c_{camp['id']}", type="primary"):
-                            has_batt = not batts.empty and not batts[batts['campaign_id'] == camp['id']].empty
-                            if has_batt: st.error("请先清空战场！")
+                            if not groups.get(camp['id'], EMPTY_CAMP)["batts"].empty: st.error("请先清空战场！")
                             else: 
-                                supabase.table("campaigns").delete().eq("id", int(camp['id'])).execute()
+                                store.table("campaigns").delete().eq("id", int(camp['id'])).execute()
                                 st.success("✅ 删除成功"); force_refresh()
 
-                camp_batts = pd.DataFrame()
-                if not batts.empty:
-                    camp_batts = batts[batts['campaign_id'] == camp['id']]
-                    if 'order_index' in camp_batts.columns: camp_batts = camp_batts.sort_values('order_index')
-                
-                camp_tasks = pd.DataFrame()
-                if not all_tasks.empty and not camp_batts.empty:
-                    camp_batt_ids = camp_batts['id'].tolist()
-                    if 'battlefield_id' in all_tasks.columns:
-                        camp_tasks = all_tasks[all_tasks['battlefield_id'].isin(camp_batt_ids)]
-                
-                if not camp_tasks.empty:
-                    done_count = len(camp_tasks[camp_tasks['status'] == '完成'])
-                    prog = done_count / len(camp_tasks)
+                war = groups.get(camp['id'], EMPTY_CAMP)
+                camp_batts = war["batts"]
+                if war["total"]:
+                    prog = war["done"] / war["total"]
                     st.progress(prog, text=f"战役总进度: {int(prog*100)}%")
                 else: st.progress(0, text="整备中...")
 
@@ -742,33 +1013,27 @@ if nav == "🔭 战略作战室":
                                     eb_t = c_edit_1.text_input("名称", value=batt['title'], key=f"ebt_{int(batt['id'])}")
                                     eb_idx = c_edit_2.number_input("排序", value=int(batt.get('order_index', 0)), step=1, key=f"ebidx_{int(batt['id'])}")
                                     if c_edit_3.button("💾 保存", key=f"bsv_{int(batt['id'])}"):
-                                        supabase.table("battlefields").update({"title": eb_t, "order_index": eb_idx}).eq("id", int(batt['id'])).execute()
+                                        store.table("battlefields").update({"title": eb_t, "order_index": eb_idx}).eq("id", int(batt['id'])).execute()
                                         st.success("✅ 已更新"); force_refresh()
                                     if c_edit_3.button("🗑️ 删除", key=f"bdel_{int(batt['id'])}", type="primary"):
-                                        has_task = False
-                                        if not all_tasks.empty and 'battlefield_id' in all_tasks.columns:
-                                             if not all_tasks[all_tasks['battlefield_id'] == batt['id']].empty: has_task = True
-                                        if has_task: st.error("请先清空任务")
+                                        if batt['id'] in war["battlefields"]: st.error("请先清空任务")
                                         else:
-                                            supabase.table("battlefields").delete().eq("id", int(batt['id'])).execute()
+                                            store.table("battlefields").delete().eq("id", int(batt['id'])).execute()
                                             st.success("✅ 已删除"); force_refresh()
 
                             if edit_mode and role == 'admin':
                                 if st.button("➕ 在此发布任务", key=f"qp_btn_{batt['id']}"):
                                     quick_publish_modal(camp['id'], batt['id'], batt['title'])
                             
-                            b_tasks = pd.DataFrame()
-                            if not all_tasks.empty and 'battlefield_id' in all_tasks.columns:
-                                b_tasks = all_tasks[all_tasks['battlefield_id'] == batt['id']]
-                            if not b_tasks.empty:
-                                b_done = len(b_tasks[b_tasks['status'] == '完成'])
-                                st.progress(b_done/len(b_tasks), text="战场进度")
-                                active_bt = b_tasks[b_tasks['status'].isin(['待领取', '进行中', '返工', '待验收'])]
+                            bf = war["battlefields"].get(batt['id'])
+                            if bf:
+                                st.progress(bf["done"]/bf["total"], text="战场进度")
+                                active_bt = bf["active"]
                                 if not active_bt.empty:
                                     for idx, task in active_bt.iterrows():
                                         cols_task = st.columns([0.85, 0.15]) if edit_mode else [st.container()]
                                         with cols_task[0]:
-                                            render_task_card(task, batts, camps)
+                                            render_task_card(task, labels)
                                         if edit_mode and role == 'admin':
                                             with cols_task[1]:
                                                 if st.button("🔀", key=f"mv_{task['id']}", help="全域调动"):
@@ -782,15 +1047,14 @@ if nav == "🔭 战略作战室":
                         nb_t = st.text_input("新战场名称", key=f"nbt_{cid_safe}")
                         nb_idx = st.number_input("排序权重", value=0, step=1, key=f"nbidx_{cid_safe}")
                         if st.button("确认开辟", key=f"nb_btn_{cid_safe}"):
-                            supabase.table("battlefields").insert({"campaign_id": cid_safe, "title": nb_t, "order_index": nb_idx}).execute()
+                            store.table("battlefields").insert({"campaign_id": cid_safe, "title": nb_t, "order_index": nb_idx}).execute()
                             st.success("✅ 开辟成功！"); force_refresh()
 
 # --- 2. 任务大厅 ---
 elif nav == "📋 任务大厅":
     st.header("🛡️ 任务大厅")
     tdf = run_query("tasks")
-    batts = run_query("battlefields")
-    camps = run_query("campaigns")
+    labels = task_labels()
     
     st.subheader("🔥 待抢任务池")
     if not tdf.empty and 'status' in tdf.columns:
@@ -799,7 +1063,7 @@ elif nav == "📋 任务大厅":
             cols = st.columns(3)
             for i, (idx, row) in enumerate(pool.iterrows()):
                 with cols[i % 3]:
-                    render_task_card(row, batts, camps)
+                    render_task_card(row, labels)
                     with st.expander("👁️ 查看详情"):
                         st.write(row.get('description', '无详情'))
                     if st.button("⚡️ 抢单", key=f"g_{row['id']}", type="primary"):
@@ -808,28 +1072,22 @@ elif nav == "📋 任务大厅":
                             my_ongoing = tdf[(tdf['assignee'] == user) & (tdf['status'].isin(['进行中', '返工'])) & (tdf['type'] == '公共任务池')]
                             if len(my_ongoing) >= 2: can_grab = False
                         if can_grab:
-                            supabase.table("tasks").update({"status": "进行中", "assignee": user}).eq("id", int(row['id'])).execute()
+                            store.table("tasks").update({"status": "进行中", "assignee": user}).eq("id", int(row['id'])).execute()
                             show_success_modal("任务抢夺成功！")
                         else: st.warning("✋ 贪多嚼不烂！您已有 2 个公共任务在进行中（含返工）。")
     st.divider()
+    active, done = views.get("任务动态", activity_view, tdf)
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("🔭 实时动态 (最近35条)")
-        if not tdf.empty and 'status' in tdf.columns:
-            active = tdf[tdf['status'].isin(['进行中', '返工', '待验收'])].sort_values("created_at", ascending=False).head(35)
-            if not active.empty:
-                active['Deadline'] = active['deadline'].apply(format_deadline)
-                st.dataframe(active[['title', 'assignee', 'status', 'Deadline']], use_container_width=True, hide_index=True)
+        if active is not None:
+            if not active.empty: st.dataframe(active, use_container_width=True, hide_index=True)
             else: st.caption("暂无活跃任务")
         else: st.caption("暂无数据")
     with c2:
         st.subheader("📜 荣誉记录 (最近35条)")
-        if not tdf.empty and 'status' in tdf.columns:
-            done = tdf[tdf['status']=='完成'].sort_values('completed_at', ascending=False).head(35)
-            if not done.empty:
-                done['P'] = done.apply(lambda x: "研发任务" if x.get('is_rnd') else f"D{x['difficulty']}/T{x['std_time']}/Q{x['quality']}", axis=1)
-                done['💰 获益'] = done.apply(lambda x: 0 if x.get('is_rnd') else (safe_float(x.get('difficulty')) * safe_float(x.get('std_time')) * safe_float(x.get('quality'))), axis=1)
-                st.dataframe(done[['title', 'assignee', 'P', '💰 获益']], use_container_width=True, hide_index=True)
+        if done is not None:
+            if not done.empty: st.dataframe(done, use_container_width=True, hide_index=True)
             else: st.caption("暂无完成记录")
         else: st.caption("暂无数据")
 
@@ -840,11 +1098,15 @@ elif nav == "🗣️ 颜祖广场":
         txt = st.text_input("💬 说点什么...")
         if st.form_submit_button("发送"):
             if txt:
-                supabase.table("messages").insert({"username": user, "content": txt, "created_at": str(datetime.datetime.now())}).execute()
+                store.table("messages").insert({"username": user, "content": txt, "created_at": str(datetime.datetime.now())}).execute()
                 st.rerun()
     msgs = run_query("messages")
+    mq = st.text_input("🔎 搜索留言", key="msg_q")
     if not msgs.empty:
-        msgs = msgs.sort_values("created_at", ascending=False).head(50)
+        found = search_ids(mq, ["messages"])
+        if found is not None: msgs = msgs[msgs['id'].isin(found["messages"])]
+        msgs = page_of(msgs[msgs['username'] != "__NOTICE__"].sort_values("created_at", ascending=False), key="msg")
+        if msgs.empty: st.caption("没有匹配的留言")
         for _, m in msgs.iterrows():
             if m['username'] == "__NOTICE__": continue
             with st.chat_message("user" if m['username']==user else "assistant"):
@@ -857,25 +1119,12 @@ elif nav == "🏆 风云榜":
     
     users = run_query("users")
     if not users.empty:
-        members = users[users['role'] != 'admin']['username'].tolist()
-        
-        all_tasks = run_query("tasks")
-        all_pens = run_query("penalties")
-        all_rews = run_query("rewards")
-        
-        leader_data = []
-        for m in members:
-            val_7 = calculate_net_yvp(m, all_tasks, all_pens, all_rews, 7)
-            val_30 = calculate_net_yvp(m, all_tasks, all_pens, all_rews, 30)
-            val_total = calculate_net_yvp(m, all_tasks, all_pens, all_rews)
-            leader_data.append({
-                "成员": m,
-                "📅 7天净值": val_7,
-                "🗓️ 30天净值": val_30,
-                "💰 总净资产": val_total
-            })
-        
-        df_leader = pd.DataFrame(leader_data).sort_values("💰 总净资产", ascending=False)
+        lb_now = pd.Timestamp.now().floor("min")
+        df_leader = views.get("风云榜", leaderboard_view, users, run_query("tasks"), run_query("penalties"), run_query("rewards"), args=(lb_now,)).copy()
+        ledger = ledger_frame()
+        lb_today = str(datetime.date.today())
+        moves = views.get("排名变化", lambda led, members, today: rank_changes(led, list(members), today=today), ledger, args=(tuple(df_leader['成员']), lb_today))
+        df_leader.insert(1, "📈 7天排名", df_leader['成员'].map(lambda m: f"▲{moves[m]}" if moves.get(m, 0) > 0 else (f"▼{-moves[m]}" if moves.get(m, 0) < 0 else "—")))
         
         if len(df_leader) >= 3:
             medals = ["🥇", "🥈", "🥉"]
@@ -893,6 +1142,12 @@ elif nav == "🏆 风云榜":
                 """, unsafe_allow_html=True)
         
         st.dataframe(df_leader, use_container_width=True, hide_index=True)
+
+        st.subheader("📈 净资产走势 (近30天)")
+        trend_who = st.multiselect("成员", df_leader['成员'].tolist(), default=df_leader['成员'].head(5).tolist(), key="lb_trend", label_visibility="collapsed")
+        trend = views.get("净值走势", lambda led, who, today: ledger_series(led, list(who), days=30, today=today), ledger, args=(tuple(trend_who), lb_today))
+        if not trend.empty: st.line_chart(trend)
+        else: st.info("暂无走势数据")
             
     st.divider()
     c1, c2 = st.columns(2)
@@ -915,9 +1170,9 @@ elif nav == "🏰 个人中心":
     if role == 'admin':
         st.header("👑 统帅后台")
         if datetime.date.today().day in [10, 20, 30]:
-            st.warning("📅 **今日为备份提醒日，请前往备份页签下载全量备份！**")
+            st.warning("📅 **今日为备份提醒日，请前往备份页签生成快照 (差异备份仅需数秒)！**")
         
-        tabs = st.tabs(["⚡️ 我的战场", "💰 分润统计", "🚀 发布任务", "🛠️ 全量管理", "🎁 人员与奖惩", "⚖️ 裁决审核", "📢 公告维护", "💾 备份恢复"])
+        tabs = st.tabs(["⚡️ 我的战场", "💰 分润统计", "🚀 发布任务", "🛠️ 全量管理", "🎁 人员与奖惩", "⚖️ 裁决审核", "📢 公告维护", "💾 备份恢复", "🩺 性能诊断"])
         
         with tabs[0]: 
             st.subheader("⚡️ 快捷派发")
@@ -925,7 +1180,7 @@ elif nav == "🏰 个人中心":
             quick_t = qc1.text_input("内容", key="adm_q_t")
             quick_d = qc2.date_input("截止", value=None, key="adm_q_d")
             if st.button("派发给我", type="primary", key="adm_q_btn"):
-                supabase.table("tasks").insert({"title": quick_t, "difficulty": 0, "std_time": 0, "status": "进行中", "assignee": user, "type": "AdminSelf", "deadline": str(quick_d) if quick_d else None, "battlefield_id": -1}).execute()
+                store.table("tasks").insert({"title": quick_t, "difficulty": 0, "std_time": 0, "status": "进行中", "assignee": user, "type": "AdminSelf", "deadline": str(quick_d) if quick_d else None, "battlefield_id": -1}).execute()
                 show_success_modal("已添加")
             st.divider()
             st.subheader("🛡️ 进行中")
@@ -939,7 +1194,7 @@ elif nav == "🏰 个人中心":
                             st.markdown(f"**{r['title']}**")
                             st.write(f"📅 **截止**: {format_deadline(r.get('deadline'))}")
                         if ic2.button("✅ 完成", key=f"fin_{r['id']}"):
-                            supabase.table("tasks").update({"status": "完成", "quality": 1.0, "completed_at": str(datetime.date.today()), "feedback": "统帅自结"}).eq("id", int(r['id'])).execute()
+                            store.table("tasks").update({"status": "完成", "quality": 1.0, "completed_at": str(datetime.date.today()), "feedback": "统帅自结"}).eq("id", int(r['id'])).execute()
                             show_success_modal("已归档")
             show_task_history(user, role)
 
@@ -955,6 +1210,32 @@ elif nav == "🏰 个人中心":
                     csv = report.to_csv(index=False).encode('utf-8')
                     st.download_button("📥 下载报表", csv, f"yvp_report.csv", "text/csv")
                 else: st.warning("无数据")
+            with st.expander("🧾 财务导出 (汇总 + 任务 / 罚款 / 奖励明细)", expanded=False):
+                st.caption("按所选日期范围导出，明细与汇总同一口径；CSV / Parquet 为每张表一个文件的 zip。数据未变时重复导出直接复用上次的文件。")
+                ex1, ex2 = st.columns([3, 1])
+                ex_fmt = ex1.radio("格式", list(EXPORT_FORMATS), horizontal=True, key="ex_fmt", label_visibility="collapsed")
+                if ex2.button("🧾 生成", key="ex_btn"):
+                    with st.spinner("导出中..."):
+                        try:
+                            st.session_state.ex_file = export_payroll(ex_fmt, calculate_period_stats(d_start, d_end), run_query("users"), run_query("tasks"),
+                                                                      run_query("penalties"), run_query("rewards"), d_start, d_end)
+                        except ImportError: st.error("Parquet 导出需要安装 pyarrow")
+                        except Exception as e: st.error(f"导出失败: {e}")
+                ex_file = st.session_state.get("ex_file")
+                if ex_file and os.path.exists(ex_file):
+                    ex_ext = os.path.splitext(ex_file)[1]
+                    with open(ex_file, 'rb') as ex_fh:
+                        st.download_button(f"📥 下载 {os.path.basename(ex_file)}", ex_fh, f"yvp_payroll_{d_start}_{d_end}{ex_ext}",
+                                           next(m for e, m in EXPORT_FORMATS.values() if ex_ext == f".{e}"), key="ex_dl")
+            with st.expander("📒 YVP 日账本", expanded=False):
+                st.caption("每人每天的产出 / 罚款 / 奖励 / 净值，风云榜与个人走势读取此表；平时自动重算最近几天，补录或改判久远记录后可从历史全量重建。")
+                if st.button("🧮 从历史重建日账本", key="led_backfill"):
+                    with st.spinner("重建中..."):
+                        try:
+                            led_res = sync_ledger(store, run_query("users"), run_query("tasks"), run_query("penalties"), run_query("rewards"), backfill=True)
+                            load_table.clear(LEDGER_TABLE); refresh_ledger.clear()
+                            st.success(f"✅ 共 {led_res['rows']} 行，写入 {led_res['written']} 行，清理 {led_res['deleted']} 行")
+                        except Exception as e: st.error(f"重建失败 (请确认线上已建 {LEDGER_TABLE} 表): {e}")
 
         with tabs[2]: # 发布
             camps = run_query("campaigns")
@@ -1010,23 +1291,65 @@ elif nav == "🏰 个人中心":
                             "deadline": None if no_d else str(d_inp), "type": ttype, "battlefield_id": int(sel_batt_id), "is_rnd": is_rnd_task
                         })
                     if tasks_to_insert:
-                        supabase.table("tasks").insert(tasks_to_insert).execute()
+                        store.table("tasks").insert(tasks_to_insert).execute()
                         show_success_modal(f"成功发布 {len(tasks_to_insert)} 条任务！")
                     else: st.error("请选择至少一名执行者")
 
+            st.divider()
+            with st.expander("📥 批量导入任务 (CSV / XLSX)", expanded=False):
+                st.caption("必填列：任务标题 / 战役 / 战场 (按标题匹配)；可选：详情 / 难度 / 工时 (留空为 1.0) / 执行人 (多人用逗号分隔，每人一条；留空进公共任务池) / 截止日期 / 研发 (是/否)。")
+                st.download_button("📄 下载模板", TASK_TEMPLATE.encode("utf-8-sig"), file_name="任务导入模板.csv", mime="text/csv", key="ti_tpl")
+                ti_key = f"ti_up_{st.session_state.get('ti_gen', 0)}"
+                ti_f = st.file_uploader("上传任务表", type=['csv', 'xlsx'], key=ti_key)
+                if ti_f:
+                    udf = run_query("users")
+                    try:
+                        ti_plan, ti_bad = build_task_import(read_table_file(ti_f), camps, batts, udf[udf['role'] != 'admin']['username'].tolist() if not udf.empty else [], run_query("tasks"))
+                    except Exception as e:
+                        ti_plan = None; st.error(f"解析失败: {e}")
+                    if ti_plan is not None:
+                        if not ti_bad.empty:
+                            st.warning(f"⚠️ {len(ti_bad)} 行数据无效，将被跳过")
+                            st.dataframe(ti_bad, use_container_width=True, hide_index=True)
+                        st.markdown("**📊 导入预览 (按战场)**")
+                        st.dataframe(summarize_task_import(ti_plan), use_container_width=True, hide_index=True)
+                        st.caption("任务明细")
+                        st.dataframe(ti_plan[['行号', 'title', 'campaign', 'battlefield', 'assignee', 'status', 'difficulty', 'std_time', 'deadline', 'is_rnd']], use_container_width=True, hide_index=True)
+                        ti_recs, ti_lines = task_import_records(ti_plan)
+                        if ti_recs and st.button(f"🚀 确认导入 ({len(ti_recs)} 条)", type="primary", key="ti_btn"):
+                            ti_bar = st.progress(0.0, text="写入中...")
+                            ti_err = []
+                            # 换一个上传框 key：文件和解析结果随之清空，按钮不会再对同一批数据生效
+                            st.session_state['ti_gen'] = st.session_state.get('ti_gen', 0) + 1
+                            st.session_state.pop(ti_key, None)
+                            try:
+                                ti_n = bulk_insert(store, "tasks", ti_recs, on_progress=lambda d, t: ti_bar.progress(d / t, text=f"已处理 {d}/{t}"),
+                                                   on_error=lambda i, e: ti_err.append({"行号": ti_lines[i], "任务": ti_recs[i]['title'], "执行人": ti_recs[i]['assignee'], "错误": str(e)[:200]}))
+                            except Exception as e:
+                                st.error(f"❌ 写入中断: {str(e)[:200]}。部分任务可能已写入，重新上传同一文件时已存在的任务会自动跳过。")
+                                load_table.clear("tasks")
+                            else:
+                                if ti_err:
+                                    st.error(f"❌ {len(ti_err)} 条写入失败，其余 {ti_n} 条已发布")
+                                    st.dataframe(pd.DataFrame(ti_err), use_container_width=True, hide_index=True)
+                                    load_table.clear("tasks")
+                                else: show_success_modal(f"成功导入 {ti_n} 条任务！")
+                        elif not ti_recs: st.info("没有可导入的任务")
+
         with tabs[3]: # 全量管理
             st.subheader("🛠️ 精准修正")
             tdf = run_query("tasks"); udf = run_query("users")
             all_users = list(udf['username'].unique()) if not udf.empty else []
             cf1, cf2 = st.columns(2)
             fu = cf1.selectbox("筛选人员", ["全部"] + all_users, key="mng_u")
-            sk = cf2.text_input("搜标题", key="mng_k")
-            fil = tdf.copy()
+            sk = cf2.text_input("搜标题 / 详情", key="mng_k")
+            fil = tdf
             if not fil.empty:
                 if fu != "全部": fil = fil[fil['assignee'] == fu]
-                if sk: fil = fil[fil['title'].str.contains(sk, case=False, na=False)]
+                found = search_ids(sk, ["tasks"])
+                if found is not None: fil = fil[fil['id'].isin(found["tasks"])]
             if not fil.empty:
-                tid = st.selectbox("选择任务", fil['id'], format_func=lambda x: f"ID:{x}|{fil[fil['id']==x]['title'].values[0]}", key="mng_sel")
+                tid = paged_select("选择任务", fil, lambda d: "ID:" + d['id'].astype(str) + "|" + d['title'].astype(str), key="mng_sel")
                 tar = fil[fil['id']==tid].iloc[0]
                 with st.container(border=True):
                     c_edit_1, c_edit_2 = st.columns([3, 1])
@@ -1053,13 +1376,28 @@ elif nav == "🏰 个人中心":
                     no_d = c_s3.checkbox("无截止", value=(curr_d is None), key=f"end_{tid}")
 
                     if st.button("💾 保存修改", key=f"eb_{tid}", type="primary"):
-                        supabase.table("tasks").update({"title": new_title, "description": new_desc, "assignee": new_assignee, "deadline": None if no_d else str(new_d), "difficulty": new_diff, "std_time": new_stdt, "quality": new_qual, "status": new_status, "is_rnd": edit_is_rnd}).eq("id", int(tid)).execute()
+                        store.table("tasks").update({"title": new_title, "description": new_desc, "assignee": new_assignee, "deadline": None if no_d else str(new_d), "difficulty": new_diff, "std_time": new_stdt, "quality": new_qual, "status": new_status, "is_rnd": edit_is_rnd}).eq("id", int(tid)).execute()
                         show_success_modal("更新成功")
                     with st.popover("🗑️ 删除"):
                         if st.button("确认", key=f"btn_del_task_{tid}", type="primary"):
-                            supabase.table("tasks").delete().eq("id", int(tid)).execute()
+                            store.table("tasks").delete().eq("id", int(tid)).execute()
                             show_success_modal("删除成功")
 
+            st.divider()
+            st.subheader("🔎 全文检索")
+            gq = st.text_input("搜索任务 / 留言 / 今日清单", key="gs_q", placeholder="输入关键词，中英文均可").strip()
+            if gq:
+                gs_hits = search_ids(gq, ["tasks", "messages", "daily_todos"])
+                gs_cols = {"tasks": (["id", "title", "assignee", "status", "deadline"], "📋 任务"),
+                           "messages": (["id", "username", "content", "created_at"], "🗣️ 留言"),
+                           "daily_todos": (["id", "username", "date", "content"], "📝 今日清单")}
+                for gs_kind, gs_tab in zip(gs_cols, st.tabs([f"{lbl} ({len(gs_hits[k])})" for k, (_, lbl) in gs_cols.items()])):
+                    with gs_tab:
+                        gs_df = run_query(gs_kind)
+                        gs_df = gs_df[gs_df['id'].isin(gs_hits[gs_kind])].sort_values('id', ascending=False) if not gs_df.empty else gs_df
+                        if gs_df.empty: st.caption("没有匹配的记录")
+                        else: st.dataframe(page_of(gs_df, key=f"gs_{gs_kind}")[gs_cols[gs_kind][0]], use_container_width=True, hide_index=True)
+
         with tabs[4]: # 奖惩
             udf = run_query("users")
             members = udf[udf['role']!='admin']['username'].tolist() if not udf.empty else []
@@ -1069,7 +1407,7 @@ elif nav == "🏰 个人中心":
                 target_p = st.selectbox("缺勤成员", members, key="pen_u")
                 date_p = st.date_input("缺勤日期", key="pen_d")
                 if st.button("🔴 记录缺勤", key="btn_pen"):
-                    supabase.table("penalties").insert({"username": target_p, "occurred_at": str(date_p), "reason": "缺勤"}).execute()
+                    store.table("penalties").insert({"username": target_p, "occurred_at": str(date_p), "reason": "缺勤"}).execute()
                     show_success_modal("已记录")
                 st.caption("最近记录 (可撤销)")
                 pens = run_query("penalties")
@@ -1078,7 +1416,7 @@ elif nav == "🏰 个人中心":
                         c1, c2 = st.columns([4,1])
                         c1.write(f"{p['username']} - {p['occurred_at']}")
                         if c2.button("🗑️", key=f"del_pen_{p['id']}"):
-                            supabase.table("penalties").delete().eq("id", int(p['id'])).execute(); st.rerun()
+                            store.table("penalties").delete().eq("id", int(p['id'])).execute(); st.rerun()
             with c_r:
                 st.markdown("#### 🎁 奖励赏赐")
                 target_r = st.selectbox("赏赐成员", members, key="rew_u")
@@ -1089,7 +1427,7 @@ elif nav == "🏰 个人中心":
                         # V42.8 双重保险写入
                         # 方案A: 尝试带ISO时间戳
                         try:
-                            supabase.table("rewards").insert({
+                            store.table("rewards").insert({
                                 "username": target_r, 
                                 "amount": float(amt_r), 
                                 "reason": reason_r,
@@ -1098,7 +1436,7 @@ elif nav == "🏰 个人中心":
                             show_success_modal(f"已赏赐 {target_r} {amt_r}")
                         except Exception:
                             # 方案B: 不带时间戳，让DB自动生成
-                            supabase.table("rewards").insert({
+                            store.table("rewards").insert({
                                 "username": target_r, 
                                 "amount": float(amt_r), 
                                 "reason": reason_r
@@ -1118,17 +1456,43 @@ elif nav == "🏰 个人中心":
                                 new_rew_r = st.text_input("改理由", r['reason'], key=f"err_{r['id']}")
                                 new_rew_a = st.number_input("改金额", value=float(r['amount']), key=f"era_{r['id']}")
                                 if st.button("保存", key=f"ersv_{r['id']}"):
-                                    supabase.table("rewards").update({"reason": new_rew_r, "amount": new_rew_a}).eq("id", int(r['id'])).execute()
+                                    store.table("rewards").update({"reason": new_rew_r, "amount": new_rew_a}).eq("id", int(r['id'])).execute()
                                     st.rerun()
                                 if st.button("🗑️", key=f"del_rew_{r['id']}"):
-                                    supabase.table("rewards").delete().eq("id", int(r['id'])).execute(); st.rerun()
+                                    store.table("rewards").delete().eq("id", int(r['id'])).execute(); st.rerun()
+
+            st.divider()
+            with st.expander("📥 矩阵点赞批量导入 (CSV / XLSX)", expanded=False):
+                st.caption("列：username(成员) / video(视频) / likes(点赞数) / date(日期)。同一视频只按最高点赞计奖，已发放部分自动扣除。")
+                like_f = st.file_uploader("上传点赞数据", type=['csv', 'xlsx'], key="like_up")
+                if like_f:
+                    try:
+                        like_plan, like_bad = build_like_rewards(read_table_file(like_f), members, run_query("rewards"))
+                    except Exception as e:
+                        like_plan = None; st.error(f"解析失败: {e}")
+                    if like_plan is not None:
+                        if not like_bad.empty:
+                            st.warning(f"⚠️ {len(like_bad)} 行数据无效，已跳过")
+                            st.dataframe(like_bad, use_container_width=True, hide_index=True)
+                        st.markdown("**📊 奖励预览 (按成员)**")
+                        st.dataframe(summarize_like_rewards(like_plan), use_container_width=True, hide_index=True)
+                        st.caption("计奖明细")
+                        st.dataframe(like_plan[['username', 'video', 'likes', 'date', '阶梯奖励', '已发放', 'amount']], use_container_width=True, hide_index=True)
+                        like_recs = like_reward_records(like_plan)
+                        if like_recs and st.button(f"🎁 确认批量赏赐 ({len(like_recs)} 条)", type="primary", key="like_btn"):
+                            like_bar = st.progress(0.0, text="写入中...")
+                            try:
+                                bulk_insert(store, "rewards", like_recs, on_progress=lambda d, t: like_bar.progress(d / t, text=f"已写入 {d}/{t}"))
+                                show_success_modal(f"已批量赏赐 {len(like_recs)} 条，共 {round(sum(r['amount'] for r in like_recs), 2)} 点")
+                            except Exception as e: st.error(f"❌ 写入中断: {e}")
+                        elif not like_recs: st.info("没有需要新发放的奖励")
 
         with tabs[5]: # 裁决
             pend = run_query("tasks")
             if not pend.empty and 'status' in pend.columns:
                 pend = pend[pend['status'] == '待验收']
                 if not pend.empty:
-                    sel_p = st.selectbox("待审任务", pend['id'], format_func=lambda x: pend[pend['id']==x]['title'].values[0])
+                    sel_p = paged_select("待审任务", pend, lambda d: d['title'].astype(str), key="jd_sel")
                     with st.container(border=True):
                         res = st.selectbox("裁决结果", ["完成", "返工"])
                         if res == "完成": qual = st.slider("质量评分", 0.0, 3.0, 1.0, 0.1)
@@ -1137,8 +1501,36 @@ elif nav == "🏰 个人中心":
                         if st.button("提交审核"):
                             cat = str(datetime.date.today()) if res=="完成" else None
                             q_val = qual if res=="完成" else 0.0
-                            supabase.table("tasks").update({"quality": q_val, "status": res, "feedback": fb, "completed_at": cat}).eq("id", int(sel_p)).execute()
+                            store.table("tasks").update({"quality": q_val, "status": res, "feedback": fb, "completed_at": cat}).eq("id", int(sel_p)).execute()
                             show_success_modal("已裁决")
+
+                    with st.expander(f"⚡ 批量裁决 ({len(pend)} 条待审)"):
+                        st.caption("勾选任务并逐行填写评分与结果；相同结果 / 评分 / 反馈的任务合并为一次更新。")
+                        rv_view = pend[['id', 'title', 'assignee', 'difficulty', 'std_time']].copy()
+                        rv_view.insert(0, "选择", False)
+                        rv_view["结果"] = "完成"
+                        rv_view["质量评分"] = 1.0
+                        rv_view["反馈"] = ""
+                        rv_edit = st.data_editor(
+                            rv_view, hide_index=True, use_container_width=True, key="rv_editor",
+                            disabled=['id', 'title', 'assignee', 'difficulty', 'std_time'],
+                            column_config={
+                                "id": None,
+                                "结果": st.column_config.SelectboxColumn("结果", options=["完成", "返工"], required=True),
+                                "质量评分": st.column_config.NumberColumn("质量评分", min_value=0.0, max_value=3.0, step=0.1),
+                            }
+                        )
+                        rv_sel = rv_edit[rv_edit["选择"]]
+                        if st.button(f"提交批量裁决 ({len(rv_sel)})", type="primary", key="rv_btn", disabled=rv_sel.empty):
+                            rv_today = str(datetime.date.today())
+                            rv_sel = rv_sel.assign(q=rv_sel["质量评分"].where(rv_sel["结果"] == "完成", 0.0).fillna(1.0).round(2), fb=rv_sel["反馈"].fillna(""))
+                            rv_n = 0
+                            for (rv_res, rv_q, rv_fb), grp in rv_sel.groupby(["结果", "q", "fb"]):
+                                rv_n += bulk_update(store, "tasks", {"quality": float(rv_q), "status": rv_res, "feedback": rv_fb,
+                                                                     "completed_at": rv_today if rv_res == "完成" else None},
+                                                    [int(i) for i in grp['id']], match={"status": "待验收"})
+                            st.toast(f"已裁决 {rv_n} 条任务")
+                            refresh_tables("tasks")
                 else: st.info("暂无待审任务")
 
         with tabs[6]: # 公告
@@ -1147,46 +1539,130 @@ elif nav == "🏰 个人中心":
 
         with tabs[7]: # 备份与恢复
             st.subheader("💾 备份与恢复")
-            d1=run_query("users"); d2=run_query("tasks"); d3=run_query("penalties"); d4=run_query("messages"); d5=run_query("rewards"); d6=run_query("daily_todos")
-            buf = io.StringIO()
-            buf.write("===USERS===\n"); d1.to_csv(buf, index=False)
-            buf.write("\n===TASKS===\n"); d2.to_csv(buf, index=False)
-            buf.write("\n===PENALTIES===\n"); d3.to_csv(buf, index=False)
-            buf.write("\n===MESSAGES===\n"); d4.to_csv(buf, index=False)
-            buf.write("\n===REWARDS===\n"); d5.to_csv(buf, index=False)
-            buf.write("\n===DAILY_TODOS===\n"); d6.to_csv(buf, index=False)
-            st.download_button("📥 下载全量备份 (Backup)", buf.getvalue(), f"backup_{datetime.date.today()}.txt")
+            st.caption(f"分页读取全部 {len(BACKUP_TABLES)} 张表，逐表流式写入 gzip CSV，附带行数与校验和清单。已有快照时可做差异备份，只保存新增/修改/删除的行。")
+            bk_store = SnapshotStore(BACKUP_DIR)
+            bk_c1, bk_c2 = st.columns(2)
+            bk_full = bk_c1.button("📦 全量备份", type="primary", key="bk_btn")
+            bk_diff = bk_c2.button("🧩 差异备份 (仅变化)", key="bk_diff_btn", disabled=bk_store.latest() is None)
+            if bk_full or bk_diff:
+                bk_bar = st.progress(0.0, text="准备中...")
+                try:
+                    bk_m = bk_store.snapshot(store, full=bk_full, on_progress=lambda i, t, n: bk_bar.progress((i + 1) / len(BACKUP_TABLES), text=f"{t}: 已扫描 {n} 行"))
+                    bk_bar.progress(1.0, text=f"✅ 备份完成：{bk_m['snapshot_id']}")
+                except Exception as e: st.error(f"备份失败: {e}")
+
+            bk_snaps = bk_store.manifests()
+            if bk_snaps:
+                st.markdown("**🔗 快照链**")
+                st.dataframe(pd.DataFrame([{
+                    "快照": m['snapshot_id'], "类型": "全量" if m['kind'] == 'full' else "差异", "时间": m['created_at'][:19].replace("T", " "),
+                    "上一快照": m['parent_id'] or "-",
+                    "写入行数": sum(v['rows'] for v in m['tables'].values()),
+                    "删除行数": sum(v.get('deleted', 0) for v in m['tables'].values()),
+                    "大小(KB)": round(m['size'] / 1024, 1)
+                } for m in reversed(bk_snaps)]), use_container_width=True, hide_index=True)
+                bk_sel = st.selectbox("选择快照", [m['snapshot_id'] for m in reversed(bk_snaps)], key="bk_sel")
+                bk_d1, bk_d2 = st.columns(2)
+                with open(bk_store.file_of(bk_sel), 'rb') as bk_fh:
+                    bk_d1.download_button("📥 下载该快照", bk_fh, f"backup_{bk_sel}.zip", "application/zip", key="bk_dl")
+                with bk_d2.popover("⏪ 恢复到此时间点"):
+                    st.warning("将按 全量 + 差异 的快照链回放，线上数据会被覆盖为该时刻的状态。")
+                    if st.button("🚨 确认恢复", type="primary", key="bk_pit_btn"):
+                        pit_bar = st.progress(0.0, text="校验快照链...")
+                        try:
+                            _, pit_report = bk_store.restore(store, bk_sel, on_progress=restore_progress(pit_bar))
+                            st.cache_data.clear()
+                            show_restore_report(pit_report)
+                        except Exception as e: st.error(f"恢复失败: {e}")
+            if isinstance(store.inner, ReplicaBackend):
+                st.divider()
+                st.markdown("**🛰️ 本地只读副本**")
+                st.caption("当前为副本模式：页面读取本地副本，写入直达线上主库。可随时从主库全量同步副本。")
+                if st.button("🔄 同步副本", key="rep_sync_btn"):
+                    rep_bar = st.progress(0.0, text="同步中...")
+                    rep_counts = store.sync(on_progress=lambda t, n: rep_bar.progress(0.5, text=f"{t}: {n} 行"))
+                    rep_bar.progress(1.0, text="✅ 同步完成")
+                    st.cache_data.clear()
+                    st.json(rep_counts)
             st.divider()
-            upf = st.file_uploader("📤 上传备份文件进行恢复", type=['txt'], key="up_f")
+            upf = st.file_uploader("📤 上传备份文件进行恢复 (.zip，兼容旧版 .txt)", type=['zip', 'txt'], key="up_f")
             if upf:
+                st.caption("恢复流程：校验备份包 → 分块并发写入 → 全部落库后清理多余旧行 → 核对行数与校验和。中途失败不会清空数据库，可直接重试。")
                 if st.button("🚨 确认覆盖恢复", type="primary"):
+                    rs_bar = st.progress(0.0, text="校验备份包...")
                     try:
-                        content = upf.getvalue().decode("utf-8")
-                        s_u = content.split("===USERS===\n")[1].split("===TASKS===")[0].strip()
-                        s_t = content.split("===TASKS===\n")[1].split("===PENALTIES===")[0].strip()
-                        s_p = content.split("===PENALTIES===\n")[1].split("===MESSAGES===")[0].strip()
-                        s_m = content.split("===MESSAGES===\n")[1].split("===REWARDS===")[0].strip()
-                        s_r = content.split("===REWARDS===\n")[1].split("===DAILY_TODOS===")[0].strip()
-                        s_d = content.split("===DAILY_TODOS===\n")[1].strip()
-                        supabase.table("users").delete().neq("username", "_").execute()
-                        supabase.table("tasks").delete().neq("id", -1).execute()
-                        supabase.table("penalties").delete().neq("id", -1).execute()
-                        supabase.table("messages").delete().neq("id", -1).execute()
-                        supabase.table("rewards").delete().neq("id", -1).execute()
-                        supabase.table("daily_todos").delete().neq("id", -1).execute()
-                        if s_u: supabase.table("users").insert(pd.read_csv(io.StringIO(s_u)).to_dict('records')).execute()
-                        if s_t: supabase.table("tasks").insert(pd.read_csv(io.StringIO(s_t)).to_dict('records')).execute()
-                        if s_p: supabase.table("penalties").insert(pd.read_csv(io.StringIO(s_p)).to_dict('records')).execute()
-                        if s_m: supabase.table("messages").insert(pd.read_csv(io.StringIO(s_m)).to_dict('records')).execute()
-                        if s_r: supabase.table("rewards").insert(pd.read_csv(io.StringIO(s_r)).to_dict('records')).execute()
-                        if s_d: supabase.table("daily_todos").insert(pd.read_csv(io.StringIO(s_d)).to_dict('records')).execute()
-                        st.success("✅ 恢复完成！"); time.sleep(1); st.rerun()
+                        if upf.name.lower().endswith('.txt'):
+                            rs_src = io.BytesIO()
+                            convert_legacy_backup(upf.getvalue().decode("utf-8"), rs_src)
+                            rs_src.seek(0)
+                        else: rs_src = upf
+                        _, rs_report = restore_archive(store, rs_src, on_progress=restore_progress(rs_bar))
+                        st.cache_data.clear()
+                        show_restore_report(rs_report)
                     except Exception as e: st.error(f"恢复失败: {e}")
 
+        with tabs[8]: # 性能诊断
+            st.caption("每次页面刷新 (rerun) 的分段耗时与后端调用，只保留本进程最近的记录。设置环境变量 YANZU_PROFILE_LOG 可同时追加写入 JSON lines 文件。")
+            if warmup is not None:
+                st.markdown(f"**🔥 启动预热**：{warmup.summary()}")
+                st.dataframe(warmup.frame(), use_container_width=True, hide_index=True)
+            if feed is not None:
+                fs = feed.status()
+                fs_state = f"🟢 推送中 (自 {datetime.datetime.fromtimestamp(fs['since']).strftime('%H:%M:%S')})" if fs['live'] else f"🟠 已断开，按 {feed.poll_ttl:g} 秒轮询"
+                st.caption(f"📡 变更推送 ({fs['mode']})：{fs_state}" + (f" · {fs['error']}" if fs['error'] else "") + " · "
+                           + "、".join(f"{t}×{n}" for t, (n, _) in fs['tables'].items() if n)
+                           + (f" · 仍按轮询：{'、'.join(fs['polling'])}" if fs['polling'] else ""))
+                if fs['missing']: st.warning(f"⚠️ 写入后没有收到推送事件，这些表可能未加入 Realtime 发布：{'、'.join(fs['missing'])}")
+            else: st.caption(f"📡 变更推送已关闭，表快照按 {CACHE_TTL} 秒 TTL 轮询")
+            rp = reader.pool_stats()
+            st.caption(f"🛡️ 读请求：熔断器 {reader.breaker.state} · 进行中 {rp['inflight']} / {rp['workers']} 线程 · 超时未返回 {rp['abandoned']} (上限 {rp['max_abandoned']})")
+            vw = views.stats()
+            st.caption(f"🧠 派生视图缓存：{vw['views']} 项 · 命中 {vw['hits']} / 未命中 {vw['misses']} · " + "、".join(f"{n}×{c}" for n, c in vw['names'].items()))
+            if tier is not None:
+                ts_ = tier.stats()
+                st.caption(f"🗄️ 共享缓存 ({ts_['path']})：{ts_['entries']} 项 · {ts_['bytes'] / 2 ** 20:.1f} / {ts_['max_bytes'] / 2 ** 20:.0f} MB · "
+                           f"命中 {ts_['hits']} / 未命中 {ts_['misses']} · 本进程计算 {ts_['computed']} · 等待他人 {ts_['waited']}")
+            if tier_error: st.warning(f"⚠️ 共享缓存未启用：{tier_error}")
+            with st.expander("🔍 分析引擎一致性校验 (诊断)", expanded=False):
+                # 一致性由 tests/test_analytics.py 保证，这里只用线上数据复核近 30 天
+                st.caption("对照 SQL 分析镜像与原 pandas 逐人计算的 7天 / 30天 / 全部净值及近 30 天应发YVP。")
+                if st.button("开始校验", key="eq_btn"):
+                    eq_end = datetime.date.today()
+                    eq_diff = check_equivalence(synced_mirror(), run_query("users"), run_query("tasks"), run_query("penalties"), run_query("rewards"), eq_end - datetime.timedelta(days=30), eq_end)
+                    if eq_diff.empty: st.success("✅ 全部一致")
+                    else: st.dataframe(eq_diff, use_container_width=True, hide_index=True)
+            pf_runs, pf_calls = prof.rerun_frame(), prof.call_frame()
+            pf_n = st.slider("显示前 N 条", 5, 50, 10, key="pf_n")
+            if pf_runs.empty: st.info("暂无记录")
+            else:
+                pm1, pm2, pm3, pm4 = st.columns(4)
+                pm1.metric("rerun 次数", len(pf_runs))
+                pm2.metric("P50 / P95 (秒)", f"{pf_runs['seconds'].quantile(0.5):.3f} / {pf_runs['seconds'].quantile(0.95):.3f}")
+                pf_cache = pf_calls[pf_calls['cache'].notna()]
+                pm3.metric("缓存命中率", f"{(pf_cache['cache'] == 'hit').mean():.0%}" if not pf_cache.empty else "-")
+                pm4.metric("后端调用", int((pf_calls['op'] != 'cache').sum()))
+                st.markdown("**🐢 最慢的 rerun**")
+                pf_slow = pf_runs.sort_values('seconds', ascending=False).head(pf_n).copy()
+                pf_slow['sections'] = pf_slow['sections'].apply(lambda secs: " · ".join(f"{n} {t:.3f}s" for n, t in secs))
+                st.dataframe(pf_slow.drop(columns=['session']), use_container_width=True, hide_index=True)
+                pf_secs = prof.section_frame()
+                if not pf_secs.empty:
+                    st.markdown("**⏱️ 分段耗时**")
+                    st.dataframe(pf_secs.groupby('section')['seconds'].agg(['count', 'mean', 'max', 'sum']).sort_values('sum', ascending=False).round(4), use_container_width=True)
+            if not pf_calls.empty:
+                pf_backend = pf_calls[pf_calls['op'] != 'cache']
+                st.markdown("**🐌 最慢的后端调用**")
+                st.dataframe(pf_backend.sort_values('seconds', ascending=False).head(pf_n), use_container_width=True, hide_index=True)
+                st.markdown("**📊 按表 / 操作汇总**")
+                st.dataframe(pf_backend.groupby(['table', 'op']).agg(次数=('seconds', 'size'), 总耗时=('seconds', 'sum'), 最大耗时=('seconds', 'max'), 行数=('rows', 'sum'), 字节=('bytes', 'sum'))
+                             .sort_values('总耗时', ascending=False).round(4), use_container_width=True)
+            pf1, pf2 = st.columns(2)
+            pf1.download_button("📥 导出 JSON lines", prof.export_jsonl(), file_name=f"profile_{datetime.date.today()}.jsonl", mime="application/x-ndjson")
+            if pf2.button("🧹 清空记录", key="pf_clear"): prof.clear(); st.rerun()
+
     else: # 成员界面
         st.header("⚔️ 我的战场")
-        batts = run_query("battlefields")
-        camps = run_query("campaigns")
+        labels = task_labels()
         tdf = run_query("tasks")
         if not tdf.empty and 'status' in tdf.columns:
             my = tdf[(tdf['assignee']==user) & (tdf['status'].isin(['进行中', '返工']))].copy()
@@ -1194,17 +1670,42 @@ elif nav == "🏰 个人中心":
             my = my.sort_values(by='deadline_dt', ascending=True, na_position='last')
             for i, r in my.iterrows():
                 # V42.0 使用统一卡片渲染
-                render_task_card(r, batts, camps)
+                render_task_card(r, labels)
                 with st.expander("📄 详情"):
                     st.write(r.get('description', '无'))
                     if r['status'] == '返工': st.error(f"返工原因: {r.get('feedback', '无')}")
                 if st.button("✅ 交付验收", key=f"dev_{r['id']}", type="primary"):
-                    supabase.table("tasks").update({"status": "待验收"}).eq("id", int(r['id'])).execute()
+                    store.table("tasks").update({"status": "待验收"}).eq("id", int(r['id'])).execute()
                     show_success_modal("已交付")
         show_task_history(user, role)
         st.divider()
+        st.subheader("📈 我的净值走势")
+        led_all = ledger_frame()
+        my_led = led_all[led_all['username'] == user] if not led_all.empty else led_all
+        if not my_led.empty:
+            my_total = ledger_series(my_led, [user], days=60)
+            my_daily = my_led.assign(date=pd.to_datetime(my_led['date'].astype(str).str[:10])).set_index('date')[['gross', 'fines', 'rewards']].astype(float)
+            my_daily = my_daily[my_daily.index > pd.Timestamp(datetime.date.today()) - pd.Timedelta(days=30)]
+            my_move = rank_changes(led_all, run_query("users").query("role != 'admin'")['username'].tolist()).get(user, 0)
+            lm1, lm2 = st.columns(2)
+            lm1.metric("累计净资产", my_total[user].iloc[-1] if not my_total.empty else 0.0, delta=round(float(my_total[user].iloc[-1] - my_total[user].iloc[0]), 2) if len(my_total) > 1 else None)
+            lm2.metric("7天排名变化", f"{my_move:+d}" if my_move else "持平")
+            if not my_total.empty: st.line_chart(my_total, height=220)
+            if not my_daily.empty: st.bar_chart(my_daily.assign(fines=-my_daily['fines']).rename(columns={'gross': '产出', 'fines': '罚款', 'rewards': '奖励'}), height=220)
+        else: st.info("暂无账本记录")
+        st.divider()
         with st.expander("🔐 修改密码"):
             np = st.text_input("新密码", type="password", key="m_p")
             if st.button("确认更改", key="m_p_btn"):
-                supabase.table("users").update({"password": np}).eq("username", user).execute()
+                store.table("users").update({"password": np}).eq("username", user).execute()
                 st.success("已更新")
+
+# --- 登录后的延后任务：首屏渲染完再执行 ---
+if st.session_state.get("post_login"):
+    prof.mark("登录后任务")
+    st.session_state.post_login = False
+    if role != 'admin': check_and_create_matrix_tasks(user)
+    else: global_matrix_task_dispatch()
+
+show_stale_badge(stale_slot)
+prof.end_rerun()
@@ -0,0 +1,86 @@
+# --- 出勤矩阵 ---
+# 成员 × 工作日 (周一至周五) 的出勤状态，一次性由 已批准请假 (全天 / 上午 / 下午，不参与 / 晚到)、缺勤罚款
+# 与 matrix_daily 矩阵任务完成情况 groupby 后对齐到完整的 (日期, 成员) 网格得出。
+# 状态按严重程度：出勤 < 晚到 < 请假 < 待审批 < 矩阵未完成 < 缺勤；有罚款一律记缺勤，excused 标记当天是否有已批准的请假。
+# 今天之后的日子除已批请假外记为“未到”。结果按日期排序，范围查询直接按索引切片。
+import datetime
+
+import numpy as np
+import pandas as pd
+
+STATES = ["出勤", "晚到", "请假", "待审批", "矩阵未完成", "缺勤"]
+STATE_COLORS = ["#d1fae5", "#fde68a", "#93c5fd", "#e5e7eb", "#fb923c", "#ef4444"]
+MATRIX_DONE = ['完成', '待验收']
+ATTENDANCE_COLUMNS = ['state', 'excused', 'leave', 'leave_period', 'pending', 'penalties', 'matrix']
+
+
+def _day(values):
+    # 混合格式 / 带时区的日期统一为北京时间的自然日
+    try: ts = pd.to_datetime(values, errors='coerce', format='mixed')
+    except (ValueError, TypeError): ts = pd.to_datetime(values, errors='coerce', format='mixed', utc=True)
+    if ts.dt.tz is not None: ts = ts.dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
+    return ts.dt.normalize()
+
+
+def attendance_frame(users, leaves, pens, tasks, today=None, start=None, end=None):
+    # 长表：索引 (date, username)，列见 ATTENDANCE_COLUMNS；start 缺省为最早一条记录，end 缺省为今天之后两周 (含已批的未来请假)
+    today = pd.Timestamp(today or datetime.date.today()).normalize()
+    members = users.loc[users['role'] != 'admin', 'username'] if not users.empty else pd.Series(dtype=object)
+    keys = ['date', 'username']
+    parts = []
+
+    if not leaves.empty:
+        period = leaves['period'].fillna('全天').astype(str)
+        l = pd.DataFrame({'date': _day(leaves['leave_date']), 'username': leaves['username'], 'status': leaves['status'],
+                          'absent': ~leaves['reason'].fillna('').astype(str).str.startswith('【晚到】'),
+                          'full': period.str.startswith('全天'), 'am': period.str.startswith('上午'), 'pm': period.str.startswith('下午')})
+        l = l[l['username'].isin(members)].dropna(subset=['date'])
+        ok = l[l['status'] == '已批准'].groupby(keys)[['absent', 'full', 'am', 'pm']].max()
+        ok['leave'] = np.where(ok['absent'], '请假', '晚到')
+        ok['leave_period'] = np.select([ok['full'] | (ok['am'] & ok['pm']), ok['am'], ok['pm']], ['全天', '上午', '下午'], '')
+        parts += [ok[['leave', 'leave_period']], l[l['status'] == '待审批'].groupby(keys).size().rename('pending')]
+
+    if not pens.empty:
+        p = pd.DataFrame({'date': _day(pens['occurred_at']), 'username': pens['username']})
+        parts.append(p[p['username'].isin(members)].dropna(subset=['date']).groupby(keys).size().rename('penalties'))
+
+    if not tasks.empty and 'type' in tasks.columns:
+        t = tasks[(tasks['type'] == 'matrix_daily') & tasks['assignee'].isin(members)]
+        t = pd.DataFrame({'date': _day(t['deadline']), 'username': t['assignee'], 'done': t['status'].isin(MATRIX_DONE)}).dropna(subset=['date'])
+        m = t.groupby(keys)['done'].max()
+        due = m.index.get_level_values('date') < today
+        parts.append(pd.Series(np.where(m, '完成', np.where(due, '未完成', '进行中')), index=m.index, name='matrix'))
+
+    starts = [s.index.get_level_values('date').min() for s in parts if len(s)]
+    start = pd.Timestamp(start) if start is not None else min(starts + [today])
+    end = pd.Timestamp(end) if end is not None else today + pd.Timedelta(days=14)
+    grid = pd.MultiIndex.from_product([pd.bdate_range(start, end), members.tolist()], names=keys)
+    out = pd.DataFrame(index=grid)
+    for s in parts: out = out.join(s, how='left')
+    out = out.reindex(columns=['leave', 'leave_period', 'pending', 'penalties', 'matrix'])
+    out[['pending', 'penalties']] = out[['pending', 'penalties']].fillna(0).astype(int)
+    out[['leave', 'leave_period', 'matrix']] = out[['leave', 'leave_period', 'matrix']].fillna('')
+
+    future = out.index.get_level_values('date') > today
+    out['excused'] = out['leave'] != ''
+    out['state'] = np.select(
+        [out['penalties'] > 0, (out['matrix'] == '未完成') & (out['leave'] != '请假'), out['leave'] == '请假',
+         out['leave'] == '晚到', out['pending'] > 0, future],
+        ["缺勤", "矩阵未完成", "请假", "晚到", "待审批", "未到"], default="出勤")
+    return out[ATTENDANCE_COLUMNS].sort_index()
+
+
+def attendance_query(frame, start=None, end=None, members=None, states=None):
+    # 按日期区间 / 成员 / 状态筛选，返回平铺表
+    out = frame.loc[pd.Timestamp(start) if start is not None else None:pd.Timestamp(end) if end is not None else None]
+    if members: out = out[out.index.get_level_values('username').isin(members)]
+    if states: out = out[out['state'].isin(states)]
+    return out.reset_index()
+
+
+def attendance_summary(rows):
+    # 成员 × 状态 的天数统计
+    if rows.empty: return pd.DataFrame(columns=STATES)
+    counts = pd.crosstab(rows['username'], rows['state']).reindex(columns=STATES, fill_value=0)
+    counts.index.name = "成员"
+    return counts.sort_values(["缺勤", "矩阵未完成", "请假"], ascending=False)
@@ -0,0 +1,60 @@
+# --- 会话令牌 ---
+# Cookie 中存放带 HMAC 签名和过期时间的令牌：payload.签名 (均为 base64url)。
+# 服务端只需本地校验签名与过期时间即可恢复登录态，不查库、不等待 Cookie 组件往返。
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+TOKEN_COOKIE = "yanzu_token"
+TOKEN_TTL_DAYS = 30
+MIN_SECRET_LEN = 32
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class AuthConfigError(Exception):
+    pass
+
+
+def load_secret(conf=None):
+    # 只认专用密钥：环境变量 YANZU_AUTH_SECRET 或 secrets.toml 的 [auth] secret；
+    # 不再由数据库密钥 (通常是公开的 anon key) 派生，也不退回进程内随机密钥——没有配置就拒绝启动
+    secret = os.environ.get("YANZU_AUTH_SECRET")
+    if not secret:
+        try: secret = conf["auth"]["secret"] if conf else None
+        except (KeyError, TypeError): secret = None
+    if not secret: raise AuthConfigError("未配置会话密钥：请在 secrets.toml 的 [auth] secret 或环境变量 YANZU_AUTH_SECRET 中设置")
+    if len(str(secret)) < MIN_SECRET_LEN: raise AuthConfigError(f"会话密钥过短 (至少 {MIN_SECRET_LEN} 个字符)")
+    return str(secret).encode()
+
+
+def _sign(secret, payload):
+    return _b64(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(secret, username, role, ttl_days=TOKEN_TTL_DAYS, now=None):
+    exp = int((now or time.time()) + ttl_days * 86400)
+    payload = _b64(json.dumps({"u": username, "r": role, "exp": exp}, ensure_ascii=False, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(secret, payload)}"
+
+
+def verify_token(secret, token, now=None):
+    # 返回 (用户名, 角色)；签名不符、格式错误或已过期返回 None。Cookie 内容不可信，任何字符都不能让它抛异常
+    if not isinstance(token, str) or token.count(".") != 1: return None
+    payload, sig = token.split(".")
+    # 按字节比较：compare_digest 遇到非 ASCII 的 str 会抛 TypeError
+    if not hmac.compare_digest(sig.encode(), _sign(secret, payload).encode()): return None
+    try:
+        claims = json.loads(_unb64(payload))
+        if not isinstance(claims, dict) or float(claims.get("exp", 0)) < (now or time.time()): return None
+    except (ValueError, TypeError): return None
+    return claims.get("u"), claims.get("r")
@@ -0,0 +1,507 @@
+# --- 流式备份 ---
+# 备份包为 zip 容器：每张表一个 <表名>.csv.gz，外加 manifest.json (行数 / 列 / sha256)。
+# 逐页读取、逐页写入压缩流，内存占用只与单页大小有关。
+#
+# 快照链：每个备份包都带 index/<表名>.csv.gz (主键 → 行哈希)。差异备份读取上一个快照的索引，
+# 只写入新增/修改的行和被删除的主键；全量 + 按顺序的差异即可恢复到任一时间点。
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from db import CHUNK_SIZE, PAGE_SIZE, TABLE_KEYS, TABLE_SCHEMAS, bulk_delete, count_rows, iter_pages
+
+BACKUP_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+# 按外键依赖排序，恢复时按此顺序写入
+BACKUP_TABLES = ['users', 'campaigns', 'battlefields', 'tasks', 'penalties', 'rewards', 'messages', 'daily_todos', 'leaves']
+NULL_TOKEN = '\\N'  # 与 Postgres COPY 一致，区分 NULL 与空字符串
+
+
+class BackupError(Exception):
+    pass
+
+
+def encode_cell(v):
+    if v is None: return NULL_TOKEN
+    if isinstance(v, bool): return 'true' if v else 'false'
+    if isinstance(v, (dict, list)): return json.dumps(v, ensure_ascii=False)
+    return str(v)
+
+
+def decode_cell(v):
+    return None if v == NULL_TOKEN else v
+
+
+def row_hash(cells):
+    return hashlib.sha1('\x1f'.join(cells).encode('utf-8')).hexdigest()[:16]
+
+
+class _HashingWriter:
+    # csv.writer 写入文本，这里编码后写入压缩流，同时对未压缩内容计算 sha256
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha = hashlib.sha256()
+
+    def write(self, s):
+        b = s.encode('utf-8')
+        self.sha.update(b)
+        self.raw.write(b)
+
+
+class _NullSink:
+    def write(self, b): pass
+
+
+class _HashingReader(io.RawIOBase):
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.raw.read(len(b))
+        b[:len(data)] = data
+        self.sha.update(data)
+        return len(data)
+
+
+class _CsvHasher:
+    # 只计算 (行数, sha256)，口径与写入备份包的 CSV 完全一致
+    def __init__(self, columns, raw=None):
+        self.out = _HashingWriter(raw or _NullSink())
+        self.w = csv.writer(self.out, lineterminator='\n')
+        self.w.writerow(columns)
+        self.rows = 0
+
+    def write(self, cells):
+        self.w.writerow(cells)
+        self.rows += 1
+
+    def result(self):
+        return self.rows, self.out.sha.hexdigest()
+
+
+class _GzCsvWriter(_CsvHasher):
+    # gzip → csv，流式写入 fileobj
+    def __init__(self, fileobj, columns):
+        self.fileobj = fileobj
+        self.gz = gzip.GzipFile(fileobj=fileobj, mode='wb')
+        super().__init__(columns, self.gz)
+
+    def close(self):
+        self.gz.close()
+        return self.result()
+
+
+class _SpooledMember(_GzCsvWriter):
+    # zip 同一时刻只能有一个写句柄；索引/删除列表先写入溢出到磁盘的临时文件，数据文件写完后再拷入
+    def __init__(self, columns):
+        super().__init__(tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024), columns)
+
+    def copy_into(self, zf, name):
+        res = self.close()
+        self.fileobj.seek(0)
+        with zf.open(name, 'w', force_zip64=True) as member: shutil.copyfileobj(self.fileobj, member)
+        self.fileobj.close()
+        return res
+
+
+def table_file(table_name):
+    return f"{table_name}.csv.gz"
+
+
+def deleted_file(table_name):
+    return f"{table_name}.deleted.csv.gz"
+
+
+def index_file(table_name):
+    return f"index/{table_name}.csv.gz"
+
+
+def table_columns(table_name, sample_rows):
+    cols = list(TABLE_SCHEMAS.get(table_name, []))
+    for r in sample_rows[:1]:
+        cols += [c for c in r if c not in cols]
+    return cols
+
+
+def write_rows_csv_gz(pages, columns, fileobj):
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as gz:
+        h = _CsvHasher(columns, gz)
+        for rows in pages:
+            for r in rows: h.write([encode_cell(r.get(c)) for c in columns])
+        return h.result()
+
+
+def table_checksum(client, table_name, columns, page_size=PAGE_SIZE):
+    # 重新导出线上数据并计算与备份相同口径的 (行数, sha256)
+    h = _CsvHasher(columns)
+    for rows in iter_pages(client, table_name, page_size):
+        for r in rows: h.write([encode_cell(r.get(c)) for c in columns])
+    return h.result()
+
+
+def new_manifest(kind, parent=None):
+    now = datetime.datetime.now()
+    return {
+        # 精确到毫秒：快照目录按此排序找最新快照，同一秒内的全量 + 差异也不会排错
+        "format": BACKUP_FORMAT, "kind": kind, "created_at": now.isoformat(timespec='milliseconds'),
+        "snapshot_id": f"{now:%Y%m%d-%H%M%S}-{kind}-{uuid.uuid4().hex[:6]}",
+        "parent_id": parent['snapshot_id'] if parent else None,
+        "base_id": (parent.get('base_id') or parent['snapshot_id']) if parent else None,
+        "tables": {}
+    }
+
+
+def _snapshot_table(client, zf, t, page_size, prev_index=None, on_rows=None):
+    # 一次分页扫描同时产出：数据文件 (全量=全部行，差异=变化行)、新索引、整表状态校验和
+    pages = iter_pages(client, t, page_size)
+    first = next(pages, [])
+    columns = table_columns(t, first)
+    key = TABLE_KEYS.get(t, 'id')
+    ki = columns.index(key)
+    member = zf.open(table_file(t), 'w', force_zip64=True)
+    data = _GzCsvWriter(member, columns)
+    index = _SpooledMember([key, 'hash'])
+    state = data if prev_index is None else _CsvHasher(columns)
+    for rows in itertools.chain([first], pages):
+        for r in rows:
+            cells = [encode_cell(r.get(c)) for c in columns]
+            h = row_hash(cells)
+            index.write([cells[ki], h])
+            if prev_index is None: data.write(cells)
+            else:
+                state.write(cells)
+                if prev_index.pop(cells[ki], None) != h: data.write(cells)
+        if on_rows: on_rows(state.rows)
+    n, sha = data.close()
+    member.close()
+    index.copy_into(zf, index_file(t))
+    state_rows, state_sha = (n, sha) if prev_index is None else state.result()
+    meta = {"file": table_file(t), "rows": n, "sha256": sha, "columns": columns, "key": key,
+            "index": index_file(t), "state_rows": state_rows, "state_sha256": state_sha}
+    if prev_index is not None:
+        # 上一快照中存在、本次扫描未出现的主键即为删除
+        dw = _SpooledMember([key])
+        for k in prev_index: dw.write([k])
+        meta["deleted_file"], (meta["deleted"], meta["deleted_sha256"]) = deleted_file(t), dw.copy_into(zf, deleted_file(t))
+    return meta
+
+
+def _build_snapshot(client, fileobj, kind, parent_zf, tables, page_size, on_progress):
+    parent = read_manifest(parent_zf) if parent_zf else None
+    manifest = new_manifest(kind, parent)
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for i, t in enumerate(tables):
+            prev_index = None
+            if parent:
+                if t not in parent['tables'] or 'index' not in parent['tables'][t]:
+                    raise BackupError(f"上一快照缺少 {t} 的索引，请先做一次全量备份")
+                prev_index = load_index(parent_zf, parent['tables'][t])
+            manifest['tables'][t] = _snapshot_table(client, zf, t, page_size, prev_index,
+                                                    (lambda n, i=i, t=t: on_progress(i, t, n)) if on_progress else None)
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+    return manifest
+
+
+def build_full_backup(client, fileobj, tables=BACKUP_TABLES, page_size=PAGE_SIZE, on_progress=None):
+    # on_progress(表序号, 表名, 已扫描行数)
+    return _build_snapshot(client, fileobj, "full", None, tables, page_size, on_progress)
+
+
+def build_diff_backup(client, fileobj, parent_fileobj, tables=BACKUP_TABLES, page_size=PAGE_SIZE, on_progress=None):
+    # 线上表没有 updated_at / 变更日志，仍需扫描全表比对行哈希，但备份包只包含变化的行
+    with zipfile.ZipFile(parent_fileobj) as parent_zf:
+        return _build_snapshot(client, fileobj, "diff", parent_zf, tables, page_size, on_progress)
+
+
+# --- 流式恢复 ---
+
+class TableReader:
+    # 流式解压读取单个成员文件，读完后 rows / sha256 可用于与 manifest 比对
+    def __init__(self, zf, name):
+        self.zf = zf
+        self.name = name
+        self.rows = 0
+        self.sha256 = None
+
+    def chunks(self, size=CHUNK_SIZE):
+        self.rows = 0
+        with self.zf.open(self.name) as member, gzip.GzipFile(fileobj=member) as gz:
+            hr = _HashingReader(gz)
+            reader = csv.reader(io.TextIOWrapper(io.BufferedReader(hr), encoding='utf-8', newline=''))
+            header = next(reader, [])
+            buf = []
+            for rec in reader:
+                buf.append({c: decode_cell(v) for c, v in zip(header, rec)})
+                if len(buf) >= size:
+                    self.rows += len(buf)
+                    yield buf
+                    buf = []
+            if buf:
+                self.rows += len(buf)
+                yield buf
+            self.sha256 = hr.sha.hexdigest()
+
+
+def read_manifest(zf):
+    try: manifest = json.loads(zf.read(MANIFEST_NAME).decode('utf-8'))
+    except KeyError: raise BackupError("备份包缺少 manifest.json")
+    if manifest.get('format') != BACKUP_FORMAT: raise BackupError(f"不支持的备份格式: {manifest.get('format')}")
+    return manifest
+
+
+def load_index(zf, meta):
+    key = meta['key']
+    return {r[key]: r['hash'] for rows in TableReader(zf, meta['index']).chunks() for r in rows}
+
+
+def restore_order(manifest):
+    tables = manifest['tables']
+    return [t for t in BACKUP_TABLES if t in tables] + [t for t in tables if t not in BACKUP_TABLES]
+
+
+def _archive_members(meta):
+    yield meta['file'], meta['rows'], meta['sha256']
+    if 'deleted_file' in meta: yield meta['deleted_file'], meta['deleted'], meta['deleted_sha256']
+
+
+def verify_archive(zf, manifest, on_progress=None):
+    # 恢复前完整校验一遍备份包，任何一张表不符都不会动线上数据
+    problems = []
+    for t in restore_order(manifest):
+        meta = manifest['tables'][t]
+        for name, rows, sha in _archive_members(meta):
+            reader = TableReader(zf, name)
+            try:
+                for _ in reader.chunks(): pass
+            except (KeyError, OSError, EOFError, csv.Error, UnicodeDecodeError) as e:
+                problems.append(f"{name}: 无法读取 ({e})"); continue
+            if reader.rows != rows: problems.append(f"{name}: 行数 {reader.rows} ≠ 清单 {rows}")
+            if reader.sha256 != sha: problems.append(f"{name}: 校验和不一致")
+        if on_progress: on_progress("verify", t, meta['rows'], meta['rows'])
+    return problems
+
+
+def _upsert_with_retry(client, table_name, rows, key, attempts=3):
+    for i in range(attempts):
+        try:
+            client.table(table_name).upsert(rows, on_conflict=key).execute()
+            return len(rows)
+        except Exception:
+            if i == attempts - 1: raise
+            time.sleep(0.5 * 2 ** i)
+
+
+def _load_table(client, t, meta, chunk_size, workers, on_progress):
+    # 有界并发：最多 workers*2 个分块在途，内存只与分块大小有关
+    key = meta['key']
+    keys = set()
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for rows in meta['reader'].chunks(chunk_size):
+            keys.update(str(r[key]) for r in rows)
+            pending.add(pool.submit(_upsert_with_retry, client, t, rows, key))
+            if len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    done += f.result()
+                    if on_progress: on_progress("load", t, done, meta['rows'])
+        for f in pending:
+            done += f.result()
+            if on_progress: on_progress("load", t, done, meta['rows'])
+    return keys
+
+
+def _check_state(client, manifest, order, report, verify, on_progress):
+    for t in order:
+        meta = manifest['tables'][t]
+        rows, sha = meta.get('state_rows', meta['rows']), meta.get('state_sha256', meta['sha256'])
+        report[t]["线上行数"] = count_rows(client, t)
+        if verify:
+            _, online_sha = table_checksum(client, t, meta['columns'])
+            report[t]["校验和"] = "✅" if online_sha == sha else "⚠️ 不一致"
+        report[t]["行数核对"] = "✅" if report[t]["线上行数"] == rows else "⚠️ 不一致"
+        if on_progress: on_progress("check", t, report[t]["线上行数"], rows)
+    return [report[t] for t in order]
+
+
+def _restore_full(client, zf, manifest, chunk_size, workers, on_progress):
+    # 1) 分块并发 upsert (线上旧数据保持可读)  2) 全部落库后再按外键逆序清理备份中不存在的旧行
+    order = restore_order(manifest)
+    loaded = {}
+    for t in order:
+        meta = dict(manifest['tables'][t], reader=TableReader(zf, manifest['tables'][t]['file']))
+        loaded[t] = _load_table(client, t, meta, chunk_size, workers, on_progress)
+    report = {}
+    for t in reversed(order):
+        key = manifest['tables'][t]['key']
+        stale = [r[key] for rows in iter_pages(client, t, key=key, columns=key) for r in rows if str(r[key]) not in loaded[t]]
+        bulk_delete(client, t, stale, chunk_size, key)
+        report[t] = {"表": t, "备份行数": manifest['tables'][t]['rows'], "清理旧行": len(stale)}
+        if on_progress: on_progress("swap", t, len(stale), len(stale))
+    return report
+
+
+def _apply_diff(client, zf, manifest, chunk_size, workers, on_progress):
+    order = restore_order(manifest)
+    for t in order:
+        meta = dict(manifest['tables'][t], reader=TableReader(zf, manifest['tables'][t]['file']))
+        _load_table(client, t, meta, chunk_size, workers, on_progress)
+    report = {}
+    for t in reversed(order):
+        meta = manifest['tables'][t]
+        gone = [r[meta['key']] for rows in TableReader(zf, meta['deleted_file']).chunks(chunk_size) for r in rows]
+        bulk_delete(client, t, gone, chunk_size, meta['key'])
+        report[t] = {"表": t, "变更行数": meta['rows'], "删除行数": len(gone)}
+        if on_progress: on_progress("swap", t, len(gone), len(gone))
+    return report
+
+
+def restore_archive(client, fileobj, chunk_size=CHUNK_SIZE, workers=4, verify=True, on_progress=None):
+    # 先校验备份包再写库；PostgREST 无跨请求事务，因此用 "先写后清" 代替删表重建：
+    # 中途失败不会留下空库，重跑即可续上。on_progress(阶段, 表名, 已处理, 总数)
+    return restore_chain(client, [fileobj], chunk_size, workers, verify, on_progress)
+
+
+def restore_chain(client, fileobjs, chunk_size=CHUNK_SIZE, workers=4, verify=True, on_progress=None):
+    # 时间点恢复：fileobjs = [全量, 差异1, 差异2, ...]，按快照链顺序回放，最后与目标快照的整表校验和核对
+    zfs = [zipfile.ZipFile(f) for f in fileobjs]
+    manifests = [read_manifest(z) for z in zfs]
+    if manifests[0]['kind'] == 'diff': raise BackupError("快照链必须以全量备份开头")
+    for prev, cur in zip(manifests, manifests[1:]):
+        if cur['kind'] != 'diff' or cur['parent_id'] != prev['snapshot_id']:
+            raise BackupError(f"快照链断裂: {cur.get('snapshot_id')} 的上一快照不是 {prev.get('snapshot_id')}")
+    for z, m in zip(zfs, manifests):
+        problems = verify_archive(z, m, on_progress)
+        if problems: raise BackupError(f"{m.get('snapshot_id', '备份包')} 校验失败: " + "; ".join(problems))
+
+    report = _restore_full(client, zfs[0], manifests[0], chunk_size, workers, on_progress)
+    for z, m in zip(zfs[1:], manifests[1:]):
+        for t, r in _apply_diff(client, z, m, chunk_size, workers, on_progress).items():
+            row = report.setdefault(t, {"表": t})
+            for k in ("变更行数", "删除行数"): row[k] = row.get(k, 0) + r[k]
+    return manifests[-1], _check_state(client, manifests[-1], restore_order(manifests[-1]), report, verify, on_progress)
+
+
+# --- 快照目录 ---
+
+class SnapshotStore:
+    # 本地目录保存快照链，文件名即 snapshot_id
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def file_of(self, snapshot_id):
+        return os.path.join(self.path, f"{snapshot_id}.zip")
+
+    def manifests(self):
+        out = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith('.zip'): continue
+            try:
+                with zipfile.ZipFile(os.path.join(self.path, name)) as zf: m = read_manifest(zf)
+            except (BackupError, zipfile.BadZipFile, OSError): continue
+            m['size'] = os.path.getsize(os.path.join(self.path, name))
+            out.append(m)
+        return sorted(out, key=lambda m: m['created_at'])
+
+    def latest(self):
+        ms = self.manifests()
+        return ms[-1] if ms else None
+
+    def chain(self, snapshot_id):
+        by_id = {m['snapshot_id']: m for m in self.manifests()}
+        chain = []
+        cur = by_id.get(snapshot_id)
+        while cur:
+            chain.append(cur)
+            cur = by_id.get(cur['parent_id']) if cur['parent_id'] else None
+        if not chain or chain[-1]['kind'] == 'diff': raise BackupError(f"找不到 {snapshot_id} 的完整快照链")
+        return chain[::-1]
+
+    def snapshot(self, client, full=False, on_progress=None):
+        # 没有可用上一快照时自动退化为全量
+        parent = None if full else self.latest()
+        tmp = self.file_of(f".tmp-{uuid.uuid4().hex}")
+        try:
+            with open(tmp, 'wb') as f:
+                if parent:
+                    with open(self.file_of(parent['snapshot_id']), 'rb') as pf:
+                        manifest = build_diff_backup(client, f, pf, on_progress=on_progress)
+                else: manifest = build_full_backup(client, f, on_progress=on_progress)
+            os.replace(tmp, self.file_of(manifest['snapshot_id']))
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+        return manifest
+
+    def restore(self, client, snapshot_id, **kw):
+        files = [open(self.file_of(m['snapshot_id']), 'rb') for m in self.chain(snapshot_id)]
+        try: return restore_chain(client, files, **kw)
+        finally:
+            for f in files: f.close()
+
+
+# --- 旧版 .txt 备份兼容 ---
+LEGACY_SECTIONS = {'USERS': 'users', 'TASKS': 'tasks', 'PENALTIES': 'penalties', 'MESSAGES': 'messages', 'REWARDS': 'rewards', 'DAILY_TODOS': 'daily_todos'}
+# pandas 导出时含空值的整数列会变成 "3.0"
+_LEGACY_INT_COLS = {'id', 'battlefield_id', 'campaign_id', 'order_index'}
+
+
+def convert_legacy_backup(text, fileobj):
+    manifest = new_manifest("legacy")
+    parts = re.split(r'^===([A-Z_]+)===\n', text, flags=re.M)
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for name, body in zip(parts[1::2], parts[2::2]):
+            t = LEGACY_SECTIONS.get(name)
+            if not t or not body.strip(): continue
+            reader = csv.reader(io.StringIO(body.strip()))
+            header = next(reader)
+            rows = []
+            for rec in reader:
+                row = {}
+                for c, v in zip(header, rec):
+                    if v == '': v = None
+                    elif c in _LEGACY_INT_COLS and re.fullmatch(r'-?\d+\.0', v): v = v[:-2]
+                    elif v in ('True', 'False'): v = v.lower()
+                    row[c] = v
+                rows.append(row)
+            with zf.open(table_file(t), 'w') as member:
+                count, sha = write_rows_csv_gz([rows], header, member)
+            manifest['tables'][t] = {"file": table_file(t), "rows": count, "sha256": sha, "columns": header, "key": TABLE_KEYS.get(t, 'id')}
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+    return manifest
+
+
+if __name__ == "__main__":
+    # 定时任务入口：python backup.py [--full] [--dir backups]，读取 SUPABASE_URL / SUPABASE_KEY
+    # 或 .streamlit/secrets.toml；已有快照时自动做差异备份
+    import argparse
+    import tomllib
+    from supabase import create_client
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", default="backups")
+    ap.add_argument("--full", action="store_true")
+    args = ap.parse_args()
+    url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+    if not (url and key):
+        with open(".streamlit/secrets.toml", "rb") as f: conf = tomllib.load(f)["supabase"]
+        url, key = conf["url"], conf["key"]
+    m = SnapshotStore(args.dir).snapshot(create_client(url, key), full=args.full)
+    print(m['snapshot_id'], {t: v['rows'] for t, v in m['tables'].items()})
@@ -0,0 +1,138 @@
+# --- 性能基准 ---
+# 用 datagen 生成的合成数据，在本地 SQLite 后端上对热点路径计时，结果以 JSON lines 追加输出，便于跨提交对比：
+#   python bench.py --scales 10000,100000,1000000 --out bench.jsonl
+#   python bench.py --scales 10000 --baseline bench.jsonl     # 与历史结果对比 (取同规模、同项目的最近一次)
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+import datagen
+from analytics import AnalyticsMirror
+from backup import build_full_backup, restore_archive
+from db import frame_from_rows, iter_pages
+from metrics import calculate_net_yvp, period_stats
+from storage import SQLiteBackend
+from warroom import war_room_groups
+
+BENCHES = ['run_query', 'net_yvp_pandas', 'mirror_sync', 'leaderboard_sql', 'period_stats_pandas', 'period_stats_sql',
+           'war_room', 'backup_full', 'restore']
+
+
+def git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+
+def timed(fn, repeat):
+    times = []
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), sum(times) / len(times), out
+
+
+def run_scale(scale, seed, repeat, skip, log):
+    now = datagen.default_now()
+    frames = datagen.generate(scale, seed, now)
+    backend = SQLiteBackend()
+    datagen.load_into(backend, frames)
+    raw = {t: [r for rows in iter_pages(backend, t) for r in rows] for t in ('users', 'tasks', 'penalties', 'rewards', 'campaigns', 'battlefields')}
+    snap = {t: frame_from_rows(t, rows) for t, rows in raw.items()}
+    users, tasks, pens, rews = snap['users'], snap['tasks'], snap['penalties'], snap['rewards']
+    members = users[users['role'] != 'admin']['username'].tolist()
+    start, end = (now - pd.Timedelta(days=30)).date(), now.date()
+    mirror = AnalyticsMirror()
+    archive = io.BytesIO()
+
+    def net_pandas():
+        return {d: {m: calculate_net_yvp(m, tasks, pens, rews, d) for m in members} for d in (7, 30, None)}
+
+    def sync():
+        mirror.versions.clear()
+        return mirror.sync({'users': users, 'tasks': tasks, 'penalties': pens, 'rewards': rews})
+
+    def backup():
+        archive.seek(0); archive.truncate()
+        return build_full_backup(backend, archive)
+
+    def restore():
+        archive.seek(0)
+        return restore_archive(SQLiteBackend(), archive)
+
+    plan = [
+        ('run_query', lambda: frame_from_rows('tasks', raw['tasks']), len(tasks)),
+        ('net_yvp_pandas', net_pandas, len(members)),
+        ('mirror_sync', sync, len(tasks)),
+        ('leaderboard_sql', lambda: mirror.leaderboard(now), len(members)),
+        ('period_stats_pandas', lambda: period_stats(users, tasks, rews, start, end), len(members)),
+        ('period_stats_sql', lambda: mirror.period_stats(start, end), len(members)),
+        ('war_room', lambda: war_room_groups(snap['campaigns'], snap['battlefields'], tasks), len(tasks)),
+        ('backup_full', backup, sum(len(df) for df in frames.values())),
+        ('restore', restore, sum(len(df) for df in frames.values())),
+    ]
+    results = []
+    for name, fn, rows in plan:
+        if name in skip: continue
+        best, mean, _ = timed(fn, repeat)
+        rec = {"bench": name, "scale": scale, "seed": seed, "rows": rows, "seconds": round(best, 6), "mean": round(mean, 6), "repeat": repeat}
+        results.append(rec)
+        log(rec)
+    return results
+
+
+def load_baseline(path):
+    # 同 (规模, 项目) 取文件中最后一条
+    base = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                base[(r["scale"], r["bench"])] = r
+    return base
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", default="10000,100000,1000000", help="任务行数，逗号分隔")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--skip", default="", help="跳过的项目，逗号分隔: " + ",".join(BENCHES))
+    ap.add_argument("--out", default=None, help="结果追加写入的 JSON lines 文件")
+    ap.add_argument("--baseline", default=None, help="对比用的历史结果文件")
+    args = ap.parse_args(argv)
+
+    base = load_baseline(args.baseline) if args.baseline and os.path.exists(args.baseline) else {}
+    meta = {"commit": git_commit(), "python": platform.python_version(), "pandas": pd.__version__,
+            "at": datetime.datetime.now().isoformat(timespec="seconds")}
+    out = open(args.out, "a", encoding="utf-8") if args.out else None
+
+    def log(rec):
+        rec.update(meta)
+        line = f"{rec['scale']:>9} {rec['bench']:<22} {rec['seconds']:>10.4f}s"
+        prev = base.get((rec["scale"], rec["bench"]))
+        if prev and prev["seconds"] > 0: line += f"   x{rec['seconds'] / prev['seconds']:.2f} vs {prev.get('commit') or '?'}"
+        print(line, file=sys.stderr)
+        if out:
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n"); out.flush()
+
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    try:
+        for scale in (int(s) for s in args.scales.split(",") if s.strip()):
+            run_scale(scale, args.seed, args.repeat, skip, log)
+    finally:
+        if out: out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# --- 行级变更推送 (缓存失效) ---
+# 订阅数据库的行级变更流，记录每张表最近一次变更的时间；表快照 (attrs["read_at"] 为开始拉取的时间) 早于该时间即视为过期。
+# 判断只比较时间戳，不依赖后台线程去清 Streamlit 缓存，也不会漏掉拉取过程中发生的变更。
+# RealtimeFeed 订阅 Supabase Realtime 的 postgres_changes；LocalFeed 是本地 SQLite 的替身：经 SQLiteBackend 的写入提交后立即按表发布，
+# 其他连接 / 进程的写入靠轮询 PRAGMA data_version 发现 (不知道是哪张表，按全部表变更处理)。
+# 推送断开期间 (以及重连之前拉取的快照) 退回按 POLL_TTL 轮询，所以缓存 TTL 可以放宽到分钟级。
+# Realtime 要求各表已加入发布：alter publication supabase_realtime add table tasks, campaigns, ...;
+# 没加的表频道照样 SUBSCRIBED 却收不到事件，所以 RealtimeFeed 只信任真正收到过事件的表；本进程写入某表后
+# PROBE_WAIT 秒内没收到它的事件，判定该表未发布并在诊断页报出。未确认的表一律按 POLL_TTL 轮询。
+import asyncio
+import sqlite3
+import threading
+import time
+
+POLL_TTL = 2.0            # 推送不可用时快照的有效期 (秒)，即原来的缓存 TTL
+LOCAL_POLL_INTERVAL = 1.0
+RECONNECT_DELAY = 5.0
+PROBE_WAIT = 10.0         # 本进程写入后等待推送事件的最长时间 (秒)
+
+
+class ChangeFeed:
+    name = "off"
+    verify = False  # 是否要先收到某表的推送事件才信任该表 (见 RealtimeFeed)
+
+    def __init__(self, tables, poll_ttl=POLL_TTL, probe_wait=PROBE_WAIT):
+        self.tables = list(tables)
+        self.poll_ttl, self.probe_wait = poll_ttl, probe_wait
+        self.changed = {}       # 表 → 最近一次变更的时间
+        self.events = {}        # 表 → 收到的变更条数
+        self.remote = {}        # 表 → 最近一次收到推送事件的时间
+        self.expect = {}        # 表 → 本进程最近一次写入的时间 (之后应收到推送事件)
+        self.live_since = None  # 推送可用的起始时间；None 表示当前不可用
+        self.error = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self, prepare=None):
+        return self
+
+    def attach(self, backend):
+        pass
+
+    def publish(self, table, op=None, rows=None):
+        # table 为 None 表示不知道哪张表变了；op 为 "local" 表示本进程自己的写入，不算推送事件
+        now = time.time()
+        with self.lock:
+            for t in ([table] if table else self.tables):
+                self.changed[t] = now
+                if op == "local": self.expect[t] = now
+                else:
+                    self.events[t] = self.events.get(t, 0) + max(len(rows or []), 1)
+                    self.remote[t] = now
+
+    def touch(self, table):
+        # 本进程经 store 写入后立即标记，读己之写不依赖推送往返
+        self.publish(table, "local")
+
+    def _delivers(self, table, now):
+        # 推送是否确实覆盖该表：收到过它的事件，且本进程最近的写入 (probe_wait 秒之前) 之后也收到了。
+        # 事件可能抢在本地标记之前到达，留 probe_wait 的十分之一作余量
+        if not self.verify: return True
+        seen, wrote = self.remote.get(table), self.expect.get(table)
+        if seen is None: return False
+        return wrote is None or seen >= wrote - self.probe_wait / 10 or now - wrote <= self.probe_wait
+
+    def _live(self, ok, error=None):
+        with self.lock:
+            if ok and self.live_since is None: self.live_since = time.time()
+            elif not ok: self.live_since = None
+            self.error = error
+
+    def fresh(self, table, read_at):
+        # 快照是否仍可用：推送可用且快照拉取之后该表没有变更；否则按 poll_ttl 判断。没有 read_at 的一律视为过期
+        if read_at is None: return False
+        now = time.time()
+        with self.lock: live, changed, ok = self.live_since, self.changed.get(table, 0), self._delivers(table, now)
+        if live is not None and read_at >= live and ok: return read_at >= changed
+        return now - read_at < self.poll_ttl and read_at >= changed
+
+    def status(self):
+        now = time.time()
+        with self.lock:
+            return {"mode": self.name, "live": self.live_since is not None, "since": self.live_since, "error": self.error,
+                    "tables": {t: (self.events.get(t, 0), self.changed.get(t)) for t in self.tables},
+                    "polling": [t for t in self.tables if not self._delivers(t, now)],
+                    "missing": [t for t in self.tables if self.verify and t in self.expect and not self._delivers(t, now) and now - self.expect[t] > self.probe_wait]}
+
+
+class LocalFeed(ChangeFeed):
+    name = "local"
+
+    def __init__(self, path, tables, poll_ttl=POLL_TTL, interval=LOCAL_POLL_INTERVAL):
+        super().__init__(tables, poll_ttl)
+        self.path, self.interval = path, interval
+        self.con = sqlite3.connect(path, check_same_thread=False) if path != ":memory:" else None
+        self.data_version = self._data_version()
+        self._live(True)
+
+    def attach(self, backend):
+        # 挂上发布回调；后端按进程缓存，重复调用不会重复挂
+        if hasattr(backend, "listeners") and self.publish not in backend.listeners: backend.listeners.append(self.publish)
+
+    def _data_version(self):
+        # 轮询用独立连接：任何其他连接 (含其他进程的后端) 提交后都会变化
+        return self.con.execute("PRAGMA data_version").fetchone()[0] if self.con else None
+
+    def start(self, prepare=None):
+        with self.lock:
+            if self.thread is not None or self.con is None: return self
+            self.thread = threading.Thread(target=self._loop, name="change-feed-local", daemon=True)
+        if prepare: prepare(self.thread)
+        self.thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                v = self._data_version()
+                if v != self.data_version:
+                    self.data_version = v
+                    self.publish(None)
+                self._live(True)
+            except Exception as e:
+                self._live(False, str(e)[:200])
+
+
+class RealtimeFeed(ChangeFeed):
+    name = "realtime"
+    verify = True
+
+    def __init__(self, conf, tables, poll_ttl=POLL_TTL, schema="public", probe_wait=PROBE_WAIT):
+        super().__init__(tables, poll_ttl, probe_wait)
+        self.conf, self.schema = conf, schema
+
+    def start(self, prepare=None):
+        with self.lock:
+            if self.thread is not None: return self
+            self.thread = threading.Thread(target=self._loop, name="change-feed-realtime", daemon=True)
+        if prepare: prepare(self.thread)
+        self.thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            try: asyncio.run(self._listen())
+            except Exception as e: self._live(False, str(e)[:200])
+            time.sleep(RECONNECT_DELAY)
+
+    async def _listen(self):
+        from supabase import acreate_client  # Realtime 只在异步客户端上可用
+        client = await acreate_client(self.conf["url"], self.conf["key"])
+        channel = client.channel("yanzu-changes")
+        for t in self.tables:
+            channel.on_postgres_changes("*", schema=self.schema, table=t, callback=self._on_change)
+        await channel.subscribe(self._on_state)
+        try:
+            while True:
+                await asyncio.sleep(self.poll_ttl)
+                if not getattr(client.realtime, "is_connected", True): raise ConnectionError("realtime socket closed")
+        finally:
+            self._live(False, self.error)
+            try: await client.remove_all_channels()
+            except Exception: pass
+
+    def _on_state(self, state, error=None):
+        # SUBSCRIBED 之后才算可用；之前拉取的快照仍按轮询判断
+        state = getattr(state, "value", state)
+        if state == "SUBSCRIBED": self._live(True)
+        else: self._live(False, str(error or state)[:200])
+
+    def _on_change(self, payload):
+        data = payload.get("data", payload) if isinstance(payload, dict) else {}
+        rows = [r for r in (data.get("record") or data.get("new"), data.get("old_record") or data.get("old")) if r]
+        self.publish(data.get("table"), data.get("type") or data.get("eventType"), rows[:1])
+
+
+def open_feed(spec, backend, tables, supabase_conf=None):
+    # spec: "off" → 不订阅 (None)；"local" / "realtime"；"auto" (默认) → 读本地 SQLite (含只读副本) 用 local，其余用 realtime
+    spec = (spec or "auto").strip().lower()
+    if spec == "off": return None
+    backend = getattr(backend, "replica", backend)
+    if spec == "auto": spec = "local" if hasattr(backend, "listeners") else "realtime"
+    if spec == "local": return LocalFeed(backend.path, tables)
+    return RealtimeFeed(supabase_conf, tables)
@@ -0,0 +1,136 @@
+# --- 合成数据生成 ---
+# 按固定随机种子生成全部 9 张表，规模以任务数计，其余表按线上大致比例缩放。
+# 分布尽量贴近真实：少数成员产出大部分任务、完成时间集中在近期、请假多为全天、待办多为核心必办。
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from db import TABLE_SCHEMAS, bulk_insert
+from storage import SQLiteBackend
+
+TASK_STATUSES = ['完成', '进行中', '待领取', '待验收', '返工']
+TASK_STATUS_P = [0.62, 0.14, 0.1, 0.08, 0.06]
+TASK_TYPES = ['指派成员', '公共任务池', 'matrix_daily', 'AdminSelf']
+TASK_TYPE_P = [0.55, 0.2, 0.23, 0.02]
+LEAVE_PERIODS = ['全天', '上午 (10:00-12:00)', '下午 (14:00-17:00)']
+LEAVE_STATUSES = ['已批准', '待审批', '驳回']
+TODO_CATEGORIES = ['核心必办', '余力选办']
+HISTORY_DAYS = 365
+
+# 每个任务对应的其他表行数
+RATIOS = {'penalties': 0.02, 'rewards': 0.05, 'messages': 0.1, 'daily_todos': 0.5, 'leaves': 0.01}
+
+
+def _ts(rng, n, now, days=HISTORY_DAYS):
+    # 越近越密集：指数分布的“距今天数”
+    ago = np.minimum(rng.exponential(days / 4, n), days)
+    return pd.Timestamp(now) - pd.to_timedelta(ago, unit='D')
+
+
+def _iso(ts):
+    return pd.Series(ts).dt.strftime('%Y-%m-%dT%H:%M:%S.%f').tolist()
+
+
+def _dates(ts):
+    return pd.Series(ts).dt.strftime('%Y-%m-%d').tolist()
+
+
+def _pick(rng, values, n, p=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p)]
+
+
+def default_now():
+    # 结算函数按当前时间开窗，数据默认以“今天 18:00”为终点，保证 7 天 / 30 天窗口内有数据
+    return pd.Timestamp(datetime.date.today()) + pd.Timedelta(hours=18)
+
+
+def generate(scale=10000, seed=0, now=None):
+    # 返回 {表名: DataFrame}，列与 TABLE_SCHEMAS 一致；同一 seed + now 生成的数据完全相同
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(now or default_now())
+    n_members = int(np.clip(scale // 2000, 8, 500))
+    members = [f"成员{i:03d}" for i in range(n_members)]
+    # Zipf 式权重：头部成员承担大部分任务
+    weight = 1.0 / np.arange(1, n_members + 1) ** 0.8
+    weight /= weight.sum()
+
+    users = pd.DataFrame({'username': ['admin'] + members, 'password': '123456',
+                          'role': ['admin'] + ['member'] * n_members})
+
+    n_camps = max(3, scale // 5000)
+    camps = pd.DataFrame({'id': np.arange(1, n_camps + 1), 'title': [f"战役{i}" for i in range(1, n_camps + 1)],
+                          'deadline': _dates(now + pd.to_timedelta(rng.integers(0, 120, n_camps), unit='D')),
+                          'order_index': rng.integers(0, 100, n_camps), 'status': '进行中'})
+    n_batts = n_camps * 8
+    batts = pd.DataFrame({'id': np.arange(1, n_batts + 1), 'title': [f"战场{i}" for i in range(1, n_batts + 1)],
+                          'campaign_id': np.repeat(camps['id'].to_numpy(), 8), 'order_index': rng.integers(0, 100, n_batts)})
+
+    n = scale
+    created = _ts(rng, n, now)
+    status = _pick(rng, TASK_STATUSES, n, TASK_STATUS_P)
+    done = status == '完成'
+    completed = created + pd.to_timedelta(rng.exponential(3, n), unit='D')
+    completed = pd.Series(completed).where(done & (completed <= now))
+    tasks = pd.DataFrame({
+        'id': np.arange(1, n + 1), 'title': [f"任务{i}" for i in range(1, n + 1)],
+        'battlefield_id': rng.integers(1, n_batts + 1, n), 'status': status,
+        'deadline': _dates(created + pd.to_timedelta(rng.integers(1, 30, n), unit='D')),
+        'is_rnd': rng.random(n) < 0.05, 'assignee': _pick(rng, members, n, weight),
+        'difficulty': rng.choice([0.5, 1.0, 1.5, 2.0, 3.0], n).round(1), 'std_time': rng.gamma(2.0, 2.0, n).round(1),
+        'quality': np.where(done, rng.choice([0.8, 1.0, 1.2], n, p=[0.15, 0.7, 0.15]), np.nan),
+        'created_at': _iso(created), 'completed_at': [None if pd.isna(c) else c.strftime('%Y-%m-%d') for c in completed],
+        'description': None, 'feedback': None, 'type': _pick(rng, TASK_TYPES, n, TASK_TYPE_P),
+    })
+    tasks.loc[status == '待领取', 'assignee'] = '待定'
+    tasks['quality'] = tasks['quality'].astype(object).where(tasks['quality'].notna(), None)
+
+    frames = {'users': users, 'campaigns': camps, 'battlefields': batts, 'tasks': tasks}
+    sizes = {t: max(1, int(n * r)) for t, r in RATIOS.items()}
+
+    k = sizes['penalties']
+    frames['penalties'] = pd.DataFrame({'id': np.arange(1, k + 1), 'username': _pick(rng, members, k),
+                                        'reason': '缺勤', 'occurred_at': _dates(_ts(rng, k, now))})
+    k = sizes['rewards']
+    frames['rewards'] = pd.DataFrame({'id': np.arange(1, k + 1), 'username': _pick(rng, members, k, weight),
+                                      'amount': rng.choice([1, 2, 5, 10, 30], k, p=[0.4, 0.3, 0.2, 0.08, 0.02]).astype(float),
+                                      'reason': '奖励', 'created_at': _iso(_ts(rng, k, now))})
+    k = sizes['messages']
+    frames['messages'] = pd.DataFrame({'id': np.arange(1, k + 1), 'username': _pick(rng, members, k, weight),
+                                       'content': [f"留言{i}" for i in range(k)], 'created_at': _iso(_ts(rng, k, now))})
+    k = sizes['daily_todos']
+    todo_dates = _dates(_ts(rng, k, now, days=60))
+    frames['daily_todos'] = pd.DataFrame({'id': np.arange(1, k + 1), 'username': _pick(rng, members, k), 'date': todo_dates,
+                                          'content': [f"待办{i}" for i in range(k)], 'category': _pick(rng, TODO_CATEGORIES, k, [0.7, 0.3]),
+                                          'is_completed': rng.random(k) < 0.6})
+    k = sizes['leaves']
+    frames['leaves'] = pd.DataFrame({'id': np.arange(1, k + 1), 'username': _pick(rng, members, k),
+                                     'leave_date': _dates(_ts(rng, k, now, days=120)), 'period': _pick(rng, LEAVE_PERIODS, k, [0.6, 0.2, 0.2]),
+                                     'reason': '事假', 'is_emergency': rng.random(k) < 0.1,
+                                     'status': _pick(rng, LEAVE_STATUSES, k, [0.8, 0.1, 0.1]), 'admin_comment': None,
+                                     'created_at': _iso(_ts(rng, k, now, days=120))})
+    return {t: frames[t][TABLE_SCHEMAS[t]] for t in TABLE_SCHEMAS if t in frames}
+
+
+def records(df):
+    # DataFrame → 可直接写库的 dict 列表 (NaN → None，numpy 标量 → Python 标量)
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict('records')
+
+
+def load_into(backend, frames, on_progress=None):
+    # 写入后端；本地 SQLite 走 executemany 快速通道，其他后端按块写入
+    for t, df in frames.items():
+        if isinstance(backend, SQLiteBackend):
+            rows = records(df)
+            cols = list(df.columns)
+            col_sql = ", ".join(f'"{c}"' for c in cols)
+            with backend.lock:
+                backend.con.execute(f'DELETE FROM "{t}"')
+                backend.con.executemany(f'INSERT INTO "{t}" ({col_sql}) VALUES ({", ".join("?" * len(cols))})',
+                                        [[backend.encode(c, r[c]) for c in cols] for r in rows])
+                backend.con.commit()
+        else:
+            bulk_insert(backend, t, records(df))
+        if on_progress: on_progress(t, len(df))
+    return {t: len(df) for t, df in frames.items()}
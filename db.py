@@ -0,0 +1,129 @@
+# --- 数据库批量读写工具 ---
+# 所有函数只依赖 client.table(...) 形式的 PostgREST 查询构造器，便于在脚本与页面间复用。
+import re
+
+import pandas as pd
+
+CHUNK_SIZE = 500
+PAGE_SIZE = 1000  # PostgREST 默认单次最多返回 1000 行
+
+TABLE_SCHEMAS = {
+    'tasks': ['id', 'title', 'battlefield_id', 'status', 'deadline', 'is_rnd', 'assignee', 'difficulty', 'std_time', 'quality', 'created_at', 'completed_at', 'description', 'feedback', 'type'],
+    'campaigns': ['id', 'title', 'deadline', 'order_index', 'status'],
+    'battlefields': ['id', 'title', 'campaign_id', 'order_index'],
+    'users': ['username', 'password', 'role'],
+    'penalties': ['id', 'username', 'reason', 'occurred_at'],
+    'rewards': ['id', 'username', 'amount', 'reason', 'created_at'],
+    'messages': ['id', 'username', 'content', 'created_at'],
+    'daily_todos': ['id', 'username', 'date', 'content', 'category', 'is_completed'],
+    'leaves': ['id', 'username', 'leave_date', 'period', 'reason', 'is_emergency', 'status', 'admin_comment', 'created_at'],
+    'yvp_ledger': ['key', 'date', 'username', 'gross', 'fines', 'rewards', 'net']
+}
+
+# 主键；users 表以用户名为主键，日账本以 "日期|用户名" 为主键
+TABLE_KEYS = {t: {'users': 'username', 'yvp_ledger': 'key'}.get(t, 'id') for t in TABLE_SCHEMAS}
+
+
+class StorageError(Exception):
+    # 后端明确拒绝的请求 (表 / 列不存在、约束冲突等)，整条语句已回滚
+    pass
+
+
+_PG_CODE = re.compile(r"^(PGRST\d+|[0-9A-Z]{5})$")  # PostgREST 错误码或 Postgres SQLSTATE
+
+
+def write_rejected(e):
+    # 能证明这次写入一行都没落库的错误：本地后端的 StorageError，或线上返回了数据库错误码 (语句失败即整体回滚)。
+    # 超时 / 断网 / 网关错误时请求可能已提交、只是响应丢了，不算
+    if isinstance(e, StorageError): return True
+    return type(e).__name__ == "APIError" and bool(_PG_CODE.match(str(getattr(e, "code", None) or "")))
+
+
+def frame_from_rows(table_name, rows):
+    # 查询结果 → DataFrame：补齐缺失列并按 order_index / id 排序
+    schema = TABLE_SCHEMAS.get(table_name, [])
+    df = pd.DataFrame(rows)
+    if df.empty: return pd.DataFrame(columns=schema)
+    for col in schema:
+        if col not in df.columns: df[col] = None
+    if 'order_index' in df.columns:
+        df['order_index'] = pd.to_numeric(df['order_index'], errors='coerce').fillna(0)
+        df = df.sort_values('order_index', ascending=True)
+    elif 'id' in df.columns:
+        df = df.sort_values('id', ascending=True)
+    return df
+
+
+def chunked(records, size=CHUNK_SIZE):
+    for i in range(0, len(records), size):
+        yield records[i:i + size]
+
+
+def bulk_insert(client, table_name, records, chunk_size=CHUNK_SIZE, on_progress=None, on_error=None):
+    # 分块写入，避免单次请求体过大；on_progress(已处理, 总数)
+    # 给出 on_error(序号, 异常) 时，被后端拒绝的块 (见 write_rejected) 改为逐行重试，只跳过出错的行；
+    # 其余错误 (超时等，块可能已写入) 以及未给 on_error 时直接抛出，避免重试写出重复行
+    done = 0
+    seen = 0
+    total = len(records)
+    for start in range(0, total, chunk_size):
+        batch = records[start:start + chunk_size]
+        try:
+            client.table(table_name).insert(batch).execute()
+            done += len(batch)
+        except Exception as e:
+            if on_error is None or not write_rejected(e): raise
+            for i, rec in enumerate(batch, start):
+                try:
+                    client.table(table_name).insert(rec).execute()
+                    done += 1
+                except Exception as e: on_error(i, e)
+        seen += len(batch)
+        if on_progress: on_progress(seen, total)
+    return done
+
+
+def bulk_upsert(client, table_name, records, chunk_size=CHUNK_SIZE, key=None):
+    key = key or TABLE_KEYS.get(table_name, 'id')
+    for batch in chunked(records, chunk_size):
+        client.table(table_name).upsert(batch, on_conflict=key).execute()
+    return len(records)
+
+
+def bulk_update(client, table_name, values, keys, chunk_size=CHUNK_SIZE, key=None, match=None):
+    # 同一组取值批量更新：每块一次 update ... in (主键)；match 为附加的等值条件 (如只改仍处于待审批的行)
+    key = key or TABLE_KEYS.get(table_name, 'id')
+    done = 0
+    for batch in chunked(list(keys), chunk_size):
+        q = client.table(table_name).update(values).in_(key, batch)
+        for col, v in (match or {}).items(): q = q.eq(col, v)
+        done += len(q.execute().data or [])
+    return done
+
+
+def bulk_delete(client, table_name, keys, chunk_size=CHUNK_SIZE, key=None):
+    key = key or TABLE_KEYS.get(table_name, 'id')
+    keys = list(keys)
+    for batch in chunked(keys, chunk_size):
+        client.table(table_name).delete().in_(key, batch).execute()
+    return len(keys)
+
+
+def count_rows(client, table_name):
+    key = TABLE_KEYS.get(table_name, 'id')
+    return client.table(table_name).select(key, count="exact").limit(1).execute().count or 0
+
+
+def iter_pages(client, table_name, page_size=PAGE_SIZE, key=None, columns="*", run=None, where=None):
+    # 按主键游标翻页 (key > 上一页最后一个值)，每页都是索引扫描，不受 offset 深度影响；
+    # run(execute) 可包裹每一页的请求 (限时 / 重试)；where(q) 给每页加过滤条件，只读需要的行
+    key = key or TABLE_KEYS.get(table_name, 'id')
+    last = None
+    while True:
+        q = client.table(table_name).select(columns).order(key).limit(page_size)
+        if where is not None: q = where(q)
+        if last is not None: q = q.gt(key, last)
+        rows = (run(q.execute) if run else q.execute()).data or []
+        if rows: yield rows
+        if len(rows) < page_size: return
+        last = rows[-1][key]
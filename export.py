@@ -0,0 +1,153 @@
+# --- 分润报表导出 ---
+# 汇总 + 任务 / 罚款 / 奖励明细，按块写出为 CSV (zip)、XLSX 或 Parquet (zip)：明细按行号分块切片，
+# 每块写完即释放，不在内存里拼出整份报表；XLSX 用 openpyxl 的 write_only 模式逐行落盘。
+# 产物按 (日期范围, 格式, 各表版本) 存为磁盘文件，数据没变时重复导出直接复用，只保留最近几份。
+# 明细口径与 AnalyticsMirror.period_stats 一致 (结束日期含当天，时间戳解析同 ts_us)，任务明细按成员求和即汇总中的任务产出。
+import glob
+import hashlib
+import io
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from analytics import snapshot_version, ts_us
+
+EXPORT_DIR = os.environ.get("YANZU_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "yanzu-exports"))
+EXPORT_CHUNK = 5000
+EXPORT_KEEP = 8
+EXPORT_FORMATS = {  # 格式 → (扩展名, MIME)
+    "CSV": ("zip", "application/zip"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": ("zip", "application/zip"),
+}
+
+
+def _num(values):
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _text(values):
+    return values.fillna('').astype(str)
+
+
+def _us(ts):
+    return int((pd.Timestamp(ts) - pd.Timestamp(0)) // pd.Timedelta(microseconds=1))
+
+
+def _chunks(df, pos, build, chunk_size):
+    # 只按行号切片，每次物化一块
+    for i in range(0, len(pos), chunk_size):
+        yield build(df.iloc[pos[i:i + chunk_size]])
+
+
+def _in_range(df, ts_col, who_col, members, start, end):
+    # 返回区间内、成员范围内的行号，按 (成员, 时间) 排序
+    if df.empty: return np.array([], dtype=int)
+    ts = ts_us(df[ts_col]).to_numpy(dtype='float64', na_value=np.nan)
+    s, e = _us(start), _us(pd.Timestamp(end) + pd.Timedelta(days=1))
+    mask = (ts >= s) & (ts <= e) & df[who_col].isin(members).to_numpy()
+    pos = np.flatnonzero(mask)
+    return pos[np.lexsort((ts[pos], df[who_col].to_numpy()[pos].astype(str)))]
+
+
+def payroll_sheets(summary, users, tasks, pens, rews, start, end, chunk_size=EXPORT_CHUNK):
+    # [(表名, 列名, 分块迭代器)]
+    members = users.loc[users['role'] != 'admin', 'username'] if not users.empty else pd.Series(dtype=object)
+
+    done = tasks[tasks['status'] == '完成'] if not tasks.empty else tasks
+
+    def task_rows(t):
+        is_rnd = t['is_rnd'].fillna(False).astype(bool)
+        val = (_num(t['difficulty']) * _num(t['std_time']) * _num(t['quality'])).fillna(0.0).where(~is_rnd, 0.0)
+        return pd.DataFrame({"任务ID": _num(t['id']).astype('Int64'), "成员": _text(t['assignee']), "标题": _text(t['title']),
+                             "战场ID": _num(t['battlefield_id']).astype('Int64'), "难度": _num(t['difficulty']), "工时": _num(t['std_time']),
+                             "质量": _num(t['quality']), "研发": is_rnd, "完成时间": _text(t['completed_at']), "产值": val.round(2)})
+
+    def pen_rows(p):
+        return pd.DataFrame({"记录ID": _num(p['id']).astype('Int64'), "成员": _text(p['username']),
+                             "原因": _text(p['reason']), "发生时间": _text(p['occurred_at'])})
+
+    def rew_rows(r):
+        return pd.DataFrame({"记录ID": _num(r['id']).astype('Int64'), "成员": _text(r['username']), "金额": _num(r['amount']).fillna(0.0),
+                             "原因": _text(r['reason']), "时间": _text(r['created_at'])})
+
+    summary_cols = ["成员", "任务产出", "罚款", "奖励", "💰 应发YVP"]
+    return [
+        ("汇总", summary_cols, iter([summary.reindex(columns=summary_cols)] if not summary.empty else [])),
+        ("任务明细", ["任务ID", "成员", "标题", "战场ID", "难度", "工时", "质量", "研发", "完成时间", "产值"],
+         _chunks(done, _in_range(done, 'completed_at', 'assignee', members, start, end), task_rows, chunk_size)),
+        # 周期报表口径不扣罚款，罚款明细仅供核对
+        ("罚款明细", ["记录ID", "成员", "原因", "发生时间"],
+         _chunks(pens, _in_range(pens, 'occurred_at', 'username', members, start, end), pen_rows, chunk_size)),
+        ("奖励明细", ["记录ID", "成员", "金额", "原因", "时间"],
+         _chunks(rews, _in_range(rews, 'created_at', 'username', members, start, end), rew_rows, chunk_size)),
+    ]
+
+
+def _write_csv(path, sheets):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, cols, chunks in sheets:
+            with zf.open(f"{name}.csv", 'w') as raw, io.TextIOWrapper(raw, encoding='utf-8-sig', newline='') as fh:
+                header = True
+                for part in chunks:
+                    part.to_csv(fh, index=False, header=header)
+                    header = False
+                if header: pd.DataFrame(columns=cols).to_csv(fh, index=False)
+
+
+def _write_xlsx(path, sheets):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    for name, cols, chunks in sheets:
+        ws = wb.create_sheet(name)
+        ws.append(cols)
+        for part in chunks:
+            for row in part.astype(object).where(part.notna(), None).itertuples(index=False, name=None): ws.append(row)
+    wb.save(path)
+
+
+def _write_parquet(path, sheets):
+    import pyarrow as pa  # 可选依赖，仅 Parquet 导出需要
+    import pyarrow.parquet as pq
+    with tempfile.TemporaryDirectory() as tmp, zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as zf:
+        for name, cols, chunks in sheets:
+            f = os.path.join(tmp, f"{name}.parquet")
+            writer = None
+            for part in chunks:
+                table = pa.Table.from_pandas(part, preserve_index=False, schema=writer.schema if writer else None)
+                if writer is None: writer = pq.ParquetWriter(f, table.schema)
+                writer.write_table(table)
+            if writer is None: pq.write_table(pa.Table.from_pandas(pd.DataFrame(columns=cols), preserve_index=False), f)
+            else: writer.close()
+            zf.write(f, f"{name}.parquet")
+
+
+_WRITERS = {"CSV": _write_csv, "XLSX": _write_xlsx, "Parquet": _write_parquet}
+
+
+def export_key(fmt, start, end, frames):
+    versions = repr((fmt, str(start), str(end), [snapshot_version(f) for f in frames]))
+    return hashlib.sha1(versions.encode()).hexdigest()[:16]
+
+
+def export_payroll(fmt, summary, users, tasks, pens, rews, start, end, out_dir=EXPORT_DIR):
+    # 返回导出文件路径；同一 (范围, 格式, 数据版本) 已导出过则直接复用
+    os.makedirs(out_dir, exist_ok=True)
+    ext = EXPORT_FORMATS[fmt][0]
+    path = os.path.join(out_dir, f"payroll_{start}_{end}_{fmt.lower()}_{export_key(fmt, start, end, [users, tasks, pens, rews])}.{ext}")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    part = path + ".part"
+    try:
+        _WRITERS[fmt](part, payroll_sheets(summary, users, tasks, pens, rews, start, end))
+        os.replace(part, path)
+    finally:
+        if os.path.exists(part): os.remove(part)
+    for old in sorted(glob.glob(os.path.join(out_dir, "payroll_*")), key=os.path.getmtime, reverse=True)[EXPORT_KEEP:]:
+        try: os.remove(old)
+        except OSError: pass
+    return path
@@ -0,0 +1,204 @@
+# --- 批量导入工具 ---
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# 矩阵任务点赞奖励阶梯：(点赞数须大于, 奖励点数)，与矩阵任务说明一致，按最高档发放
+LIKE_REWARD_LADDER = [(1000, 1.0), (5000, 2.0), (10000, 5.0), (100000, 30.0), (1000000, 150.0)]
+LIKE_REWARD_PREFIX = "🎬 点赞奖励｜"
+
+LIKE_COLUMN_ALIASES = {
+    'username': ['username', '成员', '用户名', '账号'],
+    'video': ['video', '视频', '视频链接', '视频id'],
+    'likes': ['likes', '点赞', '点赞数'],
+    'date': ['date', '日期', '发布日期'],
+}
+
+
+def read_table_file(uploaded, name=None):
+    name = (name or getattr(uploaded, 'name', '') or '').lower()
+    if name.endswith(('.xlsx', '.xls')):
+        return pd.read_excel(uploaded)  # 依赖 openpyxl
+    return pd.read_csv(uploaded)
+
+
+def normalize_columns(df, aliases):
+    lookup = {a.lower(): k for k, names in aliases.items() for a in names}
+    rename = {}
+    for c in df.columns:
+        k = lookup.get(str(c).strip().lower())
+        if k and k not in rename.values(): rename[c] = k
+    df = df.rename(columns=rename)
+    missing = [k for k in aliases if k not in df.columns]
+    return df, missing
+
+
+def like_reward_amount(likes):
+    thresholds = np.array([t for t, _ in LIKE_REWARD_LADDER], dtype=float)
+    amounts = np.array([0.0] + [a for _, a in LIKE_REWARD_LADDER])
+    vals = pd.to_numeric(likes, errors='coerce').fillna(0).to_numpy(dtype=float)
+    # side='left' 统计严格小于点赞数的阈值个数，即 ">1000" 的语义
+    return pd.Series(amounts[np.searchsorted(thresholds, vals, side='left')], index=likes.index)
+
+
+def paid_like_rewards(rewards_df):
+    if rewards_df.empty or 'reason' not in rewards_df.columns:
+        return pd.Series(dtype=float)
+    reasons = rewards_df['reason'].astype(str)
+    mask = reasons.str.startswith(LIKE_REWARD_PREFIX)
+    if not mask.any(): return pd.Series(dtype=float)
+    paid = rewards_df[mask].copy()
+    paid['video'] = reasons[mask].str.slice(len(LIKE_REWARD_PREFIX)).str.split('｜').str[0]
+    paid['amount'] = pd.to_numeric(paid['amount'], errors='coerce').fillna(0)
+    return paid.groupby('video')['amount'].sum()
+
+
+def build_like_rewards(raw, members, rewards_df):
+    # 返回 (计奖明细, 无效行)；同一视频只按最高点赞计奖，并扣除该视频历史已发放的奖励
+    df, missing = normalize_columns(raw, LIKE_COLUMN_ALIASES)
+    if missing: raise ValueError(f"缺少列: {', '.join(missing)}")
+    df = df[list(LIKE_COLUMN_ALIASES)].copy()
+    df['行号'] = df.index + 2
+    df['username'] = df['username'].astype(str).str.strip()
+    df['video'] = df['video'].fillna('').astype(str).str.strip()
+    df['likes'] = pd.to_numeric(df['likes'], errors='coerce')
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+
+    df['错误'] = np.select(
+        [~df['username'].isin(members), df['video'] == '', df['likes'].isna() | (df['likes'] < 0), df['date'].isna()],
+        ["成员不存在", "视频为空", "点赞数无效", "日期无效"], default="")
+    invalid = df[df['错误'] != ""]
+    valid = df[df['错误'] == ""]
+
+    plan = valid.sort_values(['likes', 'date'], ascending=[False, True]).drop_duplicates('video', keep='first').copy()
+    plan['阶梯奖励'] = like_reward_amount(plan['likes'])
+    plan['已发放'] = plan['video'].map(paid_like_rewards(rewards_df)).fillna(0.0)
+    plan['amount'] = (plan['阶梯奖励'] - plan['已发放']).clip(lower=0).round(2)
+    plan = plan.sort_values(['username', 'amount'], ascending=[True, False])
+    return plan.drop(columns=['错误']), invalid[['行号', 'username', 'video', 'likes', 'date', '错误']]
+
+
+def summarize_like_rewards(plan):
+    if plan.empty: return pd.DataFrame(columns=["成员", "视频数", "最高点赞", "本次奖励"])
+    summary = plan.groupby('username').agg(视频数=('video', 'count'), 最高点赞=('likes', 'max'), 本次奖励=('amount', 'sum')).reset_index()
+    return summary.rename(columns={'username': "成员"}).sort_values("本次奖励", ascending=False)
+
+
+def like_reward_records(plan, now=None):
+    # created_at 记发放 (导入) 时间，与手动赏赐一致，奖励计入当前结算周期，不会改写已结算周期；视频发布日期写进 reason
+    rows = plan[plan['amount'] > 0]
+    if rows.empty: return []
+    out = pd.DataFrame({
+        "username": rows['username'],
+        "amount": rows['amount'].astype(float),
+        "reason": LIKE_REWARD_PREFIX + rows['video'] + "｜" + rows['likes'].astype(int).astype(str) + "赞｜发布于 " + rows['date'].dt.strftime('%Y-%m-%d'),
+        "created_at": (now or datetime.datetime.now()).isoformat(),
+    })
+    return out.to_dict('records')
+
+
+# --- 任务批量导入 ---
+TASK_COLUMN_ALIASES = {
+    'title': ['title', '任务标题', '标题', '任务'],
+    'campaign': ['campaign', '战役', '所属战役'],
+    'battlefield': ['battlefield', '战场', '所属战场'],
+}
+TASK_OPTIONAL_ALIASES = {
+    'description': ['description', '详情', '描述'],
+    'difficulty': ['difficulty', '难度'],
+    'std_time': ['std_time', '工时', '标准工时'],
+    'assignee': ['assignee', '执行人', '指派', '成员'],
+    'deadline': ['deadline', '截止日期', '截止'],
+    'is_rnd': ['is_rnd', '研发', '产品研发'],
+}
+TASK_TEMPLATE = "任务标题,战役,战场,详情,难度,工时,执行人,截止日期,研发\n示例任务,战役A,战场1,说明文字,1.0,2.0,\"张三,李四\",2026-03-01,否\n"
+_TRUTHY = {'1', 'true', 'yes', 'y', '是', '✓', '√'}
+
+
+def battlefield_lookup(camps, batts):
+    # (战役标题, 战场标题) → 战场 id；重名时取第一个，与发布表单一致
+    if camps.empty or batts.empty: return {}
+    c = camps.drop_duplicates('title')[['id', 'title']].rename(columns={'id': 'campaign_id', 'title': 'campaign'})
+    b = batts.merge(c, on='campaign_id').drop_duplicates(['campaign', 'title'])
+    return dict(zip(zip(b['campaign'].astype(str).str.strip(), b['title'].astype(str).str.strip()), b['id']))
+
+
+def task_keys(df):
+    # 任务去重键：(标题, 战场, 执行人, 截止日期)
+    if df.empty: return pd.Series([], dtype=object)
+    bid = pd.to_numeric(df['battlefield_id'], errors='coerce').fillna(-1).astype(int)
+    dl = pd.to_datetime(df['deadline'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+    return pd.Series(list(zip(df['title'].fillna('').astype(str).str.strip(), bid, df['assignee'].fillna('').astype(str).str.strip(), dl)), index=df.index, dtype=object)
+
+
+def build_task_import(raw, camps, batts, members, existing=None):
+    # 返回 (待发布任务, 无效行)；执行人可写多个 (逗号 / 顿号 / 分号分隔)，每人一条，留空进公共任务池
+    # existing 为现有任务表：与之 (或文件内前面的行) 去重键相同的行视为重复跳过，同一文件重复导入不会再写一遍
+    df, missing = normalize_columns(raw, {**TASK_COLUMN_ALIASES, **TASK_OPTIONAL_ALIASES})
+    missing = [k for k in missing if k in TASK_COLUMN_ALIASES]
+    if missing: raise ValueError(f"缺少列: {', '.join(missing)}")
+    df = df.reindex(columns=list(TASK_COLUMN_ALIASES) + list(TASK_OPTIONAL_ALIASES)).copy()
+    df['行号'] = df.index + 2
+    text = lambda col: df[col].fillna('').astype(str).str.strip()
+    for col in ['title', 'campaign', 'battlefield', 'description', 'assignee']: df[col] = text(col)
+    df['is_rnd'] = text('is_rnd').str.lower().isin(_TRUTHY)
+
+    lookup = battlefield_lookup(camps, batts)
+    camp_titles = {c for c, _ in lookup} | set(camps['title'].astype(str).str.strip() if not camps.empty else [])
+    df['battlefield_id'] = pd.Series(list(zip(df['campaign'], df['battlefield'])), index=df.index, dtype=object).map(lookup)
+
+    nums = {}
+    for col in ['difficulty', 'std_time']:
+        blank = text(col) == ''
+        nums[col] = pd.to_numeric(df[col].where(~blank), errors='coerce')
+        df[f'{col}_bad'] = ~blank & (nums[col].isna() | (nums[col] < 0))
+        df[col] = nums[col].fillna(1.0).where(~df['is_rnd'], 0.0)
+    d_blank = text('deadline') == ''
+    d_val = pd.to_datetime(df['deadline'].where(~d_blank), errors='coerce')
+    df['deadline_bad'] = ~d_blank & d_val.isna()
+    df['deadline'] = d_val.dt.strftime('%Y-%m-%d').where(~d_blank, None)
+
+    df['assignee'] = df['assignee'].str.split(r'\s*[,，、;；]\s*')
+    df = df.explode('assignee').reset_index(drop=True)
+    df['assignee'] = df['assignee'].fillna('')
+
+    df['错误'] = np.select(
+        [df['title'] == '', ~df['campaign'].isin(camp_titles), df['battlefield_id'].isna(),
+         df['difficulty_bad'], df['std_time_bad'], df['deadline_bad'],
+         (df['assignee'] != '') & ~df['assignee'].isin(members)],
+        ["标题为空", "战役不存在", "战场不存在", "难度无效", "工时无效", "截止日期无效", "成员不存在"], default="")
+    pool = df['assignee'] == ''
+    df['type'] = np.where(pool, "公共任务池", "指派成员")
+    df['status'] = np.where(pool, "待领取", "进行中")
+    df['assignee'] = df['assignee'].where(~pool, "待定")
+    ok = df['错误'] == ""
+    keys = task_keys(df[ok])
+    have = set(task_keys(existing)) if existing is not None else set()
+    df.loc[keys.index[keys.isin(have).to_numpy()], '错误'] = "任务已存在"
+    df.loc[keys.index[keys.duplicated().to_numpy() & ~keys.isin(have).to_numpy()], '错误'] = "文件内重复"
+    invalid = df[df['错误'] != ""]
+    plan = df[df['错误'] == ""].reset_index(drop=True)
+    return plan.drop(columns=['错误', 'difficulty_bad', 'std_time_bad', 'deadline_bad']), invalid[['行号', 'title', 'campaign', 'battlefield', 'assignee', '错误']]
+
+
+def summarize_task_import(plan):
+    if plan.empty: return pd.DataFrame(columns=["战役", "战场", "任务数", "指派", "公共池", "总工时"])
+    summary = plan.assign(指派=plan['type'] == "指派成员", 公共池=plan['type'] == "公共任务池").groupby(['campaign', 'battlefield']).agg(
+        任务数=('title', 'count'), 指派=('指派', 'sum'), 公共池=('公共池', 'sum'), 总工时=('std_time', 'sum')).reset_index()
+    return summary.rename(columns={'campaign': "战役", 'battlefield': "战场"})
+
+
+def task_import_records(plan):
+    # 返回 (tasks 表记录, 对应的源文件行号)
+    if plan.empty: return [], []
+    out = pd.DataFrame({
+        "title": plan['title'], "description": plan['description'],
+        "difficulty": plan['difficulty'].astype(float), "std_time": plan['std_time'].astype(float),
+        "status": plan['status'], "assignee": plan['assignee'], "deadline": plan['deadline'],
+        "type": plan['type'], "battlefield_id": plan['battlefield_id'].astype(int), "is_rnd": plan['is_rnd'].astype(bool),
+    })
+    recs = out.to_dict('records')
+    for r in recs:
+        if pd.isna(r['deadline']): r['deadline'] = None
+    return recs, plan['行号'].tolist()
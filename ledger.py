@@ -0,0 +1,124 @@
+# --- YVP 日账本 ---
+# 每个成员每天一行：当日任务产出、罚款、奖励与净值 (只记有发生额的日子)。
+# 罚款记在缺勤发生的那一天，金额为缺勤前 7 天内完成任务产值的 20%，与 calculate_net_yvp 口径一致
+# (没有完成时间的任务无法落到某一天，不计入账本)；
+# 按天累加即得任意时点的总净资产，风云榜 / 个人中心的走势与排名变化直接读这张小表。
+# 线上建表 (Supabase SQL Editor)：
+#   create table yvp_ledger (key text primary key, date date, username text,
+#                            gross float8, fines float8, rewards float8, net float8);
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from db import TABLE_KEYS, bulk_delete, bulk_upsert, iter_pages
+
+LEDGER_TABLE = 'yvp_ledger'
+LEDGER_COLUMNS = ['key', 'date', 'username', 'gross', 'fines', 'rewards', 'net']
+RESYNC_DAYS = 8  # 增量同步重算的天数：覆盖罚款回溯窗口与补录/改判
+
+
+def _num(values):
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _dt(values):
+    # 混合格式 / 带时区的时间戳统一转为北京时间的无时区时间
+    try: ts = pd.to_datetime(values, errors='coerce', format='mixed')
+    except (ValueError, TypeError): ts = pd.to_datetime(values, errors='coerce', format='mixed', utc=True)
+    if ts.dt.tz is not None: ts = ts.dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
+    return ts
+
+
+def daily_ledger(users, tasks, pens, rews, start=None, end=None):
+    # 全量向量化计算；start/end 为日期 (含)，只影响输出的日期范围，罚款窗口仍看完整历史
+    members = users.loc[users['role'] != 'admin', 'username'] if not users.empty else pd.Series(dtype=object)
+    parts = []
+
+    done = pd.DataFrame(columns=['username', 'c_dt', 'val'])
+    if not tasks.empty:
+        t = tasks[(tasks['status'] == '完成') & tasks['assignee'].isin(members)]
+        is_rnd = t['is_rnd'].fillna(False).astype(bool)
+        val = (_num(t['difficulty']) * _num(t['std_time']) * _num(t['quality'])).fillna(0.0).where(~is_rnd, 0.0)
+        done = pd.DataFrame({'username': t['assignee'], 'c_dt': _dt(t['completed_at']), 'val': val}).dropna(subset=['c_dt'])
+        parts.append(pd.DataFrame({'date': done['c_dt'].dt.normalize(), 'username': done['username'], 'gross': done['val']}))
+
+    if not pens.empty and not done.empty:
+        p = pens[pens['username'].isin(members)]
+        p = pd.DataFrame({'username': p['username'], 'o_dt': _dt(p['occurred_at'])}).dropna(subset=['o_dt'])
+        fines = []
+        # 每个成员的完成任务按时间排序后做前缀和，窗口内产值 = 两次二分查找之差
+        for u, grp in p.groupby('username', sort=False):
+            mine = done[done['username'] == u].sort_values('c_dt')
+            if mine.empty: continue
+            c = mine['c_dt'].to_numpy()
+            cs = np.concatenate([[0.0], np.cumsum(mine['val'].to_numpy())])
+            o = grp['o_dt'].to_numpy()
+            lo = np.searchsorted(c, o - np.timedelta64(7, 'D'), side='left')
+            hi = np.searchsorted(c, o, side='right')
+            fines.append(pd.DataFrame({'date': grp['o_dt'].dt.normalize().to_numpy(), 'username': u, 'fines': (cs[hi] - cs[lo]) * 0.2}))
+        if fines: parts.append(pd.concat(fines, ignore_index=True))
+
+    if not rews.empty:
+        r = rews[rews['username'].isin(members)]
+        parts.append(pd.DataFrame({'date': _dt(r['created_at']).dt.normalize(), 'username': r['username'], 'rewards': _num(r['amount']).fillna(0.0)}).dropna(subset=['date']))
+
+    if not parts: return pd.DataFrame(columns=LEDGER_COLUMNS)
+    led = pd.concat(parts, ignore_index=True).reindex(columns=['date', 'username', 'gross', 'fines', 'rewards'])  # 某类发生额整体缺席时补列
+    led = led.groupby(['date', 'username'], as_index=False)[['gross', 'fines', 'rewards']].sum()
+    if start is not None: led = led[led['date'] >= pd.Timestamp(start)]
+    if end is not None: led = led[led['date'] <= pd.Timestamp(end)]
+    led['net'] = led['gross'] - led['fines'] + led['rewards']
+    led[['gross', 'fines', 'rewards', 'net']] = led[['gross', 'fines', 'rewards', 'net']].round(2)
+    led['date'] = led['date'].dt.strftime('%Y-%m-%d')
+    led['key'] = led['date'] + '|' + led['username']
+    return led[LEDGER_COLUMNS].sort_values(['date', 'username']).reset_index(drop=True)
+
+
+def sync_ledger(client, users, tasks, pens, rews, days=RESYNC_DAYS, today=None, backfill=False):
+    # 重算最近 days 天 (backfill=True 时重算全部历史)，只写入有变化的行，并删除已不再有发生额的行；
+    # 线上账本只按日期读回重算窗口内的行，开销与窗口大小相关，不随历史增长
+    today = pd.Timestamp(today or datetime.date.today())
+    start = None if backfill else today - pd.Timedelta(days=days - 1)
+    fresh = daily_ledger(users, tasks, pens, rews, start, today)
+    lo, hi = (start.strftime('%Y-%m-%d') if start is not None else None), today.strftime('%Y-%m-%d')
+    window = lambda q: (q.gte('date', lo) if lo else q).lte('date', hi)
+    old = [r for rows in iter_pages(client, LEDGER_TABLE, key=TABLE_KEYS[LEDGER_TABLE], where=window) for r in rows]
+    old = pd.DataFrame(old, columns=LEDGER_COLUMNS)
+    old['date'] = old['date'].astype(str).str[:10]
+
+    merged = fresh.merge(old, on='key', how='left', suffixes=('', '_old'), indicator=True)
+    same = (merged['_merge'] == 'both')
+    for col in ['gross', 'fines', 'rewards', 'net']: same &= (merged[col] - _num(merged[f'{col}_old'])).abs() < 0.005
+    changed = fresh[~same.to_numpy()]
+    stale = sorted(set(old['key']) - set(fresh['key']))
+    if not changed.empty: bulk_upsert(client, LEDGER_TABLE, changed.to_dict('records'))
+    if stale: bulk_delete(client, LEDGER_TABLE, stale)
+    return {"written": len(changed), "deleted": len(stale), "rows": len(fresh)}
+
+
+def ledger_series(ledger, members=None, days=None, today=None):
+    # 日账本 → 每人每天的累计净值 (日期 × 成员)，无发生额的日子沿用前一天
+    if ledger.empty: return pd.DataFrame()
+    led = ledger.assign(date=pd.to_datetime(ledger['date'].astype(str).str[:10]), net=_num(ledger['net']).fillna(0.0))
+    if members is not None: led = led[led['username'].isin(members)]
+    if led.empty: return pd.DataFrame()
+    daily = led.pivot_table(index='date', columns='username', values='net', aggfunc='sum').fillna(0.0)
+    today = pd.Timestamp(today or datetime.date.today())
+    daily = daily.reindex(pd.date_range(daily.index.min(), max(today, daily.index.max()), freq='D'), fill_value=0.0)
+    total = daily.cumsum().round(2)
+    if days: total = total[total.index > today - pd.Timedelta(days=days)]
+    return total
+
+
+def rank_changes(ledger, members, days=7, today=None):
+    # 按累计净值排名，返回 {成员: 与 days 天前相比上升的名次}
+    total = ledger_series(ledger, members, today=today)
+    if total.empty: return {}
+    total = total.reindex(columns=list(members), fill_value=0.0)
+    today = pd.Timestamp(today or datetime.date.today())
+    past = total[total.index <= today - pd.Timedelta(days=days)]
+    if past.empty: return {}
+    now_rank = total.iloc[-1].rank(ascending=False, method='min')
+    then_rank = past.iloc[-1].rank(ascending=False, method='min')
+    return (then_rank - now_rank).astype(int).to_dict()
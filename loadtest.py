@@ -0,0 +1,194 @@
+# --- 多会话压测 ---
+# 模拟晨会时全员同时打开页面：N 个并发会话用 Streamlit AppTest 无头运行真实的 app.py，后端为本地 SQLite 替身。
+# 每个会话用不同成员登录，随机切换导航页、勾选今日待办、抢公共任务；统计每次 rerun 的耗时分位数、后端请求数与进程内存峰值。
+# 写操作 (勾选待办 / 抢单) 做了却没有产生对应的后端写请求时，报告里给出 warnings 并以非零退出，说明没压到写入路径。
+#   python loadtest.py --sessions 12 --steps 20 --scale 20000 --out loadtest.jsonl
+import argparse
+import collections
+import datetime
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import datagen
+from storage import SQLiteBackend
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+NAV_PAGES = ["☀️ 今日清单", "📅 请假中心", "🔭 战略作战室", "📋 任务大厅", "🗣️ 颜祖广场", "🏆 风云榜", "🏰 个人中心"]
+ACTIONS = ["nav", "nav", "nav", "todo", "grab"]
+WRITE_ACTIONS = {"todo": ("daily_todos", "update"), "grab": ("tasks", "update")}  # 操作 → 应产生的写请求
+CST_TZ = datetime.timezone(datetime.timedelta(hours=8))
+
+
+class RequestCounter:
+    # 包一层 SQLiteBackend.run，按 (表, 操作) 计数；app 内部自己打开的后端也会被计入
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+        self.orig = None
+
+    def __enter__(self):
+        self.orig = orig = SQLiteBackend.run
+        counter = self
+
+        def run(backend, q):
+            with counter.lock: counter.counts[(q.table_name, q.op)] += 1
+            return orig(backend, q)
+        SQLiteBackend.run = run
+        return self
+
+    def __exit__(self, *exc):
+        SQLiteBackend.run = self.orig
+
+    def snapshot(self):
+        with self.lock: return collections.Counter(self.counts)
+
+
+def prepare_db(path, scale, seed, todos_per_member=3):
+    # 合成数据 + 每个成员今天的待办 (按北京时间业务日)，保证“勾选待办”有目标。
+    # 页面限制每人同时最多做 2 个公共任务，合成数据里人人早已超出，抢单只会走提示分支；
+    # 把成员手上进行中的公共任务改记为指派任务，任务池与各人工作量不变，每个会话都能真正抢到
+    frames = datagen.generate(scale, seed)
+    tasks = frames['tasks']
+    tasks.loc[tasks['type'].eq('公共任务池') & tasks['status'].isin(['进行中', '返工']), 'type'] = '指派成员'
+    now = datetime.datetime.now(CST_TZ)
+    today = str(now.date() - datetime.timedelta(days=1) if now.hour < 3 else now.date())
+    members = frames['users'].loc[frames['users']['role'] != 'admin', 'username'].tolist()
+    todos = frames['daily_todos']
+    extra = pd.DataFrame({'id': np.arange(len(todos) + 1, len(todos) + 1 + len(members) * todos_per_member),
+                          'username': np.repeat(members, todos_per_member), 'date': today,
+                          'content': [f"今日待办{i}" for i in range(len(members) * todos_per_member)],
+                          'category': '核心必办', 'is_completed': False})
+    frames['daily_todos'] = pd.concat([todos, extra], ignore_index=True)
+    datagen.load_into(SQLiteBackend(path), frames)
+    return members
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 4) if values else None
+
+
+class Session:
+    def __init__(self, username, password, seed, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+        self.username, self.password = username, password
+        self.rng = random.Random(seed)
+        self.timings = []
+        self.errors = []
+
+    def _timed(self, label, fn):
+        t0 = time.perf_counter()
+        try: fn()
+        except Exception as e: self.errors.append(f"{label}: {e!r}"[:300])
+        self.timings.append((label, time.perf_counter() - t0))
+        self.errors += [f"{label}: {e.value}"[:300] for e in self.at.exception]
+
+    def login(self):
+        self._timed("first_paint", self.at.run)
+        fields = {ti.label: ti for ti in self.at.text_input}
+        if "用户名" not in fields: return
+        fields["用户名"].input(self.username)
+        fields["密码"].input(self.password)
+        submit = [b for b in self.at.button if b.label == "🚀 登录"]
+        self._timed("login", submit[0].click().run)
+
+    def _buttons(self, prefix):
+        return [b for b in self.at.button if (b.key or "").startswith(prefix)]
+
+    def step(self):
+        if not self.at.radio: return self._timed("rerun", self.at.run)
+        action = self.rng.choice(ACTIONS)
+        nav = self.at.radio[0]
+        if action == "todo":
+            if nav.value != "☀️ 今日清单": self._timed("nav", nav.set_value("☀️ 今日清单").run)
+            targets = self._buttons("done_")
+            if targets: return self._timed("todo", self.rng.choice(targets).click().run)
+        elif action == "grab":
+            if nav.value != "📋 任务大厅": self._timed("nav", nav.set_value("📋 任务大厅").run)
+            targets = self._buttons("g_")
+            if targets: return self._timed("grab", self.rng.choice(targets).click().run)
+        else:
+            self._timed("nav", nav.set_value(self.rng.choice(NAV_PAGES)).run)
+
+
+def run_load(db_path, members, sessions, steps, seed, timeout, ramp):
+    os.environ["YANZU_STORAGE"] = f"sqlite:///{db_path}"
+    rng = random.Random(seed)
+    users = [rng.choice(members) for _ in range(sessions)] if sessions > len(members) else rng.sample(members, sessions)
+    start = threading.Barrier(sessions)
+
+    def drive(i):
+        s = Session(users[i], "123456", seed + i, timeout)
+        start.wait()
+        if ramp: time.sleep(rng.uniform(0, ramp))
+        s.login()
+        for _ in range(steps): s.step()
+        return s
+
+    with RequestCounter() as counter, ThreadPoolExecutor(max_workers=sessions) as pool:
+        t0 = time.perf_counter()
+        done = list(pool.map(drive, range(sessions)))
+        wall = time.perf_counter() - t0
+        counts = counter.snapshot()
+    return done, counts, wall
+
+
+def summarize(done, counts, wall, sessions, steps):
+    by_label = collections.defaultdict(list)
+    for s in done:
+        for label, sec in s.timings: by_label[label].append(sec)
+    all_t = [sec for s in done for _, sec in s.timings]
+    by_op = collections.Counter()
+    for (t, op), n in counts.items(): by_op[op] += n
+    return {
+        "sessions": sessions, "steps": steps, "reruns": len(all_t), "wall_seconds": round(wall, 3),
+        "p50": percentile(all_t, 50), "p95": percentile(all_t, 95), "p99": percentile(all_t, 99),
+        "by_action": {k: {"n": len(v), "p50": percentile(v, 50), "p95": percentile(v, 95), "p99": percentile(v, 99)} for k, v in sorted(by_label.items())},
+        "backend_requests": sum(counts.values()), "requests_per_rerun": round(sum(counts.values()) / max(len(all_t), 1), 2),
+        "requests_by_op": dict(by_op), "requests_by_table": {f"{t}.{op}": n for (t, op), n in counts.most_common()},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "errors": [e for s in done for e in s.errors][:20],
+        "warnings": [f"{a}: {len(by_label[a])} 次操作没有产生 {t}.{op} 写请求" for a, (t, op) in WRITE_ACTIONS.items()
+                     if by_label.get(a) and not counts.get((t, op))],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=8)
+    ap.add_argument("--steps", type=int, default=10, help="登录后每个会话的操作次数")
+    ap.add_argument("--scale", type=int, default=5000, help="合成数据的任务行数")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--ramp", type=float, default=0.0, help="会话启动的随机错开秒数 (0 = 同时涌入)")
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--db", default=None, help="SQLite 文件路径，默认临时文件")
+    ap.add_argument("--out", default=None, help="结果追加写入的 JSON lines 文件")
+    ap.add_argument("--write-behind", action="store_true", help="今日清单改动走写后台队列")
+    args = ap.parse_args(argv)
+
+    if args.write_behind: os.environ["YANZU_TODO_WRITE_BEHIND"] = "1"
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="yanzu-load-"), "load.db")
+    if os.path.exists(db_path): os.remove(db_path)
+    members = prepare_db(db_path, args.scale, args.seed)
+    done, counts, wall = run_load(db_path, members, args.sessions, args.steps, args.seed, args.timeout, args.ramp)
+    result = summarize(done, counts, wall, args.sessions, args.steps)
+    result.update({"scale": args.scale, "seed": args.seed, "write_behind": args.write_behind, "at": datetime.datetime.now().isoformat(timespec="seconds")})
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f: f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    for w in result["warnings"]: print(f"⚠️ {w}", file=sys.stderr)
+    return 1 if result["errors"] or result["warnings"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
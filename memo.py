@@ -0,0 +1,48 @@
+# --- 派生视图记忆化 ---
+# 派生结果 (风云榜、动态列表、作战室进度……) 按 (视图名, 各输入表快照的版本, 额外参数) 记忆；
+# 数据库没有变化时，重跑页面只做一次字典查找。容量有限，按最近最少使用淘汰。
+# 记忆的结果在会话间共享，调用方只读不改 (需要加列时先 copy)。
+# 给定 shared (sharedcache.SharedCache) 时本进程未命中再查跨进程缓存，多个副本对同一数据版本只算一次。
+import collections
+import threading
+
+from analytics import snapshot_version
+from sharedcache import cache_key
+
+VIEW_CACHE_SIZE = 64
+
+
+class ViewCache:
+    def __init__(self, maxsize=VIEW_CACHE_SIZE, shared=None):
+        self.maxsize = maxsize
+        self.shared = shared
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, name, fn, *frames, args=()):
+        # fn(*frames, *args)；frames 须为整表快照，args 须可哈希
+        key = (name, tuple(snapshot_version(f) for f in frames), args)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        if self.shared is not None: value = self.shared.get_or_compute("view:" + cache_key(*key), lambda: fn(*frames, *args))
+        else: value = fn(*frames, *args)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize: self.entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {"views": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "names": collections.Counter(k[0] for k in self.entries)}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
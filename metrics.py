@@ -0,0 +1,99 @@
+# --- YVP 结算 (pandas 参考实现) ---
+# 与页面解耦，供分析库一致性校验与基准测试直接调用。
+import pandas as pd
+
+
+def safe_float(val):
+    try:
+        if val is None or str(val).strip() == "": return 0.0
+        return float(val)
+    except: return 0.0
+
+
+def calculate_net_yvp(username, tasks_df, pen_df, rew_df, days_lookback=None):
+    try:
+        gross = 0.0
+        if not tasks_df.empty:
+            df_t = tasks_df.copy()
+            my_done = df_t[(df_t['assignee'] == username) & (df_t['status'] == '完成')].copy()
+            if not my_done.empty:
+                my_done['is_rnd'] = my_done['is_rnd'].fillna(False)
+                my_done['val'] = my_done.apply(lambda x: 0.0 if x['is_rnd'] else (safe_float(x.get('difficulty')) * safe_float(x.get('std_time')) * safe_float(x.get('quality'))), axis=1)
+                
+                my_done['c_dt'] = pd.to_datetime(my_done['completed_at'], errors='coerce')
+                if days_lookback:
+                    cutoff = pd.Timestamp.now() - pd.Timedelta(days=days_lookback)
+                    my_done = my_done[my_done['c_dt'] >= cutoff]
+                gross = my_done['val'].sum()
+
+        total_fine = 0.0
+        if not pen_df.empty:
+            df_p = pen_df[pen_df['username'] == username].copy()
+            if not df_p.empty:
+                df_p['o_dt'] = pd.to_datetime(df_p['occurred_at'], errors='coerce')
+                if days_lookback:
+                    cutoff = pd.Timestamp.now() - pd.Timedelta(days=days_lookback)
+                    df_p = df_p[df_p['o_dt'] >= cutoff]
+                
+                if not df_p.empty and not tasks_df.empty:
+                    df_t_base = tasks_df[(tasks_df['assignee'] == username) & (tasks_df['status'] == '完成')].copy()
+                    if not df_t_base.empty:
+                        df_t_base['c_dt'] = pd.to_datetime(df_t_base['completed_at'], errors='coerce')
+                        df_t_base['is_rnd'] = df_t_base['is_rnd'].fillna(False)
+                        df_t_base['val'] = df_t_base.apply(lambda x: 0.0 if x['is_rnd'] else (safe_float(x.get('difficulty')) * safe_float(x.get('std_time')) * safe_float(x.get('quality'))), axis=1)
+                        
+                        for _, pen in df_p.iterrows():
+                            if pd.isna(pen['o_dt']): continue
+                            w_start = pen['o_dt'] - pd.Timedelta(days=7)
+                            w_tasks = df_t_base[(df_t_base['c_dt'] >= w_start) & (df_t_base['c_dt'] <= pen['o_dt'])]
+                            total_fine += w_tasks['val'].sum() * 0.2
+        
+        total_reward = 0.0
+        if not rew_df.empty:
+            df_r = rew_df[rew_df['username'] == username].copy()
+            if not df_r.empty:
+                df_r['amount_val'] = df_r['amount'].apply(safe_float)
+                if days_lookback:
+                    df_r['c_dt'] = pd.to_datetime(df_r['created_at'], errors='coerce')
+                    cutoff = pd.Timestamp.now() - pd.Timedelta(days=days_lookback)
+                    df_r = df_r[df_r['c_dt'] >= cutoff]
+                total_reward = df_r['amount_val'].sum()
+
+        return round(gross - total_fine + total_reward, 2)
+    except Exception as e:
+        print(f"Error calculating YVP for {username}: {e}")
+        return 0.0
+
+
+def period_stats(users, tasks, rews, start_date, end_date):
+    try:
+        if users.empty: return pd.DataFrame()
+        members = users[users['role'] != 'admin']['username'].tolist()
+        
+        stats_data = []
+        ts_start = pd.Timestamp(start_date); ts_end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+        
+        for m in members:
+            gross = 0.0
+            if not tasks.empty:
+                df_t = tasks[(tasks['assignee'] == m) & (tasks['status'] == '完成')].copy()
+                if not df_t.empty:
+                    df_t['is_rnd'] = df_t['is_rnd'].fillna(False)
+                    df_t['c_dt'] = pd.to_datetime(df_t['completed_at'], errors='coerce')
+                    in_range = df_t[(df_t['c_dt'] >= ts_start) & (df_t['c_dt'] <= ts_end)]
+                    gross = in_range[in_range['is_rnd']==False].apply(lambda x: safe_float(x.get('difficulty')) * safe_float(x.get('std_time')) * safe_float(x.get('quality')), axis=1).sum()
+            
+            fine = 0.0
+            
+            reward_val = 0.0
+            if not rews.empty:
+                df_r = rews[rews['username'] == m].copy()
+                df_r['c_dt'] = pd.to_datetime(df_r['created_at'], errors='coerce')
+                in_range_r = df_r[(df_r['c_dt'] >= ts_start) & (df_r['c_dt'] <= ts_end)]
+                reward_val = in_range_r['amount'].apply(safe_float).sum()
+                
+            net = gross - fine + reward_val
+            stats_data.append({"成员": m, "任务产出": round(gross, 2), "罚款": round(fine, 2), "奖励": round(reward_val, 2), "💰 应发YVP": round(net, 2)})
+        
+        return pd.DataFrame(stats_data).sort_values("💰 应发YVP", ascending=False) if stats_data else pd.DataFrame()
+    except: return pd.DataFrame()
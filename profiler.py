@@ -0,0 +1,197 @@
+# --- 运行剖析 ---
+# 每次 rerun 一条记录 (分段耗时 + 后端调用汇总)，每次后端调用一条记录 (表 / 操作 / 行数 / 字节 / 缓存命中)，
+# 均存放在定长环形缓冲区中，供管理员诊断页查看；设置 YANZU_PROFILE_LOG 时每次 rerun 结束追加一行 JSON 到该文件。
+import collections
+import datetime
+import itertools
+import json
+import threading
+import time
+
+import pandas as pd
+
+from storage import StorageBackend
+
+RERUN_CAPACITY = 300
+CALL_CAPACITY = 5000
+BYTES_SAMPLE = 50  # 估算响应字节数时只序列化前 N 行再按行数放大
+
+
+def estimate_bytes(rows):
+    if not rows: return 0
+    sample = rows[:BYTES_SAMPLE]
+    return int(len(json.dumps(sample, ensure_ascii=False, default=str).encode('utf-8')) * len(rows) / len(sample))
+
+
+class Profiler:
+    def __init__(self, capacity=RERUN_CAPACITY, call_capacity=CALL_CAPACITY, log_path=None):
+        self.reruns = collections.deque(maxlen=capacity)
+        self.calls = collections.deque(maxlen=call_capacity)
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.open = {}  # 会话 → 未结束的 rerun (被 st.rerun 打断的 rerun 在下一次开始时补记)
+        self.ids = itertools.count(1)
+
+    # -- rerun 与分段 --
+    def begin_rerun(self, session, user=None):
+        with self.lock: prev = self.open.pop(session, None)
+        if prev: self._finish(prev, "中断")
+        rec = {"id": next(self.ids), "session": session, "user": user, "page": None,
+               "at": datetime.datetime.now().isoformat(timespec="seconds"), "t0": time.perf_counter(), "last": None,
+               "sections": [], "calls": 0, "call_seconds": 0.0, "hits": 0, "misses": 0, "status": None}
+        with self.lock: self.open[session] = rec
+        self.local.rerun = rec
+        self.local.section = None
+        return rec
+
+    def mark(self, name):
+        # 结束上一段并开始新的一段；页面脚本是平铺的，用打点代替嵌套的 with 块
+        rec = getattr(self.local, "rerun", None)
+        if rec is None: return
+        now = time.perf_counter()
+        self._close_section(rec, now)
+        self.local.section = (name, now)
+        if name.startswith("页面"): rec["page"] = name
+
+    def _close_section(self, rec, now):
+        cur = getattr(self.local, "section", None)
+        if cur: rec["sections"].append((cur[0], round(now - cur[1], 6)))
+        self.local.section = None
+        rec["last"] = now
+
+    def end_rerun(self, status="完成"):
+        rec = getattr(self.local, "rerun", None)
+        if rec is None: return
+        self._close_section(rec, time.perf_counter())
+        with self.lock: self.open.pop(rec["session"], None)
+        self.local.rerun = None
+        self._finish(rec, status)
+
+    def _finish(self, rec, status):
+        # 被打断的 rerun 以最后一次打点 / 调用的时间为终点
+        end = time.perf_counter() if status == "完成" else (rec["last"] or rec["t0"])
+        out = {k: v for k, v in rec.items() if k not in ("t0", "last")}
+        out.update(seconds=round(end - rec["t0"], 6), status=status, call_seconds=round(rec["call_seconds"], 6))
+        with self.lock: self.reruns.append(out)
+        if self.log_path:
+            calls = [c for c in list(self.calls) if c["rerun"] == rec["id"]]
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(out, call_log=calls), ensure_ascii=False) + "\n")
+            except OSError: pass
+
+    # -- 后端调用 --
+    def record_call(self, table, op, rows, nbytes, seconds, error=None):
+        rec = getattr(self.local, "rerun", None)
+        scope = getattr(self.local, "cache_scope", None)
+        if scope is not None: scope.append(1)
+        call = {"rerun": rec["id"] if rec else None, "table": table, "op": op, "rows": rows, "bytes": nbytes,
+                "seconds": round(seconds, 6), "cache": "miss" if scope is not None else None, "error": error,
+                "at": datetime.datetime.now().isoformat(timespec="milliseconds")}
+        with self.lock: self.calls.append(call)
+        if rec:
+            rec["calls"] += 1
+            rec["call_seconds"] += seconds
+            rec["last"] = time.perf_counter()
+            if scope is not None: rec["misses"] += 1
+
+    def cached(self, table, fn, *args):
+        # 包裹 st.cache_data 函数：期间没有发生后端调用即为命中
+        scope = []
+        outer = getattr(self.local, "cache_scope", None)
+        self.local.cache_scope = scope
+        t0 = time.perf_counter()
+        try: result = fn(*args)
+        finally: self.local.cache_scope = outer
+        if not scope:
+            rec = getattr(self.local, "rerun", None)
+            call = {"rerun": rec["id"] if rec else None, "table": table, "op": "cache", "rows": len(result), "bytes": 0,
+                    "seconds": round(time.perf_counter() - t0, 6), "cache": "hit", "error": None,
+                    "at": datetime.datetime.now().isoformat(timespec="milliseconds")}
+            with self.lock: self.calls.append(call)
+            if rec: rec["hits"] += 1
+        return result
+
+    def carry(self, fn):
+        # 把当前线程的 rerun / 缓存作用域带到工作线程，线程池里的后端调用也能归到这次 rerun
+        rerun, scope = getattr(self.local, "rerun", None), getattr(self.local, "cache_scope", None)
+
+        def run(*a, **kw):
+            self.local.rerun, self.local.cache_scope = rerun, scope
+            try: return fn(*a, **kw)
+            finally: self.local.rerun = self.local.cache_scope = None
+        return run
+
+    # -- 查询 --
+    def rerun_frame(self):
+        with self.lock: rows = list(self.reruns)
+        return pd.DataFrame(rows, columns=["id", "at", "user", "page", "seconds", "status", "calls", "call_seconds", "hits", "misses", "sections", "session"])
+
+    def call_frame(self):
+        with self.lock: rows = list(self.calls)
+        return pd.DataFrame(rows, columns=["rerun", "at", "table", "op", "rows", "bytes", "seconds", "cache", "error"])
+
+    def section_frame(self):
+        with self.lock: rows = [(r["page"], name, sec) for r in self.reruns for name, sec in r["sections"]]
+        return pd.DataFrame(rows, columns=["page", "section", "seconds"])
+
+    def export_jsonl(self):
+        with self.lock: reruns, calls = list(self.reruns), list(self.calls)
+        lines = [json.dumps(dict(r, kind="rerun"), ensure_ascii=False) for r in reruns]
+        lines += [json.dumps(dict(c, kind="call"), ensure_ascii=False) for c in calls]
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.reruns.clear()
+            self.calls.clear()
+
+
+class _TimedQuery:
+    # 透传查询构造器的链式调用，execute 时计时并记录
+    def __init__(self, backend, table_name, query, op="select"):
+        self.backend, self.table_name, self.query, self.op = backend, table_name, query, op
+
+    def __getattr__(self, name):
+        attr = getattr(self.query, name)
+        if not callable(attr): return attr
+
+        def chained(*a, **kw):
+            res = attr(*a, **kw)
+            if name in ("select", "insert", "upsert", "update", "delete"): self.op = name
+            if res is None or isinstance(res, (list, dict, str)): return res
+            self.query = res
+            return self
+        return chained
+
+    def execute(self):
+        t0 = time.perf_counter()
+        try:
+            res = self.query.execute()
+        except Exception as e:
+            self.backend.profiler.record_call(self.table_name, self.op, 0, 0, time.perf_counter() - t0, error=str(e)[:200])
+            raise
+        finally:
+            # 写入失败也通知：请求可能已在服务端生效
+            if self.op != "select":
+                for cb in self.backend.on_write: cb(self.table_name)
+        rows = res.data or []
+        self.backend.profiler.record_call(self.table_name, self.op, len(rows), estimate_bytes(rows), time.perf_counter() - t0)
+        return res
+
+
+class InstrumentedBackend(StorageBackend):
+    name = "instrumented"
+
+    def __init__(self, inner, profiler):
+        self.inner = inner
+        self.profiler = profiler
+        self.on_write = []  # cb(表名)：每次写请求结束后调用，如标记该表快照过期
+
+    def table(self, table_name):
+        return _TimedQuery(self, table_name, self.inner.table(table_name))
+
+    def __getattr__(self, name):
+        # sync() 等后端特有方法直接透传
+        return getattr(self.inner, name)
@@ -0,0 +1,151 @@
+# --- 读请求容错 ---
+# 只读请求是幂等的：每次调用限时，失败后按带抖动的指数退避重试；连续失败达到阈值后熔断一段时间，
+# 期间直接返回上一次成功读取的快照 (last-known-good) 并标记为陈旧，页面据此显示提示，尾延迟不再被慢后端拖住。
+# 写请求不经过这里，不做自动重试。后端明确拒绝的请求 (表 / 列不存在等，见 db.write_rejected) 重试也没用，
+# 也不说明后端不健康：直接抛给调用方，不计入熔断。
+# 超时的请求无法强行中止，会继续占着工作线程 (线上请求另有 HTTP 超时兜底，见 storage.open_backend)；
+# 这类被放弃的请求占满一半线程后，新请求不再排队等线程，直接按失败计入熔断，线程池不会被慢后端拖死。
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from db import write_rejected
+
+READ_TIMEOUT = 8.0       # 单次请求上限 (秒)
+READ_ATTEMPTS = 3
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 2.0
+BREAKER_THRESHOLD = 4    # 连续失败几次后熔断
+BREAKER_COOLDOWN = 20.0  # 熔断后多久放行一次试探请求
+
+
+class ReadUnavailable(Exception):
+    pass
+
+
+class CircuitOpen(ReadUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None: return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        # 半开状态只放行一个试探请求，其余请求继续走快照
+        with self.lock:
+            st = self.state
+            if st == "closed": return True
+            if st == "half-open" and not self.trial:
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures, self.opened_at, self.trial = 0, None, False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold: self.opened_at = time.monotonic()
+            self.trial = False
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # full jitter：[0, min(cap, base * 2^n)] 内均匀取值，避免多个会话同时重试
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class ResilientReader:
+    def __init__(self, timeout=READ_TIMEOUT, attempts=READ_ATTEMPTS, breaker=None, workers=8, carry=None, max_abandoned=None):
+        self.timeout = timeout
+        self.carry = carry  # carry(fn) → 在工作线程中还原调用方上下文的 fn (如剖析器)
+        self.attempts = attempts
+        self.breaker = breaker or CircuitBreaker()
+        self.workers = workers
+        self.max_abandoned = max_abandoned or max(1, workers // 2)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="read")
+        self.inflight = 0
+        self.abandoned = set()  # 已超时、仍在工作线程里跑的请求
+        self.last_good = {}  # key → (值, 读取时间)
+        self.stale = {}      # key → 最近一次失败原因
+        self.lock = threading.Lock()
+
+    def _submit(self, fn):
+        # 被放弃的请求过多时返回 None，不再排队
+        with self.lock:
+            if len(self.abandoned) >= self.max_abandoned: return None
+            self.inflight += 1
+        fut = self.pool.submit(self.carry(fn) if self.carry else fn)
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, fut):
+        with self.lock:
+            self.inflight -= 1
+            self.abandoned.discard(fut)
+
+    def _abandon(self, fut):
+        # 还在排队的直接取消；已在运行的记下来，跑完 (_done) 后移除
+        if fut.cancel(): return
+        with self.lock:
+            if not fut.done(): self.abandoned.add(fut)
+
+    def call(self, fn):
+        # 单次请求：限时 + 重试 + 熔断；全部失败时抛出 ReadUnavailable
+        last = None
+        for attempt in range(self.attempts):
+            if not self.breaker.allow(): raise CircuitOpen(f"后端熔断中 ({self.breaker.state})") from last
+            fut = self._submit(fn)
+            try:
+                if fut is None: raise ReadUnavailable(f"读线程被 {self.max_abandoned} 个超时请求占用")
+                res = fut.result(timeout=self.timeout)
+                self.breaker.success()
+                return res
+            except FutureTimeout:
+                self._abandon(fut)
+                last = TimeoutError(f"请求超过 {self.timeout:g} 秒")
+            except Exception as e:
+                if write_rejected(e): raise
+                last = e
+            self.breaker.failure()
+            if attempt + 1 < self.attempts: time.sleep(backoff(attempt))
+        raise ReadUnavailable(str(last)) from last
+
+    def read(self, key, fn, fallback=True):
+        # fn 内部可多次 call()；成功则刷新快照，失败则退回上一次成功的快照 (fallback=False 时记录后照常抛出，由调用方决定)
+        try:
+            value = fn()
+        except ReadUnavailable as e:
+            with self.lock:
+                self.stale[key] = str(e)
+                if fallback and key in self.last_good: return self.last_good[key][0]
+            raise
+        with self.lock:
+            self.last_good[key] = (value, time.time())
+            self.stale.pop(key, None)
+        return value
+
+    def last_known(self, key, default=None):
+        with self.lock: return self.last_good[key][0] if key in self.last_good else default
+
+    def pool_stats(self):
+        with self.lock: return {"workers": self.workers, "inflight": self.inflight, "abandoned": len(self.abandoned), "max_abandoned": self.max_abandoned}
+
+    def staleness(self):
+        # {key: (快照时间 或 None, 失败原因)}，None 表示从未成功读取过
+        with self.lock:
+            return {k: (self.last_good[k][1] if k in self.last_good else None, err) for k, err in self.stale.items()}
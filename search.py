@@ -0,0 +1,89 @@
+# --- 全文检索 (n-gram 倒排索引) ---
+# 中文不分词，直接按字 (单字 + 相邻两字) 建倒排表：查询取各 gram 倒排表的交集，再用子串匹配去掉假阳性，
+# 结果与 str.contains(查询, case=False, regex=False) 一致。
+# 每类文档 (任务 / 留言 / 待办) 按主键记录文本哈希，sync 时只对新增、改动、删除的行更新倒排表；表快照版本没变则直接跳过。
+import threading
+
+import pandas as pd
+
+from analytics import snapshot_version
+
+SEARCH_SOURCES = {  # 类别 → (主键列, 参与检索的文本列)
+    "tasks": ("id", ["title", "description"]),
+    "messages": ("id", ["content"]),
+    "daily_todos": ("id", ["content"]),
+}
+
+
+def _grams(text):
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _text(df, cols):
+    out = pd.Series("", index=df.index)
+    for c in cols:
+        if c in df.columns: out = out + "\n" + df[c].fillna("").astype(str)
+    return out.str.lower()
+
+
+class SearchIndex:
+    def __init__(self, sources=None):
+        self.sources = sources or SEARCH_SOURCES
+        self.postings = {}  # gram → {(类别, 主键)}
+        self.docs = {}      # (类别, 主键) → 小写文本
+        self.hashes = {k: pd.Series(dtype='uint64') for k in self.sources}
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def _add(self, doc, text):
+        self.docs[doc] = text
+        for g in _grams(text): self.postings.setdefault(g, set()).add(doc)
+
+    def _drop(self, doc):
+        text = self.docs.pop(doc, None)
+        if text is None: return
+        for g in _grams(text):
+            s = self.postings.get(g)
+            if s is not None:
+                s.discard(doc)
+                if not s: del self.postings[g]
+
+    def sync(self, kind, df):
+        # 返回本次更新的行数 (新增 + 改动 + 删除)
+        v = snapshot_version(df)
+        if self.versions.get(kind) == v: return 0
+        key, cols = self.sources[kind]
+        if df.empty: text = pd.Series(dtype=object)
+        else:
+            text = _text(df, cols)
+            text.index = df[key].to_numpy()
+            text = text[~text.index.duplicated(keep='last')]
+        new = pd.Series(pd.util.hash_pandas_object(text, index=False).to_numpy(), index=text.index, dtype='uint64')
+        with self.lock:
+            old = self.hashes[kind]
+            changed = new.index[new.ne(old.reindex(new.index)).to_numpy()]
+            removed = old.index.difference(new.index)
+            for i in removed.union(changed): self._drop((kind, i))
+            for i in changed: self._add((kind, i), text[i])
+            self.hashes[kind] = new
+            self.versions[kind] = v
+        return len(changed) + len(removed)
+
+    def search(self, query, kinds=None):
+        # 返回 {类别: [主键, ...]}，主键从大到小 (新的在前)；空查询返回 None 表示不过滤
+        q = (query or "").strip().lower()
+        if not q: return None
+        kinds = list(kinds or self.sources)
+        grams = [q[i:i + 2] for i in range(len(q) - 1)] or [q]
+        with self.lock:
+            lists = sorted((self.postings.get(g, set()) for g in set(grams)), key=len)
+            hits = set(lists[0]).intersection(*lists[1:]) if lists else set()
+            found = [d for d in hits if d[0] in kinds and q in self.docs[d]]
+        out = {k: [] for k in kinds}
+        for k, i in found: out[k].append(i)
+        return {k: sorted(ids, reverse=True) for k, ids in out.items()}
+
+    def stats(self):
+        with self.lock:
+            return {"docs": len(self.docs), "grams": len(self.postings),
+                    "kinds": {k: len(h) for k, h in self.hashes.items()}}
@@ -0,0 +1,180 @@
+# --- 跨进程共享缓存 ---
+# 多个 Streamlit 进程 (负载均衡后的副本) 共用一份表快照与派生结果：存放在一个 SQLite 文件里 (可放在 /dev/shm 走内存)，
+# 值为 pickle，按字节预算以最近最少使用淘汰。能改写缓存文件的人就能在读取它的进程里执行任意代码，所以缓存文件
+# 只放在当前用户独占的目录 (0700) 里：目录不存在时按 0700 创建，已存在但属主不对或他人可写时拒绝使用 (SharedCacheError)；
+# 各副本须以同一系统用户运行。派生结果的键含输入表的内容版本，版本不变即可直接复用；
+# 表快照的键只有表名，取用时由调用方按 attrs["read_at"] 判断是否仍新鲜 (见 changefeed.ChangeFeed.fresh)。
+# 同一个键同一时间只让一个进程去拉取 / 计算 (租约)，其余进程等它写入后直接取用，等不到再自己算。
+import hashlib
+import os
+import pickle
+import sqlite3
+import stat
+import threading
+import time
+import uuid
+
+SHARED_CACHE_BYTES = 512 * 2 ** 20
+LEASE_TTL = 30.0   # 租约最长持有时间 (秒)，持有者崩溃后自动过期
+LEASE_WAIT = 10.0  # 等别的进程算完的最长时间
+TOUCH_EVERY = 5.0  # 最近使用时间的更新间隔，避免每次读取都写库
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, size INTEGER, stored REAL, used REAL);
+CREATE INDEX IF NOT EXISTS ix_entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT, until REAL);
+"""
+
+
+class SharedCacheError(Exception):
+    pass
+
+
+def _check_owned(path, kind):
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode) or info.st_uid != os.getuid():
+        raise SharedCacheError(f"共享缓存{kind} {path} 不属于当前用户，拒绝使用")
+    return info
+
+
+def _private_dir(path):
+    # 不能直接放在 /dev/shm、/tmp 这类人人可写的目录下，要用其中的专用子目录 (如 /dev/shm/yanzu-cache)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"): return  # 非 POSIX 系统没有属主与权限位可查
+    info = _check_owned(path, "目录")
+    if info.st_mode & 0o022: raise SharedCacheError(f"共享缓存目录 {path} 他人可写，请改用专用子目录")
+    if info.st_mode & 0o077: os.chmod(path, 0o700)  # 只是他人可读：收紧即可
+
+
+def cache_key(*parts):
+    # 任意可 repr 的键 → 定长字符串
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+class SharedCache:
+    def __init__(self, path, max_bytes=SHARED_CACHE_BYTES, lease_ttl=LEASE_TTL, wait=LEASE_WAIT):
+        # path 为目录时在其中建 cache.db
+        if os.path.isdir(path) or not os.path.splitext(path)[1]: path = os.path.join(path, "cache.db")
+        _private_dir(os.path.dirname(os.path.abspath(path)))
+        if hasattr(os, "getuid"):
+            for f in (path, path + "-wal", path + "-shm"):
+                if os.path.lexists(f): _check_owned(f, "文件")
+        self.path, self.max_bytes, self.lease_ttl, self.wait = path, max_bytes, lease_ttl, wait
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.computed = self.waited = 0
+        self._con().executescript(_DDL)
+
+    def _con(self):
+        # 每个线程一个连接，自动提交；WAL 让读写互不阻塞
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+        return con
+
+    def _count(self, name):
+        with self.lock: setattr(self, name, getattr(self, name) + 1)
+
+    # -- 读写 --
+    def _load(self, key):
+        con = self._con()
+        row = con.execute("SELECT value, used FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None: return None
+        try: value = pickle.loads(row[0])
+        except Exception:
+            con.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        now = time.time()
+        if now - row[1] > TOUCH_EVERY: con.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        return value
+
+    def get(self, key, default=None):
+        value = self._load(key)
+        self._count("misses" if value is None else "hits")
+        return default if value is None else value
+
+    def put(self, key, value):
+        # 放不进去 (无法 pickle / 超过预算的四分之一) 时返回 False
+        try: blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception: return False
+        if len(blob) > self.max_bytes // 4: return False
+        now = time.time()
+        con = self._con()
+        con.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), now, now))
+        self._evict(con)
+        return True
+
+    def _evict(self, con):
+        total = con.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes: return
+        freed, drop = 0, []
+        for key, size in con.execute("SELECT key, size FROM entries ORDER BY used"):
+            drop.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes * 0.9: break
+        con.executemany("DELETE FROM entries WHERE key = ?", drop)
+
+    def delete(self, key):
+        self._con().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        con = self._con()
+        con.execute("DELETE FROM entries")
+        con.execute("DELETE FROM leases")
+        with self.lock: self.hits = self.misses = self.computed = self.waited = 0
+
+    # -- 租约 --
+    def _owner(self):
+        # 租约按线程持有：同一进程的不同会话也只让一个去算
+        return f"{self.owner}-{threading.get_ident()}"
+
+    def lease(self, key):
+        con = self._con()
+        now, owner = time.time(), self._owner()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute("SELECT owner, until FROM leases WHERE key = ?", (key,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                con.execute("COMMIT")
+                return False
+            con.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (key, owner, now + self.lease_ttl))
+            con.execute("COMMIT")
+            return True
+        except sqlite3.Error:
+            if con.in_transaction: con.execute("ROLLBACK")
+            return False
+
+    def release(self, key):
+        self._con().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self._owner()))
+
+    def get_or_compute(self, key, fn, fresh=None):
+        # fresh(value) 为 False 的缓存值视为不存在；拿不到租约时等别的进程写入，超时再自己算
+        ok = fresh or (lambda value: True)
+        value = self.get(key)
+        if value is not None and ok(value): return value
+        end = time.monotonic() + self.wait
+        while not self.lease(key):
+            time.sleep(0.05)
+            value = self._load(key)
+            if value is not None and ok(value):
+                self._count("waited")
+                self._count("hits")
+                return value
+            if time.monotonic() > end: break
+        try:
+            value = fn()
+            self._count("computed")
+            self.put(key, value)
+            return value
+        finally:
+            self.release(key)
+
+    def stats(self):
+        count, size = self._con().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self.lock:
+            return {"path": self.path, "entries": count, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "computed": self.computed, "waited": self.waited}
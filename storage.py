@@ -0,0 +1,328 @@
+# --- 存储后端 ---
+# 页面只依赖 PostgREST 风格的查询构造器：backend.table(名).select/insert/update/delete/upsert
+# + eq/neq/gt/gte/lt/lte/in_/is_/like/ilike + order/limit/range + execute() → (.data, .count)。
+# SupabaseBackend 直连线上；SQLiteBackend 在本地文件/内存中模拟同样的语义，用于离线运行、压测与性能分析；
+# ReplicaBackend 读本地副本、写线上主库 (写入结果同步回副本)。
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+from db import TABLE_KEYS, TABLE_SCHEMAS, StorageError, bulk_delete, bulk_upsert, iter_pages
+
+BOOL_COLUMNS = {'is_rnd', 'is_completed', 'is_emergency'}
+_COLUMN_TYPES = {
+    'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+    'battlefield_id': 'INTEGER', 'campaign_id': 'INTEGER', 'order_index': 'INTEGER',
+    'difficulty': 'REAL', 'std_time': 'REAL', 'quality': 'REAL', 'amount': 'REAL',
+    'gross': 'REAL', 'fines': 'REAL', 'rewards': 'REAL', 'net': 'REAL',
+    'is_rnd': 'BOOLEAN DEFAULT 0', 'is_completed': 'BOOLEAN DEFAULT 0', 'is_emergency': 'BOOLEAN DEFAULT 0',
+    'created_at': "TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))",
+}
+
+
+class StorageBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    def table(self, table_name):
+        """返回表名对应的查询构造器 (见文件头)"""
+
+
+class SupabaseBackend(StorageBackend):
+    name = "supabase"
+
+    def __init__(self, client):
+        self.client = client
+
+    def table(self, table_name):
+        return self.client.table(table_name)
+
+
+class Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _q(col):
+    return f'"{col}"'
+
+
+def _to_bool(v):
+    if v is None or isinstance(v, bool): return v
+    return str(v).strip().lower() in ('true', 't', '1', 'yes')
+
+
+class SQLiteQuery:
+    def __init__(self, backend, table_name):
+        self.backend = backend
+        self.table_name = table_name
+        self.op = "select"
+        self.columns = "*"
+        self.count_mode = None
+        self.payload = None
+        self.on_conflict = None
+        self.where = []
+        self.params = []
+        self.orders = []
+        self.limit_n = None
+        self.offset_n = None
+        self.refs = []
+
+    # -- 操作 --
+    def select(self, columns="*", count=None):
+        self.op, self.columns, self.count_mode = "select", columns, count
+        return self
+
+    def insert(self, rows, **kw):
+        self.op, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict=None, **kw):
+        self.op, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict or TABLE_KEYS.get(self.table_name, 'id')
+        self.refs.append(self.on_conflict)
+        return self
+
+    def update(self, values, **kw):
+        self.op, self.payload = "update", values
+        return self
+
+    def delete(self, **kw):
+        self.op = "delete"
+        return self
+
+    # -- 过滤 --
+    def _filter(self, sql, *params):
+        self.where.append(sql)
+        self.params.extend(params)
+        return self
+
+    def _col(self, col):
+        # 记下引用的列，执行前统一核对：SQLite 会把双引号里的未知列名当成字符串字面量，静默匹配不到
+        self.refs.append(col)
+        return _q(col)
+
+    def eq(self, col, v): return self._filter(f'{self._col(col)} = ?', self.backend.encode(col, v))
+    def neq(self, col, v): return self._filter(f'{self._col(col)} <> ?', self.backend.encode(col, v))
+    def gt(self, col, v): return self._filter(f'{self._col(col)} > ?', self.backend.encode(col, v))
+    def gte(self, col, v): return self._filter(f'{self._col(col)} >= ?', self.backend.encode(col, v))
+    def lt(self, col, v): return self._filter(f'{self._col(col)} < ?', self.backend.encode(col, v))
+    def lte(self, col, v): return self._filter(f'{self._col(col)} <= ?', self.backend.encode(col, v))
+    def like(self, col, pattern): return self._filter(f'{self._col(col)} LIKE ?', pattern.replace('*', '%'))
+    def ilike(self, col, pattern): return self._filter(f'lower({self._col(col)}) LIKE lower(?)', pattern.replace('*', '%'))
+
+    def in_(self, col, values):
+        values = list(values)
+        c = self._col(col)
+        if not values: return self._filter("0")
+        return self._filter(f'{c} IN ({", ".join("?" * len(values))})', *[self.backend.encode(col, v) for v in values])
+
+    def is_(self, col, v):
+        c = self._col(col)
+        if v in (None, 'null'): return self._filter(f'{c} IS NULL')
+        return self._filter(f'{c} IS ?', 1 if _to_bool(v) else 0)
+
+    # -- 排序与分页 --
+    def order(self, col, desc=False, nullsfirst=None):
+        # PostgREST 默认：升序 NULL 在后、降序 NULL 在前
+        nulls_first = desc if nullsfirst is None else nullsfirst
+        c = self._col(col)
+        self.orders.append(f'({c} IS NULL) {"DESC" if nulls_first else "ASC"}, {c} {"DESC" if desc else "ASC"}')
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.offset_n, self.limit_n = start, end - start + 1
+        return self
+
+    def _where_sql(self):
+        return f" WHERE {' AND '.join(self.where)}" if self.where else ""
+
+    def _select_list(self):
+        return [] if self.columns.strip() == "*" else [c.strip() for c in self.columns.split(",")]
+
+    def _select_cols(self):
+        return ", ".join(map(_q, self._select_list())) or "*"
+
+    def execute(self):
+        return self.backend.run(self)
+
+
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.con.row_factory = sqlite3.Row
+        self.con.execute("PRAGMA case_sensitive_like = ON")  # 与 PostgreSQL 一致：like 区分大小写，ilike 不区分
+        self.lock = threading.RLock()
+        self.listeners = []  # listener(表, op, 行)：本连接写入提交后调用，见 changefeed.LocalFeed
+        with self.lock:
+            for t, cols in TABLE_SCHEMAS.items():
+                defs = [f'"{c}" {"TEXT PRIMARY KEY" if c == TABLE_KEYS[t] and c != "id" else _COLUMN_TYPES.get(c, "TEXT")}' for c in cols]
+                self.con.execute(f'CREATE TABLE IF NOT EXISTS "{t}" ({", ".join(defs)})')
+            self.con.commit()
+
+    def table(self, table_name):
+        if table_name not in TABLE_SCHEMAS: raise StorageError(f'relation "{table_name}" does not exist')
+        return SQLiteQuery(self, table_name)
+
+    @staticmethod
+    def encode(col, v):
+        if col in BOOL_COLUMNS: return None if v is None else int(_to_bool(v))
+        if isinstance(v, bool): return int(v)
+        return v
+
+    @staticmethod
+    def decode(row):
+        return {k: (bool(v) if k in BOOL_COLUMNS and v is not None else v) for k, v in dict(row).items()}
+
+    def _check_columns(self, q, cols):
+        unknown = [c for c in cols if c not in TABLE_SCHEMAS[q.table_name]]
+        if unknown: raise StorageError(f"Could not find the '{unknown[0]}' column of '{q.table_name}'")
+
+    def _changed(self, q, data):
+        if data:
+            for listener in self.listeners: listener(q.table_name, q.op, data)
+        return Result(data)
+
+    def run(self, q):
+        t = f'"{q.table_name}"'
+        with self.lock:
+            try:
+                self._check_columns(q, q.refs + (q._select_list() if q.op == "select" else []))
+                if q.op == "select":
+                    sql = f"SELECT {q._select_cols()} FROM {t}{q._where_sql()}"
+                    if q.orders: sql += " ORDER BY " + ", ".join(q.orders)
+                    if q.limit_n is not None: sql += f" LIMIT {int(q.limit_n)}"
+                    if q.offset_n: sql += f" OFFSET {int(q.offset_n)}"
+                    data = [self.decode(r) for r in self.con.execute(sql, q.params)]
+                    count = None
+                    if q.count_mode: count = self.con.execute(f"SELECT COUNT(*) FROM {t}{q._where_sql()}", q.params).fetchone()[0]
+                    return Result(data, count)
+
+                if q.op in ("insert", "upsert"):
+                    data = []
+                    for row in q.payload:
+                        cols = list(row)
+                        self._check_columns(q, cols)
+                        sql = f"INSERT INTO {t} ({', '.join(map(_q, cols))}) VALUES ({', '.join('?' * len(cols))})"
+                        if q.op == "upsert":
+                            sets = [c for c in cols if c != q.on_conflict]
+                            sql += f" ON CONFLICT({_q(q.on_conflict)}) DO " + ("UPDATE SET " + ", ".join(f"{_q(c)} = excluded.{_q(c)}" for c in sets) if sets else "NOTHING")
+                        data += [self.decode(r) for r in self.con.execute(sql + " RETURNING *", [self.encode(c, row[c]) for c in cols])]
+                    self.con.commit()
+                    return self._changed(q, data)
+
+                if q.op == "update":
+                    cols = list(q.payload)
+                    self._check_columns(q, cols)
+                    sql = f"UPDATE {t} SET {', '.join(f'{_q(c)} = ?' for c in cols)}{q._where_sql()} RETURNING *"
+                    data = [self.decode(r) for r in self.con.execute(sql, [self.encode(c, q.payload[c]) for c in cols] + q.params)]
+                    self.con.commit()
+                    return self._changed(q, data)
+
+                if q.op == "delete":
+                    data = [self.decode(r) for r in self.con.execute(f"DELETE FROM {t}{q._where_sql()} RETURNING *", q.params)]
+                    self.con.commit()
+                    return self._changed(q, data)
+            except StorageError:
+                self.con.rollback()  # 多行写入中途遇到未知列：前面已执行的行一并撤销
+                raise
+            except sqlite3.Error as e:
+                self.con.rollback()
+                raise StorageError(str(e)) from e
+        raise StorageError(f"unsupported operation: {q.op}")
+
+
+class _RoutedTable:
+    # 读走副本；写走主库，成功后把返回的行同步进副本，保证本会话随后的读取能看到自己的写入
+    def __init__(self, backend, table_name):
+        self.backend = backend
+        self.table_name = table_name
+
+    def select(self, *a, **kw):
+        return self.backend.replica.table(self.table_name).select(*a, **kw)
+
+    def _write(self, op, *a, **kw):
+        return _WriteThrough(self.backend, self.table_name, getattr(self.backend.primary.table(self.table_name), op)(*a, **kw), op)
+
+    def insert(self, *a, **kw): return self._write("insert", *a, **kw)
+    def upsert(self, *a, **kw): return self._write("upsert", *a, **kw)
+    def update(self, *a, **kw): return self._write("update", *a, **kw)
+    def delete(self, *a, **kw): return self._write("delete", *a, **kw)
+
+
+class _WriteThrough:
+    def __init__(self, backend, table_name, query, op):
+        self.backend, self.table_name, self.query, self.op = backend, table_name, query, op
+
+    def __getattr__(self, name):
+        attr = getattr(self.query, name)
+        if not callable(attr): return attr
+
+        def chained(*a, **kw):
+            self.query = attr(*a, **kw)
+            return self
+        return chained
+
+    def execute(self):
+        res = self.query.execute()
+        rows = res.data or []
+        if rows:
+            key = TABLE_KEYS.get(self.table_name, 'id')
+            if self.op == "delete": bulk_delete(self.backend.replica, self.table_name, [r[key] for r in rows])
+            else: bulk_upsert(self.backend.replica, self.table_name, rows)
+        return res
+
+
+class ReplicaBackend(StorageBackend):
+    name = "replica"
+
+    def __init__(self, primary, replica):
+        self.primary = primary
+        self.replica = replica
+
+    def table(self, table_name):
+        return _RoutedTable(self, table_name)
+
+    def sync(self, tables=None, on_progress=None):
+        # 全量拉取主库到副本，并清理副本中多余的行
+        return sync_tables(self.primary, self.replica, tables, on_progress)
+
+
+def sync_tables(source, target, tables=None, on_progress=None):
+    counts = {}
+    for t in tables or list(TABLE_SCHEMAS):
+        key = TABLE_KEYS.get(t, 'id')
+        seen = set()
+        n = 0
+        for rows in iter_pages(source, t):
+            bulk_upsert(target, t, rows)
+            seen.update(str(r[key]) for r in rows)
+            n += len(rows)
+            if on_progress: on_progress(t, n)
+        stale = [r[key] for rows in iter_pages(target, t, key=key, columns=key) for r in rows if str(r[key]) not in seen]
+        bulk_delete(target, t, stale)
+        counts[t] = n
+    return counts
+
+
+def open_backend(spec="", supabase_conf=None, timeout=None):
+    # spec: "" / "supabase" → 线上；"sqlite:///本地.db" (或 "sqlite://" 内存库) → 本地；
+    # "replica+sqlite:///副本.db" → 读本地副本、写线上。timeout 为线上 HTTP 请求超时 (秒)
+    spec = (spec or "").strip()
+    if spec.startswith("sqlite://"):
+        return SQLiteBackend(spec[len("sqlite://"):].removeprefix("/") or ":memory:")
+    from supabase import create_client
+    from supabase.lib.client_options import ClientOptions
+    options = ClientOptions(postgrest_client_timeout=timeout) if timeout else None
+    primary = SupabaseBackend(create_client(supabase_conf["url"], supabase_conf["key"], options=options))
+    if spec.startswith("replica+sqlite://"):
+        return ReplicaBackend(primary, open_backend(spec[len("replica+"):]))
+    return primary
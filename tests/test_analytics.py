@@ -0,0 +1,101 @@
+# SQL 分析镜像 (AnalyticsMirror) 与 metrics.py 中 pandas 参考实现的一致性
+import pandas as pd
+import pytest
+
+from analytics import AnalyticsMirror, check_equivalence
+from datagen import generate
+from metrics import calculate_net_yvp, period_stats
+
+
+def _mirror(users, tasks, pens, rews):
+    mirror = AnalyticsMirror()
+    mirror.sync({'users': users, 'tasks': tasks, 'penalties': pens, 'rewards': rews})
+    return mirror
+
+
+def _assert_same(users, tasks, pens, rews, start, end):
+    diff = check_equivalence(_mirror(users, tasks, pens, rews), users, tasks, pens, rews, start, end)
+    assert diff.empty, diff.to_string()
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_datagen_matches_reference(seed):
+    f = generate(scale=3000, seed=seed)
+    now = pd.Timestamp.now()
+    _assert_same(f['users'], f['tasks'], f['penalties'], f['rewards'], (now - pd.Timedelta(days=30)).date(), now.date())
+
+
+def _day(days_ago, fmt='%Y-%m-%d'):
+    return (pd.Timestamp.now().normalize() - pd.Timedelta(days=days_ago)).strftime(fmt)
+
+
+def _task(i, who, completed_at, is_rnd=False, status='完成', difficulty=1.0, std_time=2.0, quality=1.0):
+    return {'id': i, 'assignee': who, 'status': status, 'is_rnd': is_rnd, 'difficulty': difficulty,
+            'std_time': std_time, 'quality': quality, 'completed_at': completed_at}
+
+
+@pytest.fixture
+def edge_frames():
+    users = pd.DataFrame({'username': ['admin', 'a', 'b', 'idle'], 'role': ['admin', 'member', 'member', 'member']})
+    tasks = pd.DataFrame([
+        _task(1, 'a', _day(2)),
+        _task(2, 'a', _day(3), is_rnd=True, difficulty=3.0),   # 研发任务产值记 0
+        _task(3, 'a', _day(5), is_rnd=None),                   # is_rnd 缺失按非研发
+        _task(4, 'a', _day(20)),
+        _task(5, 'a', None),                                   # 未写完成时间
+        _task(6, 'a', _day(1), status='进行中'),                # 未完成不计
+        _task(7, 'b', _day(40)),
+        _task(8, 'b', _day(4), difficulty='', quality=None),   # 无法解析的数值按 0
+        _task(9, 'b', _day(6), std_time='1.5'),
+    ])
+    pens = pd.DataFrame({'id': [1, 2, 3, 4], 'username': ['a', 'a', 'b', 'b'],
+                         'occurred_at': [_day(1), _day(15), _day(38), None]})  # 窗口内 / 窗口外 / 回看期外 / 缺失
+    rews = pd.DataFrame({'id': [1, 2, 3], 'username': ['a', 'b', 'b'], 'amount': [5.0, '2.5', None],
+                         'created_at': [_day(3), _day(60), _day(2)]})
+    return users, tasks, pens, rews
+
+
+def test_edge_cases_match_reference(edge_frames):
+    users, tasks, pens, rews = edge_frames
+    _assert_same(users, tasks, pens, rews, _day(30), _day(0))
+    _assert_same(users, tasks, pens, rews, _day(10), _day(3))
+
+
+def test_penalty_window(edge_frames):
+    users, tasks, pens, rews = edge_frames
+    mirror = _mirror(users, tasks, pens, rews)
+    # a：1 天前的罚款覆盖此前 7 天内完成的任务 1、3 (任务 2 为研发)，15 天前的罚款覆盖任务 4；
+    # 任务 5 没有完成时间，不落在任何罚款窗口里，但不限时间的总产出照算
+    fine = (2.0 + 2.0) * 0.2 + 2.0 * 0.2
+    assert mirror.net_yvp('a') == pytest.approx(2.0 * 4 + 5.0 - fine)
+    # 回看 7 天：15 天前的罚款与 20 天前的任务都不计，任务 5 没有完成时间也被排除
+    assert mirror.net_yvp('a', 7) == pytest.approx(2.0 * 2 + 5.0 - (2.0 + 2.0) * 0.2)
+    assert mirror.net_yvp('a') == pytest.approx(calculate_net_yvp('a', tasks, pens, rews))
+    assert mirror.net_yvp('a', 7) == pytest.approx(calculate_net_yvp('a', tasks, pens, rews, 7))
+
+
+def test_members_without_rows(edge_frames):
+    users, tasks, pens, rews = edge_frames
+    mirror = _mirror(users, tasks, pens, rews)
+    assert mirror.net_yvp('idle') == 0.0 == calculate_net_yvp('idle', tasks, pens, rews)
+    stats = mirror.period_stats(_day(30), _day(0)).set_index("成员")
+    assert stats.loc['idle', "💰 应发YVP"] == 0.0
+    assert 'admin' not in stats.index
+
+
+def test_mixed_and_missing_timestamps():
+    users = pd.DataFrame({'username': ['a'], 'role': ['member']})
+    tasks = pd.DataFrame([_task(1, 'a', _day(1, '%Y-%m-%dT%H:%M:%S.%f')), _task(2, 'a', _day(2)),
+                          _task(3, 'a', 'not a date'), _task(4, 'a', float('nan'))])
+    pens = pd.DataFrame({'id': [1], 'username': ['a'], 'occurred_at': ['garbage']})
+    rews = pd.DataFrame({'id': [1, 2], 'username': ['a', 'a'], 'amount': [1.0, 1.0], 'created_at': [_day(1), None]})
+    _assert_same(users, tasks, pens, rews, _day(7), _day(0))
+
+
+def test_empty_tables():
+    users = pd.DataFrame({'username': ['a'], 'role': ['member']})
+    tasks = pd.DataFrame(columns=['id', 'assignee', 'status', 'is_rnd', 'difficulty', 'std_time', 'quality', 'completed_at'])
+    pens = pd.DataFrame(columns=['id', 'username', 'occurred_at'])
+    rews = pd.DataFrame(columns=['id', 'username', 'amount', 'created_at'])
+    _assert_same(users, tasks, pens, rews, _day(7), _day(0))
+    assert period_stats(users, tasks, rews, _day(7), _day(0))["💰 应发YVP"].tolist() == [0.0]
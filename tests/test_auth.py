@@ -0,0 +1,47 @@
+import pytest
+
+from auth import AuthConfigError, MIN_SECRET_LEN, _b64, _sign, issue_token, load_secret, verify_token
+
+SECRET = b"s" * MIN_SECRET_LEN
+NOW = 1_800_000_000
+
+
+def test_round_trip():
+    tok = issue_token(SECRET, "成员001", "member", now=NOW)
+    assert verify_token(SECRET, tok, now=NOW + 60) == ("成员001", "member")
+
+
+def test_expired():
+    tok = issue_token(SECRET, "a", "member", ttl_days=1, now=NOW)
+    assert verify_token(SECRET, tok, now=NOW + 86400 - 1) == ("a", "member")
+    assert verify_token(SECRET, tok, now=NOW + 86400 + 1) is None
+
+
+def test_tampered():
+    tok = issue_token(SECRET, "a", "member", now=NOW)
+    payload, sig = tok.split(".")
+    forged = _b64(b'{"u":"a","r":"admin","exp":9999999999}')
+    assert verify_token(SECRET, f"{forged}.{sig}", now=NOW) is None
+    assert verify_token(SECRET, f"{payload}.{sig[:-1]}{'A' if sig[-1] != 'A' else 'B'}", now=NOW) is None
+    assert verify_token(b"t" * MIN_SECRET_LEN, tok, now=NOW) is None
+
+
+@pytest.mark.parametrize("token", [None, "", "abc", "a.b.c", ".", "abc.", 42, "abc.é", "é.abc", "令牌.签名", "abc.\x00"])
+def test_malformed_and_non_ascii(token):
+    assert verify_token(SECRET, token, now=NOW) is None
+
+
+@pytest.mark.parametrize("payload", [b"not json", b"[1, 2]", b'{"u":"a","r":"admin","exp":"soon"}', b'{"u":"a","exp":null}'])
+def test_signed_garbage(payload):
+    # 签名正确但内容不合法 (只有持有密钥才造得出，也不应抛异常)
+    p = _b64(payload)
+    assert verify_token(SECRET, f"{p}.{_sign(SECRET, p)}", now=NOW) is None
+
+
+def test_load_secret(monkeypatch):
+    monkeypatch.delenv("YANZU_AUTH_SECRET", raising=False)
+    with pytest.raises(AuthConfigError): load_secret(None)
+    with pytest.raises(AuthConfigError): load_secret({"auth": {"secret": "short"}})
+    assert load_secret({"auth": {"secret": "x" * MIN_SECRET_LEN}}) == b"x" * MIN_SECRET_LEN
+    monkeypatch.setenv("YANZU_AUTH_SECRET", "y" * MIN_SECRET_LEN)
+    assert load_secret({"auth": {"secret": "x" * MIN_SECRET_LEN}}) == b"y" * MIN_SECRET_LEN
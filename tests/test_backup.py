@@ -0,0 +1,134 @@
+import gzip
+import io
+import zipfile
+
+import pytest
+
+import datagen
+from backup import (BACKUP_TABLES, BackupError, SnapshotStore, build_diff_backup, build_full_backup, restore_archive,
+                    restore_chain)
+from db import TABLE_KEYS
+from storage import SQLiteBackend
+
+
+def dump(db):
+    out = {}
+    for t in BACKUP_TABLES:
+        key = TABLE_KEYS[t]
+        out[t] = sorted(db.table(t).select("*").execute().data, key=lambda r: r[key])
+    return out
+
+
+@pytest.fixture
+def source():
+    db = SQLiteBackend(":memory:")
+    datagen.load_into(db, datagen.generate(300, 0))
+    # 容易在编码中走样的值：NULL 与空串、换行、逗号、引号、反斜杠
+    db.table("messages").insert([{"id": 90001, "username": "a", "content": None, "created_at": None},
+                                 {"id": 90002, "username": "a", "content": "", "created_at": "2026-10-19T08:00:00"},
+                                 {"id": 90003, "username": "a", "content": '多行\n"引号", 逗号 \\N 反斜杠', "created_at": "2026-10-19"}]).execute()
+    return db
+
+
+def full(db):
+    buf = io.BytesIO()
+    build_full_backup(db, buf)
+    buf.seek(0)
+    return buf
+
+
+def mutate(db, tag):
+    ids = [r['id'] for r in db.table("tasks").select("id").order("id").limit(3).execute().data]
+    db.table("tasks").update({"title": f"改-{tag}", "description": None}).eq("id", ids[0]).execute()
+    db.table("tasks").delete().eq("id", ids[1]).execute()
+    db.table("tasks").insert({"title": f"新-{tag}", "status": "待领取", "type": "公共任务池", "assignee": "待定"}).execute()
+    db.table("rewards").delete().in_("id", [r['id'] for r in db.table("rewards").select("id").limit(2).execute().data]).execute()
+    db.table("users").upsert({"username": f"新人{tag}", "password": "1", "role": "member"}).execute()
+
+
+def test_full_round_trip(source):
+    target = SQLiteBackend(":memory:")
+    manifest, report = restore_archive(target, full(source))
+    assert dump(target) == dump(source)
+    assert all(r["校验和"] == "✅" and r["行数核对"] == "✅" for r in report)
+    assert {r["表"]: r["备份行数"] for r in report}["messages"] == len(dump(source)["messages"])
+
+
+def test_restore_into_non_empty_db(source):
+    archive = full(source)
+    target = SQLiteBackend(":memory:")
+    datagen.load_into(target, datagen.generate(200, 1))  # 另一份数据：主键部分重叠、内容不同
+    target.table("tasks").insert({"id": 999999, "title": "多出来的"}).execute()
+    _, report = restore_archive(target, archive)
+    assert dump(target) == dump(source)
+    assert {r["表"]: r["清理旧行"] for r in report}["tasks"] >= 1
+
+
+def test_diff_chain_and_point_in_time(source, tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    states, ids = [], []
+    for i in range(3):  # 三个快照在同一秒内生成：按毫秒时间戳也要排对父子关系
+        if i: mutate(source, i)
+        m = store.snapshot(source)
+        states.append(dump(source)); ids.append(m['snapshot_id'])
+        assert m['kind'] == ("full" if i == 0 else "diff")
+    assert [m['snapshot_id'] for m in store.chain(ids[2])] == ids
+    # 差异包只含变化的行
+    diff = store.manifests()[1]['tables']
+    assert diff['tasks']['rows'] == 2 and diff['tasks']['deleted'] == 1 and diff['messages']['rows'] == 0
+
+    for i in (0, 1, 2):
+        target = SQLiteBackend(":memory:")
+        datagen.load_into(target, datagen.generate(100, 2))
+        manifest, report = store.restore(target, ids[i])
+        assert manifest['snapshot_id'] == ids[i]
+        assert dump(target) == states[i], f"恢复到快照 {i} 后内容不一致"
+        assert all(r["校验和"] == "✅" for r in report)
+
+
+def test_diff_of_in_memory_archives(source):
+    base = full(source)
+    mutate(source, "x")
+    buf = io.BytesIO()
+    build_diff_backup(source, buf, base)
+    base.seek(0); buf.seek(0)
+    target = SQLiteBackend(":memory:")
+    restore_chain(target, [base, buf])
+    assert dump(target) == dump(source)
+
+
+def _tamper(archive, member, fn):
+    out = io.BytesIO()
+    with zipfile.ZipFile(archive) as src, zipfile.ZipFile(out, 'w') as dst:
+        for info in src.infolist():
+            data = src.read(info.filename)
+            dst.writestr(info, fn(data) if info.filename == member else data)
+    out.seek(0)
+    return out
+
+
+def test_checksum_mismatch_leaves_target_untouched(source):
+    archive = full(source)
+    bad = _tamper(archive, "tasks.csv.gz", lambda b: gzip.compress(gzip.decompress(b).replace("待领取".encode(), "已篡改".encode(), 1)))
+    target = SQLiteBackend(":memory:")
+    datagen.load_into(target, datagen.generate(100, 3))
+    before = dump(target)
+    with pytest.raises(BackupError, match="校验"):
+        restore_archive(target, bad)
+    assert dump(target) == before
+
+    truncated = _tamper(full(source), "users.csv.gz", lambda b: b[:len(b) // 2])
+    with pytest.raises(BackupError):
+        restore_archive(target, truncated)
+    assert dump(target) == before
+
+
+def test_broken_chain_rejected(source):
+    a = full(source)
+    mutate(source, "y")
+    b = io.BytesIO(); build_diff_backup(source, b, a); b.seek(0)
+    other = full(source)
+    with pytest.raises(BackupError, match="全量"):
+        restore_chain(SQLiteBackend(":memory:"), [b])
+    with pytest.raises(BackupError, match="断裂"):
+        restore_chain(SQLiteBackend(":memory:"), [other, b])
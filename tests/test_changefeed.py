@@ -0,0 +1,106 @@
+import sqlite3
+import time
+
+import pytest
+
+from changefeed import ChangeFeed, LocalFeed, RealtimeFeed, open_feed
+from storage import ReplicaBackend, SQLiteBackend, SupabaseBackend
+
+TABLES = ["tasks", "daily_todos"]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "feed.db")
+
+
+def test_open_feed_selection(path):
+    local = SQLiteBackend(path)
+    assert open_feed("off", local, TABLES) is None
+    assert isinstance(open_feed("auto", local, TABLES), LocalFeed)
+    assert isinstance(open_feed(None, local, TABLES), LocalFeed)
+    # 只读副本：读走本地 SQLite，按副本文件轮询
+    feed = open_feed("auto", ReplicaBackend(SupabaseBackend(None), local), TABLES)
+    assert isinstance(feed, LocalFeed) and feed.path == path
+    assert isinstance(open_feed("auto", SupabaseBackend(None), TABLES, {"url": "", "key": ""}), RealtimeFeed)
+    assert isinstance(open_feed(" Realtime ", local, TABLES), RealtimeFeed)
+
+
+def test_no_read_time_is_stale():
+    feed = ChangeFeed(TABLES)
+    assert not feed.fresh("tasks", None)
+
+
+def test_poll_ttl_without_feed():
+    feed = ChangeFeed(TABLES, poll_ttl=0.2)
+    now = time.time()
+    assert feed.fresh("tasks", now) and not feed.fresh("tasks", now - 0.3)
+    feed.touch("tasks")
+    assert not feed.fresh("tasks", now) and feed.fresh("daily_todos", now)
+
+
+def test_local_feed_invalidation(path):
+    backend = SQLiteBackend(path)
+    feed = open_feed("auto", backend, TABLES, None)
+    feed.interval = 0.05
+    feed.attach(backend)
+    feed.attach(backend)
+    assert len(backend.listeners) == 1
+    feed.start()
+    feed.poll_ttl = 0.1
+
+    read_at = time.time()
+    time.sleep(0.15)
+    assert feed.fresh("tasks", read_at)  # 推送可用时不受 poll_ttl 限制
+    backend.table("daily_todos").insert({"username": "a", "content": "x"}).execute()
+    assert not feed.fresh("daily_todos", read_at) and feed.fresh("tasks", read_at)
+
+    # 其他连接的写入：轮询 data_version 发现，不知道哪张表，全部失效
+    read_at = time.time()
+    time.sleep(0.01)
+    con = sqlite3.connect(path)
+    con.execute("INSERT INTO tasks (title) VALUES ('外部')")
+    con.commit()
+    deadline = time.monotonic() + 2
+    while feed.fresh("tasks", read_at) and time.monotonic() < deadline: time.sleep(0.02)
+    assert not feed.fresh("tasks", read_at) and not feed.fresh("daily_todos", read_at)
+
+
+def _event(table):
+    return {"data": {"table": table, "type": "UPDATE", "record": {"id": 1}}}
+
+
+def test_realtime_trusts_only_confirmed_tables():
+    feed = RealtimeFeed({}, TABLES, poll_ttl=0.2, probe_wait=0.1)
+    feed._on_state("SUBSCRIBED")
+    time.sleep(0.01)
+    read_at = time.time()
+    time.sleep(0.3)
+    # 频道已订阅，但还没收到过任何事件：按轮询，过了 poll_ttl 即过期
+    assert not feed.fresh("tasks", read_at)
+    assert feed.status()["polling"] == TABLES
+
+    feed._on_change(_event("tasks"))
+    read_at = time.time()
+    time.sleep(0.3)
+    assert feed.fresh("tasks", read_at) and not feed.fresh("daily_todos", read_at)
+    feed._on_change(_event("tasks"))
+    assert not feed.fresh("tasks", read_at)
+
+
+def test_realtime_detects_missing_publication():
+    feed = RealtimeFeed({}, TABLES, poll_ttl=0.2, probe_wait=0.1)
+    feed._on_state("SUBSCRIBED")
+    feed._on_change(_event("tasks"))
+    time.sleep(0.05)
+    feed.touch("tasks")  # 本进程写入，推送事件迟迟不来
+    time.sleep(0.15)
+    read_at = time.time()
+    assert feed.status()["missing"] == ["tasks"]
+    time.sleep(0.3)
+    assert not feed.fresh("tasks", read_at)
+
+    feed._on_change(_event("tasks"))  # 事件到达，恢复信任
+    read_at = time.time()
+    time.sleep(0.3)
+    assert feed.fresh("tasks", read_at) and feed.status()["missing"] == []
@@ -0,0 +1,95 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from db import bulk_insert, write_rejected
+from importers import build_like_rewards, build_task_import, like_reward_records, task_import_records
+from storage import SQLiteBackend, StorageError
+
+
+@pytest.fixture
+def backend():
+    b = SQLiteBackend(":memory:")
+    b.table("campaigns").insert({"id": 1, "title": "春季战役"}).execute()
+    b.table("battlefields").insert({"id": 10, "title": "主阵地", "campaign_id": 1}).execute()
+    return b
+
+
+def _frames(b):
+    return tuple(pd.DataFrame(b.table(t).select("*").execute().data) for t in ("campaigns", "battlefields", "tasks"))
+
+
+def _raw(rows):
+    return pd.DataFrame(rows, columns=["任务标题", "战役", "战场", "执行人", "截止日期"])
+
+
+def test_reimport_skips_existing(backend):
+    raw = _raw([["剪辑", "春季战役", "主阵地", "a, b", "2026-10-20"], ["文案", "春季战役", "主阵地", "", ""]])
+    camps, batts, tasks = _frames(backend)
+    plan, bad = build_task_import(raw, camps, batts, ["a", "b"], tasks)
+    recs, _ = task_import_records(plan)
+    assert len(recs) == 3 and bad.empty
+    bulk_insert(backend, "tasks", recs)
+
+    camps, batts, tasks = _frames(backend)
+    plan, bad = build_task_import(raw, camps, batts, ["a", "b"], tasks)
+    assert plan.empty
+    assert bad['错误'].tolist() == ["任务已存在"] * 3
+
+
+def test_duplicate_rows_in_file(backend):
+    raw = _raw([["剪辑", "春季战役", "主阵地", "a", "2026-10-20"], ["剪辑", "春季战役", "主阵地", "a", "2026-10-20"],
+                ["剪辑", "春季战役", "主阵地", "a", "2026-10-21"]])
+    camps, batts, tasks = _frames(backend)
+    plan, bad = build_task_import(raw, camps, batts, ["a"], tasks)
+    assert plan['行号'].tolist() == [2, 4]
+    assert bad[['行号', '错误']].values.tolist() == [[3, "文件内重复"]]
+
+
+class _Flaky:
+    # 第一次整块写入：先落库，再抛出 exc (模拟响应丢失 / 被拒)
+    def __init__(self, backend, exc, commit):
+        self.backend, self.exc, self.commit, self.failed = backend, exc, commit, False
+
+    def table(self, name):
+        outer, q = self, self.backend.table(name)
+        run = q.execute
+
+        def execute():
+            if not outer.failed and len(q.payload) > 1:
+                outer.failed = True
+                if outer.commit: run()
+                raise outer.exc
+            return run()
+        q.execute = execute
+        return q
+
+
+def test_bulk_insert_does_not_retry_ambiguous_errors(backend):
+    recs = [{"title": f"t{i}", "battlefield_id": 10} for i in range(4)]
+    errs = []
+    with pytest.raises(TimeoutError):
+        bulk_insert(_Flaky(backend, TimeoutError("read timed out"), commit=True), "tasks", recs, on_error=lambda i, e: errs.append(i))
+    assert len(backend.table("tasks").select("*").execute().data) == 4  # 没有逐行重试出重复行
+
+
+def test_bulk_insert_retries_rejected_chunk(backend):
+    recs = [{"title": f"t{i}", "battlefield_id": 10} for i in range(3)] + [{"title": "x", "nope": 1}]
+    errs = []
+    n = bulk_insert(backend, "tasks", recs, on_error=lambda i, e: errs.append(i))
+    assert n == 3 and errs == [3]
+    assert sorted(r['title'] for r in backend.table("tasks").select("*").execute().data) == ["t0", "t1", "t2"]
+    assert write_rejected(StorageError("x")) and not write_rejected(TimeoutError())
+
+
+def test_like_rewards_stamped_at_import_time():
+    raw = pd.DataFrame({"成员": ["a", "a"], "视频": ["v1", "v1"], "点赞": [1200, 6000], "日期": ["2026-09-01", "2026-09-03"]})
+    plan, _ = build_like_rewards(raw, ["a"], pd.DataFrame())
+    now = datetime.datetime(2026, 10, 19, 9, 30)
+    recs = like_reward_records(plan, now)
+    assert recs == [{"username": "a", "amount": 2.0, "reason": "🎬 点赞奖励｜v1｜6000赞｜发布于 2026-09-03", "created_at": "2026-10-19T09:30:00"}]
+
+    # 已发放部分按视频扣除，reason 里多出的日期不影响识别
+    plan, _ = build_like_rewards(raw.assign(点赞=[12000, 0]), ["a"], pd.DataFrame(recs))
+    assert like_reward_records(plan, now)[0]["amount"] == 3.0
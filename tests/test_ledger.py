@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from ledger import LEDGER_TABLE, sync_ledger
+from storage import SQLiteBackend
+
+TODAY = "2026-10-19"
+
+
+class Counting:
+    # 记录每次从账本读回的行数
+    def __init__(self, backend):
+        self.backend, self.read = backend, []
+
+    def table(self, name):
+        q = self.backend.table(name)
+        run = q.execute
+
+        def execute():
+            res = run()
+            if name == LEDGER_TABLE and q.op == "select": self.read.append(len(res.data))
+            return res
+        q.execute = execute
+        return q
+
+
+@pytest.fixture
+def frames():
+    users = pd.DataFrame({'username': ['a', 'b', 'admin'], 'role': ['member', 'member', 'admin']})
+    tasks = pd.DataFrame({'id': [1, 2, 3], 'assignee': ['a', 'a', 'b'], 'status': '完成', 'is_rnd': False,
+                          'difficulty': 1.0, 'std_time': [2.0, 3.0, 4.0], 'quality': 1.0,
+                          'completed_at': ['2026-06-01T10:00:00', '2026-10-17T10:00:00', '2026-10-18T09:00:00']})
+    pens = pd.DataFrame({'id': [1], 'username': ['a'], 'occurred_at': ['2026-10-18T08:00:00']})
+    rews = pd.DataFrame({'id': [1], 'username': ['b'], 'amount': [5.0], 'created_at': ['2026-10-19T12:00:00']})
+    return users, tasks, pens, rews
+
+
+def ledger(db):
+    return {r['key']: r['net'] for r in db.table(LEDGER_TABLE).select("*").execute().data}
+
+
+def test_backfill_then_idempotent(frames):
+    db = SQLiteBackend(":memory:")
+    assert sync_ledger(db, *frames, today=TODAY, backfill=True) == {"written": 5, "deleted": 0, "rows": 5}
+    assert ledger(db) == pytest.approx({"2026-06-01|a": 2.0, "2026-10-17|a": 3.0, "2026-10-18|a": -0.6, "2026-10-18|b": 4.0, "2026-10-19|b": 5.0})
+    assert sync_ledger(db, *frames, today=TODAY) == {"written": 0, "deleted": 0, "rows": 4}
+    assert sync_ledger(db, *frames, today=TODAY, backfill=True)["written"] == 0
+
+
+def test_recompute_and_delete_stale(frames):
+    users, tasks, pens, rews = frames
+    db = SQLiteBackend(":memory:")
+    sync_ledger(db, *frames, today=TODAY, backfill=True)
+
+    tasks = tasks.assign(quality=[1.0, 2.0, 1.0])           # 改判：10-17 产值翻倍，10-18 罚款随之变化
+    rews = rews.iloc[0:0]                                    # 奖励撤销：10-19 的行不再有发生额
+    res = sync_ledger(db, users, tasks, pens, rews, today=TODAY)
+    assert res == {"written": 2, "deleted": 1, "rows": 3}
+    led = ledger(db)
+    assert led["2026-10-17|a"] == 6.0 and led["2026-10-18|a"] == pytest.approx(-1.2)
+    assert "2026-10-19|b" not in led
+
+
+def test_reads_only_the_window(frames):
+    users, tasks, pens, rews = frames
+    db = SQLiteBackend(":memory:")
+    # 窗口之外的大量历史行：增量同步既不读取也不改动
+    old = [{"key": f"2025-01-{d:02d}|u{i}", "date": f"2025-01-{d:02d}", "username": f"u{i}", "gross": 1.0, "fines": 0.0, "rewards": 0.0, "net": 1.0}
+           for d in range(1, 29) for i in range(50)]
+    db.table(LEDGER_TABLE).insert(old).execute()
+    client = Counting(db)
+    res = sync_ledger(client, *frames, today=TODAY)
+    assert res["deleted"] == 0 and sum(client.read) == 0
+    client.read.clear()
+    assert sync_ledger(client, *frames, today=TODAY)["written"] == 0
+    assert sum(client.read) == res["rows"]
+    assert len(ledger(db)) == len(old) + res["rows"]
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpen, ReadUnavailable, ResilientReader
+from storage import SQLiteBackend, StorageError
+
+
+@pytest.fixture
+def stuck():
+    # 模拟卡死的后端：请求一直不返回，直到测试结束放行
+    gate = threading.Event()
+    yield lambda: gate.wait(10)
+    gate.set()
+
+
+def _reader(**kw):
+    return ResilientReader(timeout=0.1, attempts=1, workers=4, breaker=CircuitBreaker(threshold=3, cooldown=60), **kw)
+
+
+def test_breaker_opens_instead_of_pool_starving(stuck):
+    reader = _reader()
+    t0 = time.perf_counter()
+    errors = []
+    for _ in range(6):
+        with pytest.raises(ReadUnavailable) as e: reader.call(stuck)
+        errors.append(type(e.value))
+    # 两个请求超时占住一半线程后，后续请求不再排队，直接计入失败；第三次失败熔断
+    assert errors[:3] == [ReadUnavailable] * 3 and errors[3:] == [CircuitOpen] * 3
+    assert reader.breaker.state == "open"
+    assert reader.pool_stats()["abandoned"] == 2
+    assert time.perf_counter() - t0 < 0.5
+
+
+def test_abandoned_calls_are_released():
+    gate = threading.Event()
+    reader = _reader(max_abandoned=2)
+    reader.breaker.cooldown = 0.05
+    for _ in range(2):
+        with pytest.raises(ReadUnavailable): reader.call(lambda: gate.wait(10))
+    assert reader.pool_stats()["abandoned"] == 2
+    gate.set()
+    deadline = time.monotonic() + 2
+    while reader.pool_stats()["abandoned"] and time.monotonic() < deadline: time.sleep(0.01)
+    assert reader.pool_stats() == {"workers": 4, "inflight": 0, "abandoned": 0, "max_abandoned": 2}
+    assert reader.call(lambda: 42) == 42
+
+
+def test_concurrent_healthy_reads_still_queue():
+    reader = _reader()
+    reader.timeout = 1.0
+    out = []
+    ts = [threading.Thread(target=lambda i=i: out.append(reader.call(lambda: time.sleep(0.02) or i))) for i in range(12)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    assert sorted(out) == list(range(12)) and reader.breaker.state == "closed"
+
+
+def test_rejected_request_is_not_retried_or_counted():
+    reader = ResilientReader(timeout=1.0, attempts=3, breaker=CircuitBreaker(threshold=2, cooldown=60))
+    backend = SQLiteBackend(":memory:")
+    calls = []
+
+    def missing_table():
+        calls.append(1)
+        return backend.table("nope").select("*").execute()
+    for _ in range(5):
+        with pytest.raises(StorageError): reader.call(missing_table)
+    assert len(calls) == 5 and reader.breaker.state == "closed" and reader.breaker.failures == 0
+    assert reader.call(lambda: backend.table("tasks").select("*").execute()).data == []
+
+    # 暂时性错误照常重试并计入熔断
+    with pytest.raises(ReadUnavailable): reader.call(lambda: (calls.append(2), 1 / 0))
+    assert calls.count(2) == 2 and reader.breaker.state == "open"
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from search import SearchIndex
+
+
+@pytest.fixture
+def index():
+    idx = SearchIndex()
+    idx.sync("tasks", pd.DataFrame({"id": [1, 2, 3], "title": ["剪辑 Vlog", "写文案", None], "description": ["", "vlog 脚本", "拍摄"]}))
+    idx.sync("messages", pd.DataFrame({"id": [7], "content": ["明天拍摄"]}))
+    return idx
+
+
+@pytest.mark.parametrize("query", [None, "", " ", "  ", "\t\n"])
+def test_blank_query_means_no_filter(index, query):
+    assert index.search(query) is None
+    assert index.search(query, ["tasks"]) is None
+
+
+def test_matches_substring_case_insensitive(index):
+    assert index.search("VLOG") == {"tasks": [2, 1], "messages": [], "daily_todos": []}
+    assert index.search(" 拍摄 ", ["tasks", "messages"]) == {"tasks": [3], "messages": [7]}
+    assert index.search("剪", ["tasks"]) == {"tasks": [1]}
+    assert index.search("不存在", ["tasks"]) == {"tasks": []}
+
+
+def test_incremental_sync(index):
+    n = index.sync("tasks", pd.DataFrame({"id": [1, 3, 4], "title": ["剪辑 Vlog", "拍摄花絮", "新任务"], "description": ["", "拍摄", ""]}))
+    assert n == 3  # 3 改动、4 新增、2 删除
+    assert index.search("vlog", ["tasks"]) == {"tasks": [1]}
+    assert index.search("花絮", ["tasks"]) == {"tasks": [3]}
+    assert index.search("文案", ["tasks"]) == {"tasks": []}
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import stat
+import time
+
+import pandas as pd
+import pytest
+
+from sharedcache import SharedCache, SharedCacheError
+
+spawn = multiprocessing.get_context("spawn")
+
+
+def _in_child(path, action, key, out):
+    # 另一个进程里打开同一目录的缓存，回传 (结果, 本进程计算次数)
+    cache = SharedCache(path, wait=5)
+    result = None
+    if action == "get":
+        value = cache.get(key)
+        result = None if value is None else (value.to_dict("list"), value.attrs)
+    elif action == "delete":
+        cache.delete(key)
+    elif action == "compute":
+        def slow():
+            time.sleep(0.5)
+            return "子进程算的"
+        result = cache.get_or_compute(key, slow)
+    out.put((result, cache.stats()["computed"]))
+
+
+def run_child(*args):
+    out = spawn.Queue()
+    p = spawn.Process(target=_in_child, args=(*args, out))
+    p.start()
+    result = out.get(timeout=30)
+    p.join(10)
+    assert p.exitcode == 0
+    return result
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def test_cross_process_hit_and_miss(path):
+    cache = SharedCache(path)
+    df = pd.DataFrame({"id": [1, 2], "title": ["甲", "乙"]})
+    df.attrs["read_at"] = 123.0
+    assert cache.put("table:tasks", df)
+    got, _ = run_child(path, "get", "table:tasks")
+    assert got == ({"id": [1, 2], "title": ["甲", "乙"]}, {"read_at": 123.0})
+    assert run_child(path, "get", "table:users")[0] is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_cross_process_invalidation(path):
+    cache = SharedCache(path)
+    cache.put("k", "旧")
+    run_child(path, "delete", "k")
+    assert cache.get("k") is None
+    # 调用方判定不新鲜的值视同不存在：重新计算并覆盖
+    cache.put("k", "旧")
+    assert cache.get_or_compute("k", lambda: "新", fresh=lambda v: v != "旧") == "新"
+    assert cache.get("k") == "新" and cache.stats()["computed"] == 1
+
+
+def test_only_one_process_computes(path):
+    out = spawn.Queue()
+    p = spawn.Process(target=_in_child, args=(path, "compute", "view:x", out))
+    p.start()
+    cache = SharedCache(path)
+    deadline = time.monotonic() + 20
+    while not cache._con().execute("SELECT 1 FROM leases").fetchone() and time.monotonic() < deadline: time.sleep(0.01)
+    # 子进程持有租约：本进程等它写入后直接取用，不再重复计算
+    assert cache.get_or_compute("view:x", lambda: "本进程算的") == "子进程算的"
+    assert out.get(timeout=30) == ("子进程算的", 1)
+    p.join(10)
+    assert cache.stats()["computed"] == 0 and cache.stats()["waited"] == 1
+
+
+def test_eviction_drops_least_recently_used(path):
+    cache = SharedCache(path, max_bytes=40_000)
+    for i in range(4):
+        assert cache.put(f"k{i}", os.urandom(9_000))
+        time.sleep(0.01)
+    assert not cache.put("big", os.urandom(20_000))  # 超过预算的四分之一：不缓存
+    assert cache.put("k4", os.urandom(9_000))
+    assert cache.get("k0") is None and cache.get("k4") is not None
+    assert cache.stats()["bytes"] <= 40_000
+
+
+def test_corrupt_value_is_dropped(path):
+    cache = SharedCache(path)
+    cache.put("k", 1)
+    cache._con().execute("UPDATE entries SET value = ? WHERE key = 'k'", (b"garbage",))
+    assert cache.get("k") is None and cache.stats()["entries"] == 0
+
+
+def test_creates_private_directory(path):
+    SharedCache(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+
+
+def test_tightens_readable_directory(path):
+    os.makedirs(path, mode=0o755)
+    os.chmod(path, 0o755)
+    SharedCache(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+
+
+def test_refuses_writable_directory(tmp_path):
+    shared = tmp_path / "shm"
+    shared.mkdir()
+    os.chmod(shared, 0o1777)  # 像 /dev/shm、/tmp 一样人人可写
+    with pytest.raises(SharedCacheError):
+        SharedCache(str(shared))
+    with pytest.raises(SharedCacheError):  # 直接把缓存文件放在人人可写的目录里也不行
+        SharedCache(str(shared / "cache.db"))
+    assert not (shared / "cache.db").exists()
+    SharedCache(str(shared / "yanzu-cache"))  # 其中的专用子目录可以
+
+
+def test_refuses_symlinked_directory(tmp_path, path):
+    os.makedirs(path, mode=0o700)
+    link = tmp_path / "link"
+    link.symlink_to(path)
+    with pytest.raises(SharedCacheError):
+        SharedCache(str(link))
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() != 0, reason="需要 root 才能把文件改成别的属主")
+def test_refuses_foreign_owned_files(path):
+    SharedCache(path).put("k", 1)
+    os.chown(os.path.join(path, "cache.db"), 65534, 65534)
+    with pytest.raises(SharedCacheError):
+        SharedCache(path)
+    os.chown(os.path.join(path, "cache.db"), 0, 0)
+    os.chown(path, 65534, 65534)
+    with pytest.raises(SharedCacheError):
+        SharedCache(path)
@@ -0,0 +1,148 @@
+import pytest
+
+from db import iter_pages
+from storage import SQLiteBackend, StorageError
+
+TASKS = [
+    {"title": "甲", "status": "待领取", "assignee": "Alice", "difficulty": 1.0, "is_rnd": True, "deadline": "2026-10-20"},
+    {"title": "乙", "status": "进行中", "assignee": "bob", "difficulty": 2.5, "is_rnd": False, "deadline": None},
+    {"title": "丙", "status": "完成", "assignee": "alice", "difficulty": 4.0, "is_rnd": "false", "deadline": "2026-10-18"},
+    {"title": "丁", "status": "完成", "assignee": None, "difficulty": None, "is_rnd": None, "deadline": "2026-10-19"},
+]
+
+
+@pytest.fixture
+def db():
+    db = SQLiteBackend(":memory:")
+    db.table("tasks").insert(TASKS).execute()
+    return db
+
+
+def titles(q):
+    return [r["title"] for r in q.execute().data]
+
+
+def test_insert_returns_rows_with_defaults():
+    db = SQLiteBackend(":memory:")
+    res = db.table("tasks").insert({"title": "x", "is_rnd": 1}).execute()
+    row, = res.data
+    assert row["id"] == 1 and row["title"] == "x" and row["is_rnd"] is True and row["created_at"]
+    assert db.table("daily_todos").insert({"content": "y"}).execute().data[0]["is_completed"] is False
+
+
+def test_filters(db):
+    t = lambda: db.table("tasks").select("*").order("id")
+    assert titles(t().eq("status", "完成")) == ["丙", "丁"]
+    assert titles(t().neq("status", "完成")) == ["甲", "乙"]
+    # NULL 不等于也不“不等于”任何值，与 PostgreSQL 一致
+    assert titles(t().neq("assignee", "bob")) == ["甲", "丙"]
+    assert titles(t().gt("difficulty", 1)) == ["乙", "丙"]
+    assert titles(t().gte("difficulty", 2.5)) == ["乙", "丙"]
+    assert titles(t().lt("deadline", "2026-10-20")) == ["丙", "丁"]
+    assert titles(t().lte("deadline", "2026-10-19")) == ["丙", "丁"]
+    assert titles(t().in_("status", ["待领取", "进行中"])) == ["甲", "乙"]
+    assert titles(t().in_("status", [])) == []
+    assert titles(t().is_("assignee", None)) == ["丁"] and titles(t().is_("deadline", "null")) == ["乙"]
+    assert titles(t().eq("status", "完成").gte("deadline", "2026-10-19")) == ["丁"]
+
+
+def test_like_and_ilike(db):
+    t = lambda: db.table("tasks").select("*").order("id")
+    assert titles(t().like("assignee", "a*")) == ["丙"]  # like 区分大小写
+    assert titles(t().ilike("assignee", "A*")) == ["甲", "丙"]
+    assert titles(t().like("assignee", "%o%")) == ["乙"]
+
+
+def test_booleans(db):
+    t = lambda: db.table("tasks").select("*").order("id")
+    assert titles(t().eq("is_rnd", True)) == ["甲"]
+    assert titles(t().eq("is_rnd", "false")) == ["乙", "丙"]
+    assert titles(t().is_("is_rnd", True)) == ["甲"] and titles(t().is_("is_rnd", None)) == ["丁"]
+    assert [r["is_rnd"] for r in t().execute().data] == [True, False, False, None]
+
+
+def test_order_nulls_and_paging(db):
+    t = lambda: db.table("tasks").select("title")
+    # PostgREST 默认：升序 NULL 在后，降序 NULL 在前
+    assert titles(t().order("difficulty")) == ["甲", "乙", "丙", "丁"]
+    assert titles(t().order("difficulty", desc=True)) == ["丁", "丙", "乙", "甲"]
+    assert titles(t().order("difficulty", nullsfirst=True)) == ["丁", "甲", "乙", "丙"]
+    assert titles(t().order("status").order("id", desc=True)) == ["丁", "丙", "甲", "乙"]
+    assert titles(t().order("id").limit(2)) == ["甲", "乙"]
+    assert titles(t().order("id").range(1, 2)) == ["乙", "丙"]
+    assert titles(t().order("id").gt("id", 2)) == ["丙", "丁"]
+
+
+def test_iter_pages_walks_the_key():
+    db = SQLiteBackend(":memory:")
+    db.table("tasks").insert([{"title": str(i), "status": "完成" if i % 3 else "待领取"} for i in range(25)]).execute()
+    pages = list(iter_pages(db, "tasks", page_size=10))
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert [r["id"] for p in pages for r in p] == list(range(1, 26))
+    pages = list(iter_pages(db, "tasks", page_size=4, columns="id", where=lambda q: q.eq("status", "待领取")))
+    assert [r for p in pages for r in p] == [{"id": i + 1} for i in range(0, 25, 3)]
+    assert list(iter_pages(db, "tasks", page_size=5, where=lambda q: q.eq("status", "无"))) == []
+
+
+def test_count_exact(db):
+    res = db.table("tasks").select("id", count="exact").eq("status", "完成").limit(1).execute()
+    assert res.count == 2 and len(res.data) == 1  # count 不受 limit 影响
+    assert db.table("tasks").select("*").execute().count is None
+
+
+def test_select_columns(db):
+    assert db.table("tasks").select("id, title").order("id").limit(1).execute().data == [{"id": 1, "title": "甲"}]
+
+
+def test_upsert(db):
+    res = db.table("users").upsert([{"username": "a", "password": "1", "role": "member"},
+                                    {"username": "b", "password": "2", "role": "member"}]).execute()
+    assert [r["username"] for r in res.data] == ["a", "b"]
+    res = db.table("users").upsert({"username": "a", "role": "admin"}).execute()
+    # 冲突时只更新给出的列，其余列保留
+    assert res.data == [{"username": "a", "password": "1", "role": "admin"}]
+    res = db.table("tasks").upsert({"id": 2, "title": "乙改"}, on_conflict="id").execute()
+    assert res.data[0]["title"] == "乙改" and res.data[0]["status"] == "进行中"
+    assert len(db.table("tasks").select("id").execute().data) == 4
+    with pytest.raises(StorageError):  # 冲突列不是唯一键
+        db.table("tasks").upsert({"id": 9, "title": "x"}, on_conflict="title").execute()
+
+
+def test_update_and_delete_return_rows(db):
+    res = db.table("tasks").update({"status": "完成", "is_rnd": "yes"}).eq("assignee", "bob").execute()
+    assert [(r["id"], r["status"], r["is_rnd"]) for r in res.data] == [(2, "完成", True)]
+    assert db.table("tasks").update({"status": "x"}).eq("id", 99).execute().data == []
+    res = db.table("tasks").delete().in_("id", [1, 3, 99]).execute()
+    assert sorted(r["title"] for r in res.data) == ["丙", "甲"]
+    assert titles(db.table("tasks").select("title").order("id")) == ["乙", "丁"]
+
+
+def test_writes_notify_listeners(db):
+    seen = []
+    db.listeners.append(lambda t, op, rows: seen.append((t, op, len(rows))))
+    db.table("tasks").update({"status": "x"}).eq("id", 1).execute()
+    db.table("tasks").delete().eq("id", 99).execute()  # 没有改动任何行：不通知
+    assert seen == [("tasks", "update", 1)]
+
+
+@pytest.mark.parametrize("build", [
+    lambda db: db.table("nope").select("*"),
+    lambda db: db.table("tasks").select("*").eq("nope", 1),
+    lambda db: db.table("tasks").select("*").in_("nope", []),
+    lambda db: db.table("tasks").select("*").order("nope"),
+    lambda db: db.table("tasks").select("id, nope"),
+    lambda db: db.table("tasks").insert({"nope": 1}),
+    lambda db: db.table("tasks").update({"nope": 1}).eq("id", 1),
+    lambda db: db.table("tasks").delete().is_("nope", None),
+    lambda db: db.table("tasks").upsert({"id": 1}, on_conflict="nope"),
+])
+def test_unknown_table_or_column_is_rejected(db, build):
+    with pytest.raises(StorageError):
+        build(db).execute()
+    assert len(db.table("tasks").select("id").execute().data) == 4
+
+
+def test_failed_bulk_insert_is_rolled_back(db):
+    with pytest.raises(StorageError):
+        db.table("tasks").insert([{"title": "新"}, {"title": "坏", "nope": 1}]).execute()
+    assert titles(db.table("tasks").select("title").order("id")) == ["甲", "乙", "丙", "丁"]
@@ -0,0 +1,104 @@
+import time
+
+import pandas as pd
+import pytest
+
+from storage import SQLiteBackend, StorageError
+from writeback import WriteBehind
+
+
+class Flaky:
+    # 按顺序让指定操作失败一次：(op, 异常, 失败前是否已提交)
+    def __init__(self, backend, *faults):
+        self.backend, self.faults, self.calls = backend, list(faults), []
+
+    def table(self, name):
+        q = self.backend.table(name)
+        run = q.execute
+
+        def execute():
+            self.calls.append(q.op)
+            if self.faults and self.faults[0][0] == q.op:
+                _, exc, commit = self.faults.pop(0)
+                if commit: run()
+                raise exc
+            return run()
+        q.execute = execute
+        return q
+
+
+@pytest.fixture
+def db():
+    return SQLiteBackend(":memory:")
+
+
+def rows(db):
+    return pd.DataFrame(db.table("daily_todos").select("*").order("id").execute().data)
+
+
+def todo(content):
+    return {"username": "a", "date": "2026-10-19", "content": content, "category": "核心必办", "is_completed": False}
+
+
+def test_flush_merges_changes(db):
+    client = Flaky(db)
+    q = WriteBehind(client, "daily_todos")
+    k1 = q.submit("insert", values=todo("一"), owner="a")
+    q.submit("update", k1, {"is_completed": True}, owner="a")
+    k2 = q.submit("insert", values=todo("二"), owner="a")
+    q.submit("delete", k2, owner="a")  # 新增后删除：两者抵消
+    assert q.overlay(rows(db).reindex(columns=["id", "content", "is_completed"]))['content'].tolist() == ["一"]
+    assert q.flush() and q.backlog() == 0
+    assert client.calls == ["insert"]
+    assert rows(db)[['content', 'is_completed']].values.tolist() == [["一", True]]
+
+    real = int(rows(db)['id'][0])
+    q.submit("update", real, {"content": "改"}, owner="a")
+    q.submit("update", real, {"content": "再改"}, owner="a")
+    assert q.flush() and client.calls == ["insert", "update"]
+    assert rows(db)['content'].tolist() == ["再改"]
+
+
+def test_ambiguous_insert_is_not_retried(db):
+    # 提交成功但响应超时：不能重试，否则写出重复行
+    q = WriteBehind(Flaky(db, ("insert", TimeoutError("read timed out"), True)), "daily_todos")
+    k = q.submit("insert", values=todo("一"), owner="a")
+    q.submit("update", k, {"is_completed": True}, owner="a")
+    assert not q.flush()
+    assert q.flush() and q.backlog() == 0
+    assert len(rows(db)) == 1
+    failed = q.take_failed("a")
+    assert [f["op"] for f in failed] == ["insert"] and "可能已保存" in failed[0]["error"]
+    assert q.take_failed("a") == []
+
+
+def test_rejected_insert_is_retried(db):
+    q = WriteBehind(Flaky(db, ("insert", StorageError("database is locked"), False)), "daily_todos")
+    q.submit("insert", values=todo("一"), owner="a")
+    assert not q.flush() and q.backlog() == 1
+    assert q.flush() and q.backlog() == 0
+    assert rows(db)['content'].tolist() == ["一"] and q.take_failed("a") == []
+
+
+def test_update_retried_after_ambiguous_error(db):
+    db.table("daily_todos").insert(todo("一")).execute()
+    q = WriteBehind(Flaky(db, ("update", TimeoutError(), True)), "daily_todos")
+    q.submit("update", 1, {"is_completed": True}, owner="a")
+    assert not q.flush() and q.flush()
+    assert rows(db)['is_completed'].tolist() == [True] and q.take_failed("a") == []
+
+
+def test_gives_up_after_attempts(db):
+    q = WriteBehind(Flaky(db, *[("update", TimeoutError(), False)] * 3), "daily_todos", attempts=3)
+    q.submit("update", 1, {"is_completed": True}, owner="a")
+    for _ in range(3): assert not q.flush()
+    assert q.backlog() == 0 and len(q.take_failed("a")) == 1
+
+
+def test_drain_on_shutdown(db):
+    q = WriteBehind(db, "daily_todos", delay=60).start()  # 后台线程迟迟不写
+    for i in range(3): q.submit("insert", values=todo(str(i)), owner="a")
+    t0 = time.monotonic()
+    q.drain(timeout=5)
+    assert q.backlog() == 0 and time.monotonic() - t0 < 1
+    assert rows(db)['content'].tolist() == ["0", "1", "2"]
@@ -0,0 +1,69 @@
+# --- 启动预热 ---
+# 服务进程里第一次运行脚本时 (部署 / 重启后第一个打开登录页的人) 在后台线程依次执行预热步骤：
+# 拉取各表快照、同步分析镜像与风云榜聚合、重算日账本、构建任务标签索引。用户输入账号密码的这段时间里缓存就已就绪。
+# 每一步的状态与耗时记入剖析器并在管理员 🩺 性能诊断页展示；单步失败只记录原因，不影响其余步骤与页面。
+import threading
+import time
+
+import pandas as pd
+
+
+class Warmup:
+    def __init__(self, steps, profiler=None):
+        self.steps = list(steps)  # [(名称, 无参函数)]，按顺序执行，后面的步骤可直接用前面预热好的缓存
+        self.profiler = profiler
+        self.status = {name: {"步骤": name, "状态": "等待", "耗时(秒)": None, "错误": None} for name, _ in self.steps}
+        self.done = threading.Event()
+        self.started_at = self.finished_at = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self, prepare=None):
+        # prepare(thread) 在线程启动前调用，如挂上 Streamlit 的运行上下文
+        with self.lock:
+            if self.thread is not None: return self
+            self.started_at = time.time()
+            self.thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        if prepare: prepare(self.thread)
+        self.thread.start()
+        return self
+
+    def _set(self, name, **kw):
+        with self.lock: self.status[name].update(kw)
+
+    def _run(self):
+        prof = self.profiler
+        if prof: prof.begin_rerun("预热", "(启动预热)")
+        for name, fn in self.steps:
+            if prof: prof.mark(f"预热·{name}")
+            self._set(name, 状态="进行中")
+            t0 = time.perf_counter()
+            try:
+                fn()
+                self._set(name, 状态="完成", **{"耗时(秒)": round(time.perf_counter() - t0, 3)})
+            except Exception as e:
+                self._set(name, 状态="失败", 错误=str(e)[:200], **{"耗时(秒)": round(time.perf_counter() - t0, 3)})
+        if prof: prof.end_rerun()
+        self.finished_at = time.time()
+        self.done.set()
+
+    @property
+    def ready(self):
+        return self.done.is_set()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def frame(self):
+        with self.lock: rows = [dict(s) for s in self.status.values()]
+        return pd.DataFrame(rows, columns=["步骤", "状态", "耗时(秒)", "错误"])
+
+    def summary(self):
+        # 一行文字：进行中 / 已就绪 (耗时) / 部分失败
+        if self.started_at is None: return "未启动"
+        if not self.ready:
+            n = sum(s["状态"] == "完成" for s in self.status.values())
+            return f"⏳ 预热中 ({n}/{len(self.steps)})，已用 {time.time() - self.started_at:.1f} 秒"
+        failed = [n for n, s in self.status.items() if s["状态"] == "失败"]
+        took = f"{self.finished_at - self.started_at:.1f} 秒"
+        return f"⚠️ 预热完成 ({took})，失败：{', '.join(failed)}" if failed else f"✅ 缓存已就绪 (预热 {took})"
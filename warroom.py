@@ -0,0 +1,53 @@
+# --- 战略作战室分组 ---
+# 一次 groupby 得到 战役 → 战场 → 任务 的分组与进度，替代逐战役/逐战场对整张任务表做布尔筛选。
+import pandas as pd
+
+ACTIVE_STATUSES = ['待领取', '进行中', '返工', '待验收']
+EMPTY_CAMP = {"batts": pd.DataFrame(), "total": 0, "done": 0, "battlefields": {}}
+
+
+def war_room_groups(camps, batts, tasks):
+    tasks_by_batt = {}
+    if not tasks.empty and 'battlefield_id' in tasks.columns:
+        tasks_by_batt = dict(tuple(tasks.groupby('battlefield_id', sort=False)))
+    batts_by_camp = dict(tuple(batts.groupby('campaign_id', sort=False))) if not batts.empty else {}
+
+    groups = {}
+    for cid in (camps['id'] if not camps.empty else []):
+        camp_batts = batts_by_camp.get(cid, pd.DataFrame())
+        if 'order_index' in camp_batts.columns: camp_batts = camp_batts.sort_values('order_index')
+        camp = {"batts": camp_batts, "total": 0, "done": 0, "battlefields": {}}
+        for bid in (camp_batts['id'] if not camp_batts.empty else []):
+            b_tasks = tasks_by_batt.get(bid)
+            if b_tasks is None or b_tasks.empty: continue
+            done = int((b_tasks['status'] == '完成').sum())
+            camp["battlefields"][bid] = {"tasks": b_tasks, "total": len(b_tasks), "done": done,
+                                         "active": b_tasks[b_tasks['status'].isin(ACTIVE_STATUSES)]}
+            camp["total"] += len(b_tasks)
+            camp["done"] += done
+        groups[cid] = camp
+    return groups
+
+
+def label_index(camps, batts):
+    # 战场 id → “战役 / 战场”标签 HTML，任务卡片直接查字典，不再逐张卡片筛选战场表和战役表
+    if camps.empty or batts.empty: return {}
+    camp_by_id = {c['id']: c for c in camps.drop_duplicates('id').to_dict('records')}
+    labels = {}
+    for b in batts.drop_duplicates('id').to_dict('records'):
+        c = camp_by_id.get(b['campaign_id'])
+        if c is None: continue
+        style_class = "strat-tag" if c['id'] == -1 else "strat-tag strat-tag-active"
+        labels[b['id']] = f"<span class='{style_class}'>{c['title']} / {b['title']}</span>"
+    return labels
+
+
+def battlefield_signatures(tasks):
+    # 战场 id → (总数, 完成数, 活跃数, 活跃任务内容哈希)；大屏据此只重绘有变化的战场
+    if tasks.empty or 'battlefield_id' not in tasks.columns: return {}
+    counts = pd.DataFrame({'bid': tasks['battlefield_id'], 'done': tasks['status'] == '完成'}).groupby('bid')['done'].agg(['size', 'sum'])
+    active = tasks[tasks['status'].isin(ACTIVE_STATUSES)]
+    shown = active.reindex(columns=['id', 'status', 'title', 'deadline', 'difficulty', 'std_time', 'is_rnd']).astype(str)
+    h = pd.DataFrame({'bid': active['battlefield_id'], 'h': pd.util.hash_pandas_object(shown, index=False)}).groupby('bid')['h'].agg(['size', 'sum'])
+    h = h.reindex(counts.index, fill_value=0)
+    return {bid: (int(t), int(d), int(n), int(s)) for bid, t, d, n, s in zip(counts.index, counts['size'], counts['sum'], h['size'], h['sum'])}
@@ -0,0 +1,186 @@
+# --- 写后台队列 (write-behind) ---
+# 今日清单的增 / 改 / 删先记入进程内队列并立即叠加到本地快照上，页面不必等数据库往返；
+# 后台线程稍等片刻，把同一行的多次改动合并后批量写入：新增一次 insert、同值更新一次 update ... in、删除一次 delete ... in。
+# 一致性保证 (读己之写)：本进程内任何会话的下一次读取都能看到已提交的改动——写入成功前改动一直叠加在快照上，
+# 写入成功后继续叠加，直到读到在写入完成之后才开始拉取的快照 (DataFrame.attrs["read_at"]) 为止。
+# 写入失败按退避重试，最终失败的改动从叠加中撤下并按提交人记录，页面据此提示；其他进程在写入成功后才能看到改动。
+# 更新与删除是幂等的，任何错误都可以重试；新增不是——超时 / 断网时可能已经提交，只有后端明确拒绝 (db.write_rejected) 才重试，
+# 否则直接记为失败并提示核对，避免写出重复行。
+import atexit
+import itertools
+import threading
+import time
+
+import pandas as pd
+
+from db import TABLE_KEYS, bulk_delete, bulk_update, chunked, write_rejected
+from resilience import backoff
+
+FLUSH_DELAY = 0.5   # 收到改动后等待多久再写，攒住连续点击
+FLUSH_ATTEMPTS = 5
+
+
+def _merge(old, new):
+    # 同一行的两次改动合并为一次；返回 None 表示两者抵消 (新增后又删除)
+    if old["op"] == "delete": return old
+    if new["op"] == "delete": return None if old["op"] == "insert" else new
+    return dict(old, values={**old["values"], **new["values"]}, owner=new["owner"])
+
+
+class WriteBehind:
+    def __init__(self, client, table_name, delay=FLUSH_DELAY, attempts=FLUSH_ATTEMPTS, on_flush=None):
+        self.client, self.table_name = client, table_name
+        self.key = TABLE_KEYS.get(table_name, 'id')
+        self.delay, self.attempts = delay, attempts
+        self.on_flush = on_flush   # on_flush(表名)：写入成功后调用，如让该表的缓存失效
+        self.pending = {}          # 行键 → {"op", "values", "owner", "tries"}；新增的行用临时负数键
+        self.inflight = {}         # 正在写入的一批
+        self.applied = []          # [(完成时间, op, 行键, values)] 已写入、但可能还没出现在快照里的改动
+        self.temp_ids = {}         # 临时键 → 数据库分配的真实主键
+        self.failed = []           # [{"owner", "op", "values", "error", "at"}]
+        self.seq = itertools.count(1)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start(self, prepare=None):
+        # prepare(thread) 在线程启动前调用，如挂上 Streamlit 的运行上下文
+        with self.lock:
+            if self.thread is not None: return self
+            self.thread = threading.Thread(target=self._loop, name=f"write-behind-{self.table_name}", daemon=True)
+        if prepare: prepare(self.thread)
+        self.thread.start()
+        atexit.register(self.drain)
+        return self
+
+    # -- 提交与读取 --
+    def submit(self, op, row_key=None, values=None, owner=None):
+        # op 为 insert / update / delete；返回行键 (新增返回临时负数键，可继续用于改 / 删)
+        new = {"op": op, "values": dict(values or {}), "owner": owner, "tries": 0}
+        with self.lock:
+            if op == "insert": row_key = -next(self.seq)
+            else: row_key = self.temp_ids.get(row_key, row_key)
+            old = self.pending.get(row_key)
+            merged = new if old is None else _merge(old, new)
+            if merged is None: del self.pending[row_key]
+            else: self.pending[row_key] = merged
+        self.wake.set()
+        return row_key
+
+    def overlay(self, df):
+        # 把尚未出现在快照里的改动叠加到快照副本上
+        read_at = df.attrs.get("read_at")
+        with self.lock:
+            if read_at is not None: self.applied = [a for a in self.applied if a[0] > read_at]
+            ops = [(op, k, v) for _, op, k, v in self.applied]
+            ops += [(p["op"], k, p["values"]) for src in (self.inflight, self.pending) for k, p in src.items()]
+            temp_ids = dict(self.temp_ids)
+        if not ops: return df
+        out = df.copy()
+        for op, k, vals in ops:
+            k = temp_ids.get(k, k)
+            if op == "delete": out = out[out[self.key] != k]
+            elif op == "update":
+                mask = out[self.key] == k
+                for col, v in vals.items(): out.loc[mask, col] = v
+            elif k not in set(out[self.key]):
+                out = pd.concat([out, pd.DataFrame([{**vals, self.key: k}])], ignore_index=True)
+        out.attrs.pop("version", None)  # 内容已不同于快照，版本需现算
+        return out
+
+    def backlog(self):
+        with self.lock: return len(self.pending) + len(self.inflight)
+
+    def take_failed(self, owner):
+        # 取出并清空某人的失败记录 (只提示一次)
+        with self.lock:
+            mine = [f for f in self.failed if f["owner"] == owner]
+            self.failed = [f for f in self.failed if f["owner"] != owner]
+        return mine
+
+    # -- 后台写入 --
+    def _loop(self):
+        attempt = 0
+        while True:
+            self.wake.wait()
+            time.sleep(self.delay)
+            self.wake.clear()
+            if self.flush(): attempt = 0
+            else:
+                time.sleep(backoff(attempt))
+                attempt += 1
+                self.wake.set()
+
+    def drain(self, timeout=10):
+        # 进程退出前尽量写完
+        end = time.monotonic() + timeout
+        while self.backlog() and time.monotonic() < end:
+            self.flush()
+            time.sleep(0.05)
+
+    def flush(self):
+        # 写出当前积累的改动；全部成功返回 True，有失败 (已放回队列等待重试) 返回 False
+        with self.lock:
+            if self.inflight: return True  # 另一线程正在写
+            # 临时键上的后续改动要等新增写完、换成真实主键后再发
+            batch = {k: p for k, p in self.pending.items() if k > 0 or p["op"] == "insert"}
+            for k in batch: del self.pending[k]
+            self.inflight = batch
+        if not batch: return True
+        ok = True
+        try:
+            self._write(batch)
+        except Exception as e:
+            ok = False
+            self._requeue(batch, e)
+        finally:
+            with self.lock: self.inflight = {}
+        if self.on_flush:
+            try: self.on_flush(self.table_name)
+            except Exception: pass
+        return ok
+
+    def _done(self, op, row_key, values):
+        self.applied.append((time.time(), op, row_key, values))
+
+    def _write(self, batch):
+        # 按 新增 → 删除 → 同值更新 分组写入；每组成功后立即移出 batch，失败时只重试剩下的部分
+        inserts = [k for k, p in batch.items() if p["op"] == "insert"]
+        for keys in chunked(inserts):
+            rows = self.client.table(self.table_name).insert([batch[k]["values"] for k in keys]).execute().data or []
+            with self.lock:
+                for k, row in zip(keys, rows):
+                    real = row[self.key]
+                    self.temp_ids[k] = real
+                    self._done("insert", real, batch.pop(k)["values"])
+                    # 等待中的后续改动换成真实主键
+                    if k in self.pending:
+                        later = self.pending.pop(k)
+                        self.pending[real] = later if real not in self.pending else _merge(self.pending[real], later)
+        deletes = [k for k, p in batch.items() if p["op"] == "delete"]
+        if deletes:
+            bulk_delete(self.client, self.table_name, deletes, key=self.key)
+            with self.lock:
+                for k in deletes: self._done("delete", k, batch.pop(k)["values"])
+        groups = {}
+        for k, p in batch.items(): groups.setdefault(tuple(sorted(p["values"].items())), []).append(k)
+        for values, keys in groups.items():
+            bulk_update(self.client, self.table_name, dict(values), keys, key=self.key)
+            with self.lock:
+                for k in keys: self._done("update", k, batch.pop(k)["values"])
+
+    def _requeue(self, batch, exc):
+        # 失败的改动放回队列 (排在之后提交的同一行改动之前)；重试次数用尽、或新增遇到结果不明的错误则丢弃并记录
+        error, rejected = str(exc)[:200], write_rejected(exc)
+        with self.lock:
+            for k, p in batch.items():
+                p = dict(p, tries=p["tries"] + 1)
+                ambiguous = p["op"] == "insert" and not rejected
+                if p["tries"] >= self.attempts or ambiguous:
+                    msg = f"{error} (可能已保存，请刷新核对)" if ambiguous else error
+                    self.failed.append({"owner": p["owner"], "op": p["op"], "values": p["values"], "error": msg, "at": time.time()})
+                    if p["op"] == "insert": self.pending.pop(k, None)  # 依附于这条新增的后续改动一并作废
+                    continue
+                later = self.pending.pop(k, None)
+                merged = p if later is None else _merge(p, later)
+                if merged is not None: self.pending[k] = merged